@@ -0,0 +1,5 @@
+"""
+Modulos compartilhados entre as etapas do pipeline (Testes 1, 2 e 3).
+Cada etapa roda como script da propria pasta; o config.py (ou o proprio script, no Teste 3) coloca a raiz
+do repositorio no sys.path e os modulos sao importados como `comum.<modulo>`.
+"""
@@ -0,0 +1,61 @@
+"""
+Amostragem deterministica de operadoras (--sample / ANS_AMOSTRA) para rodadas rapidas do pipeline.
+Um modulo so para teste1_api_ans, teste2_transformacao e teste3_banco: a mesma fracao seleciona as mesmas
+operadoras em todas as etapas e em todas as execucoes.
+
+Chave: REG_ANS, o identificador presente nas demonstracoes contabeis e no cadastro. Uma operadora entra
+se crc32(REG_ANS) % BALDES < fracao * BALDES; a amostra de uma fracao menor esta contida na de uma maior.
+Arquivos sem REG_ANS (consolidado, formato generico) sao filtrados pelos CNPJs do cadastro amostrado.
+"""
+
+import io
+import zlib
+
+import pandas as pd
+
+BALDES = 10000
+
+
+def chave_registro(valor) -> str:
+    """REG_ANS normalizado: sem aspas/espacos e sem o ".0" de colunas que o pandas leu como float."""
+    s = str(valor).strip().strip('"').strip()
+    return s[:-2] if s.endswith(".0") else s
+
+
+def na_amostra(reg_ans, fracao: float) -> bool:
+    return zlib.crc32(chave_registro(reg_ans).encode()) % BALDES < fracao * BALDES
+
+
+def mascara_registro(serie: pd.Series, fracao: float) -> pd.Series:
+    """Mascara booleana das linhas cujo REG_ANS esta na amostra (hash calculado uma vez por valor distinto)."""
+    valores = serie.astype(str)
+    dentro = {v for v in valores.unique() if na_amostra(v, fracao)}
+    return valores.isin(dentro)
+
+
+def ler_csv_amostrado(path, fracao: float, coluna: str = "REG_ANS", sep: str = ";", encoding: str = "utf-8", **kwargs):
+    """
+    pd.read_csv so das linhas cuja `coluna` esta na amostra: as demais sao descartadas como texto
+    (um split ate a coluna-chave), sem parse de campos. Sem a coluna no cabecalho, le o arquivo inteiro.
+    """
+    with open(path, "r", encoding=encoding, newline="") as f:
+        cabecalho = f.readline()
+        nomes = [c.strip().strip('"').strip().upper() for c in cabecalho.rstrip("\r\n").split(sep)]
+        if coluna.upper() not in nomes:
+            f.seek(0)
+            return pd.read_csv(f, sep=sep, **kwargs)
+        i = nomes.index(coluna.upper())
+        decisoes = {}
+        buf = io.StringIO()
+        buf.write(cabecalho)
+        for linha in f:
+            campos = linha.split(sep, i + 1)
+            if len(campos) <= i:
+                continue
+            dentro = decisoes.get(campos[i])
+            if dentro is None:
+                dentro = decisoes[campos[i]] = na_amostra(campos[i], fracao)
+            if dentro:
+                buf.write(linha)
+    buf.seek(0)
+    return pd.read_csv(buf, sep=sep, **kwargs)
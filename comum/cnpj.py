@@ -0,0 +1,32 @@
+"""
+CNPJ em texto ou como inteiro (ANS_CNPJ_INT=1) nas etapas do pipeline (Testes 1 e 2).
+Os dois modos partem dos mesmos digitos (cnpj_digitos), para aceitarem e rejeitarem as mesmas linhas.
+"""
+
+import pandas as pd
+
+
+def cnpj_digitos(serie: pd.Series) -> pd.Series:
+    """
+    So os digitos do CNPJ, como texto. Coluna numerica e convertida pelo valor: CSV lido sem dtype vira float
+    quando ha nulos, e str(11222333000181.0) teria um digito a mais.
+    """
+    if serie.dtype.kind == "f":
+        serie = serie.where((serie % 1 == 0) & (serie.abs() < 10 ** 18)).astype("Int64")
+    return serie.astype(str).str.replace(r"\D", "", regex=True)
+
+
+def cnpj_texto(serie: pd.Series) -> pd.Series:
+    """CNPJ como texto de 14 digitos (zeros a esquerda); sem digitos (nulo) fica vazio, nao "00000000000000"."""
+    digitos = cnpj_digitos(serie)
+    return digitos.where(digitos == "", digitos.str.zfill(14))
+
+
+def cnpj_para_int(serie: pd.Series, truncar: bool = False) -> pd.Series:
+    """
+    Digitos do CNPJ como Int64; vazio/invalido vira <NA>. Mais de 14 digitos tambem vira <NA>, como em
+    validacao.validar_cnpj; com truncar=True ficam os 14 primeiros (normalizacao em texto do Teste 1).
+    """
+    digitos = cnpj_digitos(serie)
+    digitos = digitos.str[:14] if truncar else digitos.where(digitos.str.len() <= 14, "")
+    return pd.to_numeric(digitos, errors="coerce").astype("Int64")
@@ -0,0 +1,42 @@
+"""
+Conversoes pandas <-> Polars dos motores Polars (ANS_MOTOR=polars) dos Testes 1 e 2, sem pyarrow.
+Polars e opcional: o modulo importa sem ele e as funcoes so sao chamadas quando o motor esta disponivel.
+Os motores importam pl daqui: versao anterior a POLARS_MINIMO conta como ausente (pl = None) e o pipeline usa
+o pandas, em vez de falhar com TypeError no meio do plano (collect_all(engine="streaming"),
+join(maintain_order="left") e map_batches(is_elementwise=...) nao existem nas versoes antigas).
+"""
+
+import re
+
+import pandas as pd
+
+POLARS_MINIMO = "1.26"
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+
+def _versao(texto: str) -> tuple:
+    return tuple(int(n) for n in re.findall(r"\d+", texto)[:2])
+
+
+if pl is not None and _versao(pl.__version__) < _versao(POLARS_MINIMO):
+    pl = None
+
+
+def de_pandas(df: pd.DataFrame) -> "pl.DataFrame":
+    """pandas -> Polars coluna a coluna (numericas via numpy, texto/nulos via lista); para tabelas pequenas."""
+    colunas = {}
+    for c in df.columns:
+        s = df[c]
+        if s.dtype.kind in "biuf" and not s.hasnans:
+            colunas[str(c)] = s.to_numpy()
+        else:
+            colunas[str(c)] = s.astype(object).where(s.notna(), None).tolist()
+    return pl.DataFrame(colunas)
+
+
+def para_pandas(df: "pl.DataFrame") -> pd.DataFrame:
+    return pd.DataFrame({c: df[c].to_numpy() for c in df.columns})
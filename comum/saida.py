@@ -0,0 +1,124 @@
+"""
+Gravacao dos artefatos CSV/ZIP em uma unica passada (Testes 1 e 2).
+O DataFrame e codificado em lotes e cada lote vai ao mesmo tempo para o CSV e para o membro do ZIP
+(sem gravar o CSV e depois reler para compactar). Arquivos sao gravados em .tmp e renomeados ao final
+(quem le nunca ve artefato pela metade) e o SHA-256 do conteudo CSV e calculado durante a escrita.
+"""
+
+import hashlib
+import logging
+import os
+import zipfile
+from pathlib import Path
+from typing import Iterable
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+LOTE_LINHAS = 100_000
+# Valores de ANS_SAIDA: o nome diz o que e gravado
+FORMATOS = ("csv+zip", "csv", "zip")
+
+
+def destinos(formato: str, csv_path: Path, zip_path: Path) -> tuple[Path | None, Path | None]:
+    """(csv_path, zip_path) a gravar conforme ANS_SAIDA: "csv+zip" os dois, "csv" so o CSV, "zip" so o ZIP."""
+    if formato not in FORMATOS:
+        raise ValueError("ANS_SAIDA invalido: %r (use %s)" % (formato, ", ".join(FORMATOS)))
+    return (csv_path if "csv" in formato else None), (zip_path if "zip" in formato else None)
+
+
+def _tmp(path: Path) -> Path:
+    return path.with_name(path.name + ".tmp")
+
+
+def _lotes_csv(lotes: Iterable[pd.DataFrame], colunas: list[str], sep: str):
+    """(bytes utf-8, numero de linhas): cabecalho e depois cada lote sem cabecalho."""
+    yield pd.DataFrame(columns=colunas).to_csv(index=False, sep=sep).encode("utf-8"), 0
+    for lote in lotes:
+        if not lote.empty:
+            yield lote.to_csv(index=False, sep=sep, header=False).encode("utf-8"), len(lote)
+
+
+def gravar_csv_zip(
+    df: pd.DataFrame,
+    csv_path: Path | None,
+    zip_path: Path | None,
+    membro: str,
+    sep: str = ";",
+    nivel_zip: int = 6,
+    lote_linhas: int = LOTE_LINHAS,
+) -> str:
+    """
+    Grava df como CSV em csv_path e/ou como membro `membro` de zip_path (None pula o artefato).
+    nivel_zip: 1-9 deflate (1 = mais rapido, para artefatos internos); 0 = sem compressao (stored).
+    Grava `<membro>.sha256` (formato sha256sum) ao lado do primeiro artefato e retorna o hash.
+    """
+    lotes = (df.iloc[ini:ini + lote_linhas] for ini in range(0, len(df), lote_linhas))
+    return gravar_lotes_csv_zip(lotes, list(df.columns), csv_path, zip_path, membro, sep, nivel_zip)
+
+
+def gravar_lotes_csv_zip(
+    lotes: Iterable[pd.DataFrame],
+    colunas: list[str],
+    csv_path: Path | None,
+    zip_path: Path | None,
+    membro: str,
+    sep: str = ";",
+    nivel_zip: int = 6,
+) -> str:
+    """Como gravar_csv_zip, mas consome lotes ja prontos (ex.: saida do merge externo) sem juntar tudo em memoria."""
+    return gravar_partes_csv_zip(_lotes_csv(lotes, colunas, sep), csv_path, zip_path, membro, nivel_zip)
+
+
+def gravar_partes_csv_zip(
+    partes: Iterable[tuple[bytes, int]],
+    csv_path: Path | None,
+    zip_path: Path | None,
+    membro: str,
+    nivel_zip: int = 6,
+) -> str:
+    """Nivel mais baixo: grava (bytes ja codificados, linhas) na ordem, incluindo o cabecalho (ex.: CSVs de checkpoint concatenados)."""
+    if csv_path is None and zip_path is None:
+        raise ValueError("Informe csv_path e/ou zip_path.")
+    destinos = [p for p in (csv_path, zip_path) if p is not None]
+    sha = hashlib.sha256()
+    f_csv = zf = membro_zip = None
+    try:
+        if csv_path is not None:
+            f_csv = open(_tmp(csv_path), "wb")
+        if zip_path is not None:
+            if nivel_zip > 0:
+                zf = zipfile.ZipFile(_tmp(zip_path), "w", zipfile.ZIP_DEFLATED, compresslevel=nivel_zip)
+            else:
+                zf = zipfile.ZipFile(_tmp(zip_path), "w", zipfile.ZIP_STORED)
+            membro_zip = zf.open(membro, "w", force_zip64=True)
+        linhas = 0
+        for chunk, n in partes:
+            linhas += n
+            sha.update(chunk)
+            if f_csv:
+                f_csv.write(chunk)
+            if membro_zip:
+                membro_zip.write(chunk)
+        if f_csv:
+            f_csv.close()
+        if membro_zip:
+            membro_zip.close()
+            zf.close()
+    except BaseException:
+        for arq in (f_csv, membro_zip, zf):
+            try:
+                if arq:
+                    arq.close()
+            except Exception:
+                pass
+        for p in destinos:
+            _tmp(p).unlink(missing_ok=True)
+        raise
+    for p in destinos:
+        os.replace(_tmp(p), p)
+    digest = sha.hexdigest()
+    (destinos[0].parent / (membro + ".sha256")).write_text("%s  %s\n" % (digest, membro), encoding="utf-8")
+    logger.info("Gravado %s (%d linhas, sha256 %s)", ", ".join(str(p) for p in destinos), linhas, digest[:12])
+    return digest
@@ -0,0 +1,164 @@
+"""
+Backfill da serie historica (main.py --since ANO / --all).
+Cada trimestre e independente (a chave de deduplicacao inclui Ano e Trimestre): baixa o ZIP, extrai,
+consolida so aquele trimestre e grava BACKFILL_DIR/<ano>_<trimestre>.csv + checkpoint.json.
+Uma execucao interrompida retoma dos trimestres que faltam; CSV de checkpoint com tamanho ou sha256
+diferente do registrado (truncado, editado) e reprocessado. ZIP e pasta extraida sao apagados
+ao fim de cada trimestre (disco limitado a ~BACKFILL_PARALELO trimestres brutos por vez).
+O consolidado final e a concatenacao dos CSVs de checkpoint em ordem: mesmo conteudo de
+consolidate_with_rules sobre todos os trimestres, sem recarregar a serie em memoria.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from config import BACKFILL_DIR, CNPJ_INT, CONSOLIDATED_CSV, CONSOLIDATED_ZIP, SAIDA_FORMATO, ZIP_NIVEL
+from download import baixar_zip, discover_quarter_zips, sessao
+from extract import carregar_trimestre
+from normalize import consolidate_with_rules, formatar_cnpj
+from comum.saida import destinos, gravar_csv_zip, gravar_partes_csv_zip
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = "checkpoint.json"
+BLOCO_BYTES = 1 << 20
+
+
+def _chave(ano: int, trim: int) -> str:
+    return "%d-%d" % (ano, trim)
+
+
+def ler_checkpoint(dir_backfill: Path) -> dict:
+    path = dir_backfill / CHECKPOINT
+    if not path.exists():
+        return {"trimestres": {}}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _gravar_checkpoint(dir_backfill: Path, estado: dict) -> None:
+    """tmp + fsync + rename: o checkpoint nunca fica corrompido se o processo morrer no meio."""
+    path = dir_backfill / CHECKPOINT
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _sha256(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloco in iter(lambda: f.read(BLOCO_BYTES), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+def _concluido(dir_backfill: Path, estado: dict, ano: int, trim: int) -> bool:
+    """Trimestre no checkpoint com o CSV intacto: tamanho (checkpoints antigos nao tem) e sha256 registrados."""
+    item = estado["trimestres"].get(_chave(ano, trim))
+    if not item:
+        return False
+    path = dir_backfill / item["arquivo"]
+    if not path.exists():
+        return False
+    if item.get("bytes", path.stat().st_size) != path.stat().st_size or _sha256(path) != item["sha256"]:
+        logger.warning("Checkpoint de %dT%d nao confere com %s: trimestre sera reprocessado", trim, ano, path.name)
+        return False
+    return True
+
+
+def processar_trimestre(url: str, ano: int, trim: int, cadastral_df: pd.DataFrame | None, dir_backfill: Path) -> dict:
+    """Baixa, extrai e consolida um trimestre; grava o CSV de checkpoint e apaga os arquivos brutos."""
+    zip_path = dir_backfill / ("%dT%d.zip" % (trim, ano))
+    extract_dir = dir_backfill / ("extract_%dT%d" % (trim, ano))
+    try:
+        baixar_zip(sessao(), url, zip_path)
+        frames = list(carregar_trimestre(zip_path, extract_dir))
+        consolidado = consolidate_with_rules(frames, cadastral_df)
+        del frames
+        if CNPJ_INT:
+            consolidado["CNPJ"] = formatar_cnpj(consolidado["CNPJ"])
+        arquivo = "%d_%d.csv" % (ano, trim)
+        sha = gravar_csv_zip(consolidado, dir_backfill / arquivo, None, arquivo)
+        return {"arquivo": arquivo, "linhas": len(consolidado), "sha256": sha,
+                "bytes": (dir_backfill / arquivo).stat().st_size,
+                "concluido_em": datetime.now().isoformat(timespec="seconds")}
+    finally:
+        zip_path.unlink(missing_ok=True)
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+
+def _partes_consolidado(dir_backfill: Path, itens: list[dict]):
+    """Cabecalho do primeiro CSV e depois o corpo de cada CSV de checkpoint, em blocos de bytes."""
+    for i, item in enumerate(itens):
+        with open(dir_backfill / item["arquivo"], "rb") as f:
+            cabecalho = f.readline()
+            if i == 0:
+                yield cabecalho, 0
+            linhas = item["linhas"]
+            while True:
+                bloco = f.read(BLOCO_BYTES)
+                if not bloco:
+                    break
+                yield bloco, linhas
+                linhas = 0
+
+
+def _fmt_duracao(segundos: float) -> str:
+    m, s = divmod(int(segundos), 60)
+    h, m = divmod(m, 60)
+    return "%dh%02dm%02ds" % (h, m, s) if h else "%dm%02ds" % (m, s)
+
+
+def run_backfill(output_dir: Path, cadastral_df: pd.DataFrame | None, desde: int | None, paralelo: int):
+    """Processa todos os trimestres publicados (ou a partir de `desde`) com checkpoint e gera o consolidado."""
+    dir_backfill = Path(BACKFILL_DIR)
+    dir_backfill.mkdir(parents=True, exist_ok=True)
+    trimestres = discover_quarter_zips(limite=None, desde=desde)
+    if not trimestres:
+        raise RuntimeError("Nenhum trimestre encontrado na API ANS.")
+    estado = ler_checkpoint(dir_backfill)
+    pendentes = [(u, a, t) for u, a, t in trimestres if not _concluido(dir_backfill, estado, a, t)]
+    # Mais antigos primeiro: a serie cresce em ordem e a retomada continua de onde parou
+    pendentes.sort(key=lambda q: (q[1], q[2]))
+    logger.info("Backfill: %d trimestres, %d ja no checkpoint, %d pendentes (%d em paralelo)",
+                len(trimestres), len(trimestres) - len(pendentes), len(pendentes), paralelo)
+
+    falhas = []
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, paralelo)) as pool:
+        futuros = {pool.submit(processar_trimestre, u, a, t, cadastral_df, dir_backfill): (a, t) for u, a, t in pendentes}
+        for feitos, fut in enumerate(as_completed(futuros), start=1):
+            ano, trim = futuros[fut]
+            try:
+                item = fut.result()
+            except Exception as e:
+                falhas.append((ano, trim))
+                logger.warning("Falha em %dT%d: %s", trim, ano, e)
+                continue
+            # Checkpoint so na thread principal: uma escrita por trimestre concluido
+            estado["trimestres"][_chave(ano, trim)] = item
+            _gravar_checkpoint(dir_backfill, estado)
+            decorrido = time.perf_counter() - inicio
+            restantes = len(pendentes) - feitos
+            logger.info("[%d/%d] %dT%d: %d linhas | decorrido %s | ETA %s", feitos, len(pendentes), trim, ano,
+                        item["linhas"], _fmt_duracao(decorrido), _fmt_duracao(decorrido / feitos * restantes))
+
+    if falhas:
+        raise RuntimeError("Backfill incompleto: %d trimestres falharam (%s). Rode novamente para retomar." % (
+            len(falhas), ", ".join("%dT%d" % (t, a) for a, t in sorted(falhas))))
+
+    itens = [estado["trimestres"][_chave(a, t)] for _, a, t in sorted(trimestres, key=lambda q: (q[1], q[2]))]
+    csv_path, zip_out = destinos(SAIDA_FORMATO, output_dir / CONSOLIDATED_CSV, output_dir / CONSOLIDATED_ZIP)
+    gravar_partes_csv_zip(_partes_consolidado(dir_backfill, itens), csv_path, zip_out, CONSOLIDATED_CSV, nivel_zip=ZIP_NIVEL)
+    return csv_path, zip_out
@@ -1,6 +1,7 @@
 """Configuracoes do pipeline Teste 1 - API ANS."""
 
 import os
+import sys
 
 BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis"
 OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
@@ -8,5 +9,39 @@ CONSOLIDATED_CSV = "consolidado_despesas.csv"
 CONSOLIDATED_ZIP = "consolidado_despesas.zip"
 NUM_QUARTERS = 3
 
+# Raiz do repositorio no sys.path: modulos compartilhados entre as etapas (comum/)
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.append(RAIZ)
+
+# CNPJ como int64 nos DataFrames (merge/dedup/sort em inteiros); string de 14 digitos so na escrita do CSV.
+# Mesma variavel em todo o pipeline (teste2, import_csv/run_ddl com BIGINT, API).
+CNPJ_INT = os.environ.get("ANS_CNPJ_INT", "0") == "1"
+
 # Palavras-chave para identificar arquivos de Despesas com Eventos/Sinistros
 DESPESAS_SINISTROS_KEYWORDS = ("despesas", "eventos", "sinistros", "despesa", "sinistro", "evento")
+
+# Linhas por lote ao ler planilhas XLSX em streaming (openpyxl read-only)
+XLSX_CHUNK_ROWS = int(os.environ.get("ANS_XLSX_CHUNK_ROWS", "50000"))
+
+# Artefatos de saida (comum/saida.py): "csv+zip" (padrao), "csv" ou "zip" (so o ZIP; teste2/teste3 leem o CSV de dentro dele)
+SAIDA_FORMATO = os.environ.get("ANS_SAIDA", "csv+zip")
+# Nivel deflate do ZIP: 6 = padrao zlib; 1 = bem mais rapido para artefatos internos; 0 = sem compressao
+ZIP_NIVEL = int(os.environ.get("ANS_ZIP_NIVEL", "6"))
+
+# Consolidacao fora de memoria (ordenacao externa em runs + merge k-way); mesmo CSV do caminho em memoria
+CONSOLIDACAO_EXTERNA = os.environ.get("ANS_CONSOLIDACAO_EXTERNA", "0") == "1"
+# Orcamento de memoria (MB) para os buffers de runs da consolidacao externa
+CONSOLIDACAO_MEMORIA_MB = int(os.environ.get("ANS_CONSOLIDACAO_MEMORIA_MB", "512"))
+
+# Backfill historico (main.py --since/--all): checkpoints por trimestre e trimestres processados em paralelo
+BACKFILL_DIR = os.path.join(OUTPUT_DIR, "backfill")
+BACKFILL_PARALELO = int(os.environ.get("ANS_BACKFILL_PARALELO", "2"))
+
+# Modo amostra (main.py --sample): fracao 0-1 das operadoras, por hash do REG_ANS (comum/amostra.py); 0 = tudo.
+# Mesma variavel no teste2 e no import_csv do teste3 para a amostra ser a mesma em todas as etapas.
+AMOSTRA = float(os.environ.get("ANS_AMOSTRA", "0"))
+
+# Motor das transformacoes: "pandas" (padrao) ou "polars" (plano lazy multi-thread, motor_polars.py; requer
+# pip install polars). Sem polars instalado, ou com arquivos no formato generico, cai para o pandas.
+MOTOR = os.environ.get("ANS_MOTOR", "pandas")
@@ -1,5 +1,6 @@
-"""Descoberta e download dos ZIPs de demonstracoes contabeis (ultimos N trimestres)."""
+"""Descoberta e download dos ZIPs de demonstracoes contabeis (ultimos N trimestres ou serie historica)."""
 
+import os
 import re
 import logging
 from pathlib import Path
@@ -42,13 +43,18 @@ def _parse_quarter_zip(url: str) -> tuple[int, int] | None:
     return int(m.group(2)), int(m.group(1))
 
 
-def discover_quarter_zips() -> list[tuple[str, int, int]]:
+def sessao() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({"User-Agent": "Mozilla/5.0 (compatible; ANS-ETL/1.0)"})
+    return session
+
+
+def discover_quarter_zips(limite: int | None = NUM_QUARTERS, desde: int | None = None) -> list[tuple[str, int, int]]:
     """
-    Descobre os ultimos NUM_QUARTERS trimestres disponiveis.
+    Descobre os ultimos `limite` trimestres disponiveis (None = todos), opcionalmente so a partir do ano `desde`.
     Retorna lista de (url_zip, ano, trimestre) ordenada do mais recente ao mais antigo.
     """
-    session = requests.Session()
-    session.headers.update({"User-Agent": "Mozilla/5.0 (compatible; ANS-ETL/1.0)"})
+    session = sessao()
 
     # Listar anos
     resp = session.get(BASE_URL)
@@ -56,6 +62,8 @@ def discover_quarter_zips() -> list[tuple[str, int, int]]:
     base_with_trailing = BASE_URL.rstrip("/") + "/"
     links = _parse_index_links(resp.text, BASE_URL)
     year_dirs = [u for u in links if _is_year_dir(u)]
+    if desde is not None:
+        year_dirs = [u for u in year_dirs if int(u.rstrip("/").split("/")[-1]) >= desde]
     year_dirs.sort(key=lambda u: u.split("/")[-2], reverse=True)
 
     all_quarters: list[tuple[str, int, int]] = []
@@ -70,27 +78,44 @@ def discover_quarter_zips() -> list[tuple[str, int, int]]:
                 all_quarters.append((link, ano, trim))
 
     all_quarters.sort(key=lambda x: (x[1], x[2]), reverse=True)
-    selected = all_quarters[:NUM_QUARTERS]
-    logger.info("Trimestres selecionados: %s", [(a, t) for _, a, t in selected])
+    selected = all_quarters[:limite] if limite is not None else all_quarters
+    if limite is not None:
+        logger.info("Trimestres selecionados: %s", [(a, t) for _, a, t in selected])
+    elif selected:
+        _, ano_ini, trim_ini = selected[-1]
+        _, ano_fim, trim_fim = selected[0]
+        logger.info("Trimestres selecionados: %d (%dT%d a %dT%d)", len(selected), trim_ini, ano_ini, trim_fim, ano_fim)
     return selected
 
 
+def baixar_zip(session: requests.Session, url: str, path: Path) -> Path:
+    """Baixa em streaming para <path>.part e renomeia ao final (ZIP nunca fica pela metade nem inteiro em memoria)."""
+    tmp = path.with_name(path.name + ".part")
+    try:
+        with session.get(url, timeout=120, stream=True) as r:
+            r.raise_for_status()
+            with open(tmp, "wb") as f:
+                for bloco in r.iter_content(chunk_size=1 << 20):
+                    f.write(bloco)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
+
 def download_zips(
     quarter_list: list[tuple[str, int, int]], dest_dir: str | Path | None = None
 ) -> list[Path]:
     """Baixa cada ZIP no diretorio dest_dir. Retorna lista de paths dos ZIPs baixados."""
     dest_dir = Path(dest_dir or OUTPUT_DIR)
     dest_dir.mkdir(parents=True, exist_ok=True)
-    session = requests.Session()
-    session.headers.update({"User-Agent": "Mozilla/5.0 (compatible; ANS-ETL/1.0)"})
+    session = sessao()
     downloaded = []
     for url, ano, trim in quarter_list:
         fname = f"{trim}T{ano}.zip"
         path = dest_dir / fname
         try:
-            r = session.get(url, timeout=120)
-            r.raise_for_status()
-            path.write_bytes(r.content)
+            baixar_zip(session, url, path)
             downloaded.append(path)
             logger.info("Baixado: %s -> %s", url, path)
         except Exception as e:
@@ -3,8 +3,13 @@
 import zipfile
 import logging
 from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
 
 from config import DESPESAS_SINISTROS_KEYWORDS
+from normalize import load_file
+from planilha import SUFIXOS_PLANILHA, cabecalho_planilha
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +30,37 @@ def extract_zip(zip_path: Path, out_dir: Path) -> Path:
     return out_dir
 
 
+def trimestre_do_zip(zip_path: Path) -> tuple[int, int]:
+    """(ano, trimestre) a partir do nome do ZIP (ex.: 1T2025.zip); (0, 0) se fora do padrao."""
+    name = zip_path.stem
+    if len(name) >= 5 and name[0].isdigit() and name[-4:].isdigit():
+        return int(name[-4:]), int(name[0])
+    return 0, 0
+
+
+def arquivos_trimestre(zip_path: Path, extract_dir: Path) -> Iterator[tuple[Path, int, int]]:
+    """Extrai o ZIP de um trimestre e lista (arquivo, ano, trimestre) de cada CSV/TXT/planilha, na ordem de processamento."""
+    ano, trim = trimestre_do_zip(zip_path)
+    try:
+        extract_zip(zip_path, extract_dir)
+    except Exception as e:
+        logger.warning("Falha ao extrair %s: %s", zip_path, e)
+        return
+    files = [f for suf in ("*.csv", "*.txt", "*.xlsx", "*.xls") for f in extract_dir.rglob(suf)]
+    for f in files:
+        if f.is_file():
+            yield f, ano, trim
+
+
+def carregar_trimestre(zip_path: Path, extract_dir: Path, fracao: float = 0.0) -> Iterator[pd.DataFrame]:
+    """Extrai o ZIP de um trimestre e normaliza cada arquivo (CSV/TXT/planilha) com load_file, um por vez; fracao: comum/amostra.py."""
+    for f, ano, trim in arquivos_trimestre(zip_path, extract_dir):
+        df = load_file(f, ano, trim, fracao)
+        if df is not None and not df.empty:
+            logger.info("Processado %s (%d linhas)", f.name, len(df))
+            yield df
+
+
 def find_despesas_files(extract_dir: Path) -> list[Path]:
     """
     Percorre extract_dir e retorna arquivos que parecem conter dados de
@@ -39,10 +75,9 @@ def find_despesas_files(extract_dir: Path) -> list[Path]:
             continue
         first_line = ""
         try:
-            if suf == ".xlsx" or suf == ".xls":
-                import pandas as pd
-                df = pd.read_excel(path, nrows=1, header=0)
-                first_line = " ".join(df.astype(str).values.flatten().tolist()) if not df.empty else ""
+            if suf in SUFIXOS_PLANILHA:
+                # So a primeira linha da aba (openpyxl read-only), sem abrir a planilha inteira
+                first_line = " ".join(cabecalho_planilha(path))
             else:
                 for enc in ("utf-8", "latin-1", "cp1252"):
                     try:
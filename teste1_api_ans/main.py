@@ -2,18 +2,33 @@
 Pipeline Teste 1: Integracao com API ANS.
 Baixa demonstracoes contabeis (ultimos 3 trimestres), processa Despesas com Eventos/Sinistros,
 enriquece com cadastro de operadoras, consolida em CSV e gera consolidado_despesas.zip.
+
+Serie historica com checkpoint por trimestre (retoma se interrompido):
+    python main.py --since 2010 [--paralelo 2]
+    python main.py --all
+
+Rodada rapida com uma fracao deterministica das operadoras (mesma amostra no teste2/teste3):
+    python main.py --sample 0.02
 """
 
+import argparse
 import logging
-import zipfile
 from pathlib import Path
 
 import requests
 
-from config import OUTPUT_DIR, CONSOLIDATED_CSV, CONSOLIDATED_ZIP
+from config import (
+    OUTPUT_DIR, CONSOLIDATED_CSV, CONSOLIDATED_ZIP, CNPJ_INT, SAIDA_FORMATO, ZIP_NIVEL,
+    CONSOLIDACAO_EXTERNA, CONSOLIDACAO_MEMORIA_MB, BACKFILL_PARALELO, AMOSTRA, MOTOR,
+)
+from backfill import run_backfill
 from download import discover_quarter_zips, download_zips
-from extract import extract_zip, find_despesas_files
-from normalize import load_file, consolidate_with_rules, load_cadastral
+from extract import carregar_trimestre
+from normalize import amostrar_cadastro, consolidate_with_rules, load_cadastral, formatar_cnpj, preparar_cadastro, TARGET_COLUMNS
+from ordenacao_externa import ConsolidadorExterno
+import motor_polars
+from comum.polars_pandas import POLARS_MINIMO
+from comum.saida import destinos, gravar_csv_zip, gravar_lotes_csv_zip
 
 CADOP_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
 
@@ -36,7 +51,16 @@ def download_cadastral(dest_dir: Path) -> Path | None:
         return None
 
 
-def run():
+def _cadastro(output_dir: Path):
+    cad_path = download_cadastral(output_dir)
+    if cad_path and cad_path.exists():
+        cadastral_df = load_cadastral(cad_path)
+        if not cadastral_df.empty:
+            return cadastral_df
+    return None
+
+
+def run(fracao: float = 0.0):
     output_dir = Path(OUTPUT_DIR)
     output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -50,50 +74,87 @@ def run():
     if not zip_paths:
         raise RuntimeError("Nenhum ZIP foi baixado.")
 
-    cadastral_df = None
-    cad_path = download_cadastral(output_dir)
-    if cad_path and cad_path.exists():
-        cadastral_df = load_cadastral(cad_path)
-        if cadastral_df.empty:
-            cadastral_df = None
+    cadastral_df = _cadastro(output_dir)
+    if fracao:
+        cadastral_df = amostrar_cadastro(cadastral_df, fracao)
+        logger.info("Amostra de %.1f%% das operadoras (%d no cadastro)", fracao * 100, 0 if cadastral_df is None else len(cadastral_df))
 
+    # Modo externo: cada arquivo vai direto para runs em disco em vez de acumular em all_frames
+    consolidador = ConsolidadorExterno(cadastral_df, CONSOLIDACAO_MEMORIA_MB, str(output_dir)) if CONSOLIDACAO_EXTERNA else None
+    try:
+        return _processar(zip_paths, output_dir, cadastral_df, consolidador, fracao)
+    finally:
+        if consolidador:
+            consolidador.fechar()
+
+
+def _processar(zip_paths: list[Path], output_dir: Path, cadastral_df, consolidador: ConsolidadorExterno | None,
+               fracao: float = 0.0):
+    csv_path, zip_out = destinos(SAIDA_FORMATO, output_dir / CONSOLIDATED_CSV, output_dir / CONSOLIDATED_ZIP)
+    if MOTOR == "polars" and not consolidador:
+        if not motor_polars.disponivel():
+            logger.warning("ANS_MOTOR=polars sem o pacote polars (>= %s) instalado: usando o motor pandas", POLARS_MINIMO)
+        else:
+            consolidated = motor_polars.consolidar(zip_paths, output_dir, cadastral_df, fracao)
+            if consolidated is not None:
+                return _gravar_consolidado(consolidated, csv_path, zip_out)
     all_frames = []
+    processados = 0
+    cnpjs_amostra = None
+    if fracao:
+        cad = preparar_cadastro(cadastral_df)
+        cnpjs_amostra = set(cad["CNPJ"]) if cad is not None else set()
     for zip_path in zip_paths:
-        name = zip_path.stem
-        if len(name) >= 5 and name[0].isdigit() and name[-4:].isdigit():
-            trim = int(name[0])
-            ano = int(name[-4:])
-        else:
-            trim, ano = 0, 0
-        extract_dir = output_dir / f"extract_{name}"
-        try:
-            extract_zip(zip_path, extract_dir)
-        except Exception as e:
-            logger.warning("Falha ao extrair %s: %s", zip_path, e)
-            continue
-        files = list(extract_dir.rglob("*.csv")) + list(extract_dir.rglob("*.txt"))
-        for f in files:
-            if not f.is_file():
-                continue
-            df = load_file(f, ano, trim)
-            if df is not None and not df.empty:
+        for df in carregar_trimestre(zip_path, output_dir / f"extract_{zip_path.stem}", fracao):
+            if cnpjs_amostra is not None and "REG_ANS" not in df.columns:
+                # Formato generico (sem REG_ANS): operadoras da amostra pelo CNPJ do cadastro amostrado
+                df = df[df["CNPJ"].isin(cnpjs_amostra)]
+            if consolidador:
+                consolidador.adicionar(df)
+            else:
                 all_frames.append(df)
-                logger.info("Processado %s (%d linhas)", f.name, len(df))
+            processados += 1
 
-    if not all_frames:
+    if not processados:
         raise RuntimeError("Nenhum dado de despesas processado. Verifique estrutura dos ZIPs.")
 
-    consolidated = consolidate_with_rules(all_frames, cadastral_df)
-    csv_path = output_dir / CONSOLIDATED_CSV
-    consolidated.to_csv(csv_path, index=False, sep=";", encoding="utf-8")
-    logger.info("CSV consolidado salvo: %s (%d linhas)", csv_path, len(consolidated))
+    # CSV e ZIP numa passada (tee), gravacao atomica e consolidado_despesas.csv.sha256
+    if consolidador:
+        lotes = consolidador.lotes()
+        if CNPJ_INT:
+            lotes = (lote.assign(CNPJ=formatar_cnpj(lote["CNPJ"])) for lote in lotes)
+        gravar_lotes_csv_zip(lotes, TARGET_COLUMNS, csv_path, zip_out, CONSOLIDATED_CSV, nivel_zip=ZIP_NIVEL)
+        return csv_path, zip_out
+    return _gravar_consolidado(consolidate_with_rules(all_frames, cadastral_df), csv_path, zip_out)
+
 
-    zip_out = output_dir / CONSOLIDATED_ZIP
-    with zipfile.ZipFile(zip_out, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.write(csv_path, CONSOLIDATED_CSV)
-    logger.info("ZIP gerado: %s", zip_out)
+def _gravar_consolidado(consolidated, csv_path: Path | None, zip_out: Path | None):
+    if CNPJ_INT:
+        consolidated["CNPJ"] = formatar_cnpj(consolidated["CNPJ"])
+    gravar_csv_zip(consolidated, csv_path, zip_out, CONSOLIDATED_CSV, nivel_zip=ZIP_NIVEL)
     return csv_path, zip_out
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Teste 1 - Integracao com API ANS")
+    serie = parser.add_mutually_exclusive_group()
+    serie.add_argument("--since", type=int, metavar="ANO", help="Backfill de todos os trimestres a partir de ANO")
+    serie.add_argument("--all", action="store_true", help="Backfill de todos os trimestres publicados")
+    parser.add_argument("--paralelo", type=int, default=BACKFILL_PARALELO, help="Trimestres processados ao mesmo tempo no backfill")
+    parser.add_argument("--sample", type=float, default=AMOSTRA, metavar="FRACAO",
+                        help="Processa so uma fracao (0-1) das operadoras, por hash do REG_ANS (padrao: ANS_AMOSTRA)")
+    args = parser.parse_args()
+    if not 0 <= args.sample <= 1:
+        parser.error("--sample deve estar entre 0 e 1")
+    if args.since is None and not args.all:
+        return run(args.sample)
+    if args.sample:
+        # Checkpoints do backfill sao por trimestre completo: misturar amostra e dados completos os corromperia
+        parser.error("--sample nao se aplica ao backfill (--since/--all)")
+    output_dir = Path(OUTPUT_DIR)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return run_backfill(output_dir, _cadastro(output_dir), args.since, args.paralelo)
+
+
 if __name__ == "__main__":
-    run()
+    main()
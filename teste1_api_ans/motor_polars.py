@@ -0,0 +1,142 @@
+"""
+Motor Polars (ANS_MOTOR=polars) da consolidacao do Teste 1.
+Leitura, filtro da conta 41, join com o cadastro, dedup e ordenacao viram um unico plano lazy, otimizado
+(projecao e filtros empurrados para a leitura) e executado em paralelo e em streaming a partir dos CSVs.
+Resultado igual ao de carregar_trimestre + consolidate_with_rules (motor pandas).
+
+CSVs no formato ANS sao lidos com scan_csv em utf8-lossy: em latin-1/cp1252 so a DESCRICAO (nao usada)
+perde acentos; REG_ANS, conta e valor sao ASCII. So a primeira linha e lida para reconhecer o formato.
+Planilhas passam pelos leitores pandas (normalize.load_file) e entram no plano ja normalizadas. Arquivos no
+formato generico (CNPJ sem REG_ANS) devolvem None: o chamador usa o motor pandas para a execucao inteira.
+A amostra (fracao > 0) e o mesmo hash de REG_ANS do pandas, aplicado no scan, com ou sem cadastro.
+Polars e opcional (pip install "polars>=1.26"); conversoes com o pandas em comum/polars_pandas.py.
+"""
+
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from config import CNPJ_INT
+from comum.amostra import na_amostra
+from comum.polars_pandas import de_pandas, para_pandas, pl
+from extract import arquivos_trimestre
+from normalize import CONTA_DESPESAS_EVENTOS_SINISTROS, TARGET_COLUMNS, _formato_ans, load_file, preparar_cadastro
+
+logger = logging.getLogger(__name__)
+
+
+def disponivel() -> bool:
+    return pl is not None
+
+
+def _na_amostra(fracao: float):
+    """Mascara de REG_ANS na amostra para map_batches: hash uma vez por valor distinto do lote (mascara_registro)."""
+    def mascara(s: "pl.Series") -> "pl.Series":
+        return s.is_in([v for v in s.unique().to_list() if v is not None and na_amostra(v, fracao)])
+    return mascara
+
+
+# Como o parser do pandas (read_csv com decimal=",") decide o tipo de VL_SALDO_FINAL: int64 se todas as
+# celulas sao inteiros, float64 se todas sao numeros, senao texto (e to_numeric decide pelas linhas da conta 41)
+_INTEIRO = r"^\s*[+-]?\d+\s*$"
+_NUMERO = r"^\s*[+-]?(\d+(,\d*)?|,\d+)([eE][+-]?\d+)?\s*$"
+
+
+def _scan_demonstracoes(path: Path, ano: int, trimestre: int, fracao: float = 0.0):
+    """
+    Mesmas regras de normalize._normalizar_demonstracoes (e da amostra), como expressoes sobre o scan do CSV.
+    Devolve (linhas, tipo): tipo e um LazyFrame de uma linha com `inteiro` (o pandas leria ValorDespesas
+    como int64) e `linhas` (da conta 41; arquivo sem elas nao entra no concat do pandas).
+    """
+    nomes = {c: str(c).strip().upper() for c in pl.scan_csv(path, separator=";", encoding="utf8-lossy").collect_schema().names()}
+    # Valor como texto: o tipo sai das regras do pandas, nao da inferencia do Polars nas primeiras linhas
+    valor_original = next(c for c, n in nomes.items() if n == "VL_SALDO_FINAL")
+    lf = pl.scan_csv(
+        path, separator=";", infer_schema_length=10000, encoding="utf8-lossy", schema_overrides={valor_original: pl.String}
+    ).rename(nomes)
+    lf = lf.with_columns(pl.col("REG_ANS").cast(pl.String).str.strip_chars().str.replace_all('"', "", literal=True))
+    if fracao:
+        # Antes do filtro da conta: no pandas, o tipo do valor vem de todas as linhas da amostra
+        lf = lf.filter(pl.col("REG_ANS").map_batches(_na_amostra(fracao), return_dtype=pl.Boolean, is_elementwise=True))
+    texto = pl.col("VL_SALDO_FINAL")
+    decimal = texto.str.strip_chars().str.replace(",", ".", literal=True)
+    conta = pl.col("CD_CONTA_CONTABIL").cast(pl.String).str.strip_chars() == CONTA_DESPESAS_EVENTOS_SINISTROS
+    tipo = lf.select(
+        coluna_inteira=(texto.is_not_null() & texto.str.contains(_INTEIRO)).all(),
+        coluna_numerica=(texto.is_null() | texto.str.contains(_NUMERO)).all(),
+        conta_inteira=(texto.is_not_null() & decimal.str.contains(_INTEIRO)).filter(conta).all(),
+        linhas=conta.sum(),
+    ).select(
+        inteiro=pl.col("coluna_inteira") | (~pl.col("coluna_numerica") & pl.col("conta_inteira")),
+        linhas="linhas",
+    )
+    linhas = lf.filter(conta).select(
+        "REG_ANS",
+        pl.lit(ano, dtype=pl.Int64).alias("Ano"),
+        pl.lit(trimestre, dtype=pl.Int64).alias("Trimestre"),
+        decimal.cast(pl.Float64, strict=False).fill_null(0).alias("ValorDespesas"),
+    )
+    return linhas, tipo
+
+
+def _ler(path: Path, ano: int, trimestre: int, fracao: float = 0.0):
+    """
+    (LazyFrame com REG_ANS, Ano, Trimestre, ValorDespesas; tipo como em _scan_demonstracoes ou True/False para
+    int64 no pandas), None se o arquivo nao tiver dados, False se for generico.
+    """
+    if path.suffix.lower() in (".csv", ".txt"):
+        with open(path, "rb") as f:
+            cabecalho = f.readline(500).decode("utf-8", errors="replace")
+        if _formato_ans(cabecalho):
+            return _scan_demonstracoes(path, ano, trimestre, fracao)
+    df = load_file(path, ano, trimestre, fracao)
+    if df is None or df.empty:
+        return None
+    if "REG_ANS" not in df.columns:
+        return False
+    return de_pandas(df).lazy(), df["ValorDespesas"].dtype.kind in "iu"
+
+
+def consolidar(zip_paths: list[Path], output_dir: Path, cadastral_df: pd.DataFrame | None, fracao: float = 0.0):
+    """
+    Consolidado (TARGET_COLUMNS) pelo plano Polars; None se algum arquivo exigir o motor pandas.
+    Com fracao > 0 so as linhas das operadoras da amostra saem da leitura (o cadastro ja vem amostrado).
+    """
+    partes, tipos = [], []
+    for zip_path in zip_paths:
+        for path, ano, trimestre in arquivos_trimestre(zip_path, output_dir / f"extract_{zip_path.stem}"):
+            lido = _ler(path, ano, trimestre, fracao)
+            if lido is False:
+                logger.warning("%s no formato generico: consolidacao pelo motor pandas", path.name)
+                return None
+            if lido is not None:
+                partes.append(lido[0])
+                tipos.append(lido[1])
+    if not partes:
+        raise RuntimeError("Nenhum dado de despesas processado. Verifique estrutura dos ZIPs.")
+    lf = pl.concat(partes, how="vertical_relaxed").filter(pl.col("ValorDespesas") > 0)
+    cad = preparar_cadastro(cadastral_df)
+    if cad is None:
+        lf = lf.with_columns(CNPJ=pl.lit(""), RazaoSocial=pl.lit(""))
+    else:
+        lf = lf.join(de_pandas(cad).lazy(), on="REG_ANS", how="left", maintain_order="left")
+        if CNPJ_INT:
+            lf = lf.filter(pl.col("CNPJ").is_not_null() & (pl.col("CNPJ") > 0)).with_columns(pl.col("CNPJ").cast(pl.Int64))
+        else:
+            lf = lf.filter(pl.col("CNPJ").is_not_null() & (pl.col("CNPJ").str.len_chars() >= 14))
+    lf = (
+        lf.unique(subset=["CNPJ", "Ano", "Trimestre"], keep="first", maintain_order=True)
+        .sort(["Ano", "Trimestre", "CNPJ"], maintain_order=True)
+        .select(TARGET_COLUMNS)
+    )
+    escaneados = [t for t in tipos if isinstance(t, pl.LazyFrame)]
+    out, *escaneados = pl.collect_all([lf, *escaneados], engine="streaming")
+    # pd.concat do motor pandas: int64 so se todo arquivo com linhas da conta 41 foi lido como int64
+    inteiro = all(t for t in tipos if not isinstance(t, pl.LazyFrame)) and all(
+        t["inteiro"][0] for t in escaneados if t["linhas"][0]
+    )
+    if inteiro:
+        out = out.with_columns(pl.col("ValorDespesas").cast(pl.Int64))
+    logger.info("Consolidado (motor polars): %d linhas de %d arquivos", len(out), len(partes))
+    return para_pandas(out)
@@ -6,6 +6,11 @@ from pathlib import Path
 
 import pandas as pd
 
+from config import CNPJ_INT
+from comum.amostra import ler_csv_amostrado, mascara_registro
+from comum.cnpj import cnpj_para_int
+from planilha import SUFIXOS_PLANILHA, cabecalho_planilha, ler_planilha
+
 logger = logging.getLogger(__name__)
 
 TARGET_COLUMNS = ["CNPJ", "RazaoSocial", "Trimestre", "Ano", "ValorDespesas"]
@@ -22,6 +27,11 @@ def _normalize_cnpj(val) -> str:
     return s[:14].zfill(14) if len(s) >= 14 else s.zfill(14)
 
 
+def formatar_cnpj(serie: pd.Series) -> pd.Series:
+    """CNPJ inteiro -> string de 14 digitos (somente nas saidas)."""
+    return serie.map(lambda v: "" if pd.isna(v) or v == "" else "%014d" % v)
+
+
 def _parse_trimestre_from_data(data_str: str) -> tuple[int, int]:
     """De DATA no formato YYYY-MM-DD retorna (ano, trimestre)."""
     try:
@@ -44,14 +54,18 @@ def _parse_trimestre_from_data(data_str: str) -> tuple[int, int]:
     return 0, 0
 
 
-def load_demonstracoes_ans(path: Path, ano: int, trimestre: int) -> pd.DataFrame | None:
+def load_demonstracoes_ans(path: Path, ano: int, trimestre: int, fracao: float = 0.0) -> pd.DataFrame | None:
     """
     Carrega CSV no formato ANS (DATA, REG_ANS, CD_CONTA_CONTABIL, DESCRICAO, VL_SALDO_INICIAL, VL_SALDO_FINAL).
     Filtra pela conta de Despesas com Eventos/Sinistros (conta 41) e retorna REG_ANS, Ano, Trimestre, ValorDespesas.
+    Com fracao > 0, so as linhas das operadoras da amostra chegam ao parser.
     """
     for enc in ("utf-8", "latin-1", "cp1252"):
         try:
-            df = pd.read_csv(path, sep=";", encoding=enc, decimal=",", low_memory=False)
+            if fracao:
+                df = ler_csv_amostrado(path, fracao, encoding=enc, decimal=",", low_memory=False)
+            else:
+                df = pd.read_csv(path, sep=";", encoding=enc, decimal=",", low_memory=False)
             break
         except Exception as e:
             logger.debug("Encoding %s em %s: %s", enc, path, e)
@@ -60,6 +74,11 @@ def load_demonstracoes_ans(path: Path, ano: int, trimestre: int) -> pd.DataFrame
         return None
     if df.empty:
         return None
+    return _normalizar_demonstracoes(df, ano, trimestre)
+
+
+def _normalizar_demonstracoes(df: pd.DataFrame, ano: int, trimestre: int) -> pd.DataFrame | None:
+    """Filtra a conta 41 de um DataFrame (ou lote) no formato ANS; None se faltarem colunas."""
     df.columns = [str(c).strip().upper() for c in df.columns]
     required = {"REG_ANS", "CD_CONTA_CONTABIL", "VL_SALDO_FINAL"}
     if not required.issubset(set(df.columns)):
@@ -67,6 +86,9 @@ def load_demonstracoes_ans(path: Path, ano: int, trimestre: int) -> pd.DataFrame
     mask = df["CD_CONTA_CONTABIL"].astype(str).str.strip() == CONTA_DESPESAS_EVENTOS_SINISTROS
     df = df.loc[mask, ["REG_ANS", "VL_SALDO_FINAL"]].copy()
     df = df.rename(columns={"VL_SALDO_FINAL": "ValorDespesas"})
+    if not pd.api.types.is_numeric_dtype(df["ValorDespesas"]):
+        # Celulas de texto em planilhas ("1234,56"); no CSV o decimal="," ja converte
+        df["ValorDespesas"] = df["ValorDespesas"].astype(str).str.strip().str.replace(",", ".")
     df["ValorDespesas"] = pd.to_numeric(df["ValorDespesas"], errors="coerce").fillna(0)
     df["Ano"] = ano
     df["Trimestre"] = trimestre
@@ -74,12 +96,21 @@ def load_demonstracoes_ans(path: Path, ano: int, trimestre: int) -> pd.DataFrame
     return df[["REG_ANS", "Ano", "Trimestre", "ValorDespesas"]]
 
 
-def load_file(path: Path, ano: int, trimestre: int) -> pd.DataFrame | None:
+def _formato_ans(cabecalho: str) -> bool:
+    cols_upper = cabecalho.upper()
+    return "REG_ANS" in cols_upper and "CD_CONTA_CONTABIL" in cols_upper and "VL_SALDO_FINAL" in cols_upper
+
+
+def load_file(path: Path, ano: int, trimestre: int, fracao: float = 0.0) -> pd.DataFrame | None:
     """
     Carrega um arquivo (CSV no formato ANS ou generico) e normaliza para schema com REG_ANS, Ano, Trimestre, ValorDespesas.
     Para formato ANS (colunas DATA, REG_ANS, CD_CONTA_CONTABIL, DESCRICAO, VL_*), usa load_demonstracoes_ans.
+    Planilhas (.xlsx/.xls) vao para load_planilha. fracao > 0: so operadoras da amostra (formato generico,
+    sem REG_ANS, e filtrado depois pelo CNPJ do cadastro amostrado).
     """
     suf = path.suffix.lower()
+    if suf in SUFIXOS_PLANILHA:
+        return load_planilha(path, ano, trimestre, fracao)
     if suf not in (".csv", ".txt"):
         return None
     for enc in ("utf-8", "latin-1", "cp1252"):
@@ -90,12 +121,35 @@ def load_file(path: Path, ano: int, trimestre: int) -> pd.DataFrame | None:
             continue
     else:
         return None
-    cols_upper = peek.upper()
-    if "REG_ANS" in cols_upper and "CD_CONTA_CONTABIL" in cols_upper and "VL_SALDO_FINAL" in cols_upper:
-        return load_demonstracoes_ans(path, ano, trimestre)
+    if _formato_ans(peek):
+        return load_demonstracoes_ans(path, ano, trimestre, fracao)
     return _load_file_generic(path, ano, trimestre)
 
 
+def load_planilha(path: Path, ano: int, trimestre: int, fracao: float = 0.0) -> pd.DataFrame | None:
+    """
+    Planilha no formato ANS ou generico, lida em lotes (planilha.ler_planilha) e normalizada lote a lote
+    pelas mesmas funcoes dos CSVs: so as linhas ja filtradas ficam em memoria, nao a planilha inteira.
+    """
+    try:
+        normalizar = _normalizar_demonstracoes if _formato_ans(" ".join(cabecalho_planilha(path))) else _normalizar_generico
+        partes = []
+        for lote in ler_planilha(path):
+            parte = normalizar(lote, ano, trimestre)
+            if parte is None:
+                return None
+            if fracao and "REG_ANS" in parte.columns:
+                parte = parte[mascara_registro(parte["REG_ANS"], fracao)]
+            if not parte.empty:
+                partes.append(parte)
+    except Exception as e:
+        logger.warning("Falha ao ler planilha %s: %s", path, e)
+        return None
+    if not partes:
+        return None
+    return pd.concat(partes, ignore_index=True)
+
+
 def _load_file_generic(path: Path, ano: int, trimestre: int) -> pd.DataFrame | None:
     """Fallback para CSVs com colunas CNPJ, Razao Social, valor."""
     import pandas as pd
@@ -110,6 +164,11 @@ def _load_file_generic(path: Path, ano: int, trimestre: int) -> pd.DataFrame | N
         return None
     if df.empty:
         return None
+    return _normalizar_generico(df, ano, trimestre)
+
+
+def _normalizar_generico(df: pd.DataFrame, ano: int, trimestre: int) -> pd.DataFrame | None:
+    """Mapeia colunas CNPJ/razao social/valor de um DataFrame (ou lote) generico; None se nao houver CNPJ e valor."""
     df = df.rename(columns=lambda x: str(x).strip() if isinstance(x, str) else x)
     cnpj_col = next((c for c in df.columns if "cnpj" in str(c).lower()), None)
     razao_col = next((c for c in df.columns if "razao" in str(c).lower() or "social" in str(c).lower() or "denominacao" in str(c).lower()), None)
@@ -123,36 +182,76 @@ def _load_file_generic(path: Path, ano: int, trimestre: int) -> pd.DataFrame | N
     out["Ano"] = ano
     out["ValorDespesas"] = pd.to_numeric(df[value_col].astype(str).str.replace(",", "."), errors="coerce").fillna(0)
     out = out[out["CNPJ"].str.len() >= 14]
+    if CNPJ_INT:
+        out["CNPJ"] = cnpj_para_int(out["CNPJ"], truncar=True)
     return out
 
 
+def _coluna_registro(cadastral_df: pd.DataFrame):
+    return next((c for c in cadastral_df.columns if "registro" in str(c).lower() or c == "Registro_ANS"), None)
+
+
+def amostrar_cadastro(cadastral_df: pd.DataFrame | None, fracao: float) -> pd.DataFrame | None:
+    """Cadastro so com as operadoras da amostra (mesmo hash de REG_ANS das demonstracoes)."""
+    if cadastral_df is None or not fracao:
+        return cadastral_df
+    reg_col = _coluna_registro(cadastral_df)
+    if reg_col is None:
+        return cadastral_df
+    return cadastral_df[mascara_registro(cadastral_df[reg_col], fracao)].reset_index(drop=True)
+
+
+def preparar_cadastro(cadastral_df: pd.DataFrame | None) -> pd.DataFrame | None:
+    """REG_ANS -> CNPJ, RazaoSocial a partir do cadastro (primeira ocorrencia por REG_ANS); None se nao der para mapear."""
+    if cadastral_df is None or cadastral_df.empty:
+        return None
+    reg_col = _coluna_registro(cadastral_df)
+    cnpj_col = next((c for c in cadastral_df.columns if "cnpj" in str(c).lower()), None)
+    razao_col = next((c for c in cadastral_df.columns if "razao" in str(c).lower() or "razao_social" in str(c).lower() or "denominacao" in str(c).lower()), None)
+    if not reg_col or not cnpj_col:
+        return None
+    cad = cadastral_df[[reg_col, cnpj_col]].copy()
+    cad.columns = ["REG_ANS", "CNPJ"]
+    cad["REG_ANS"] = cad["REG_ANS"].astype(str).str.strip().str.replace('"', "")
+    if CNPJ_INT:
+        # Os 14 primeiros digitos, como no modo texto logo abaixo
+        cad["CNPJ"] = cnpj_para_int(cad["CNPJ"], truncar=True)
+    else:
+        cad["CNPJ"] = cad["CNPJ"].astype(str).map(lambda v: re.sub(r"\D", "", str(v))[:14].zfill(14))
+    if razao_col:
+        cad["RazaoSocial"] = cadastral_df[razao_col].fillna("").astype(str).str.strip()
+    else:
+        cad["RazaoSocial"] = ""
+    return cad.drop_duplicates(subset=["REG_ANS"], keep="first")
+
+
+def aplicar_cadastro(df: pd.DataFrame, cad: pd.DataFrame) -> pd.DataFrame:
+    """Left join por REG_ANS (ordem das linhas preservada); descarta linhas sem CNPJ valido."""
+    df = df.merge(cad, on="REG_ANS", how="left")
+    if CNPJ_INT:
+        df = df[df["CNPJ"].notna() & (df["CNPJ"] > 0)]
+        df["CNPJ"] = df["CNPJ"].astype("int64")
+    else:
+        df = df[df["CNPJ"].notna() & (df["CNPJ"].astype(str).str.len() >= 14)]
+    return df
+
+
 def consolidate_with_rules(
     frames: list[pd.DataFrame], cadastral_df: pd.DataFrame | None = None
 ) -> pd.DataFrame:
     """
     Consolida listas de DataFrames. Se os frames tiverem REG_ANS, faz join com cadastral_df para obter CNPJ e RazaoSocial.
     Regras: valores <= 0 removidos; duplicatas (CNPJ, Ano, Trimestre) mantem primeira; ordenacao por Ano, Trimestre, CNPJ.
+    Tudo em memoria; para volumes maiores que a RAM ver ordenacao_externa.ConsolidadorExterno (mesmo resultado).
     """
     if not frames:
         return pd.DataFrame(columns=TARGET_COLUMNS)
     concat = pd.concat(frames, ignore_index=True)
     concat = concat[concat["ValorDespesas"] > 0].copy()
-    if "REG_ANS" in concat.columns and cadastral_df is not None and not cadastral_df.empty:
-        reg_col = next((c for c in cadastral_df.columns if "registro" in str(c).lower() or c == "Registro_ANS"), None)
-        cnpj_col = next((c for c in cadastral_df.columns if "cnpj" in str(c).lower()), None)
-        razao_col = next((c for c in cadastral_df.columns if "razao" in str(c).lower() or "razao_social" in str(c).lower() or "denominacao" in str(c).lower()), None)
-        if reg_col and cnpj_col:
-            cad = cadastral_df[[reg_col, cnpj_col]].copy()
-            cad.columns = ["REG_ANS", "CNPJ"]
-            cad["REG_ANS"] = cad["REG_ANS"].astype(str).str.strip().str.replace('"', "")
-            cad["CNPJ"] = cad["CNPJ"].astype(str).map(lambda v: re.sub(r"\D", "", str(v))[:14].zfill(14))
-            if razao_col:
-                cad["RazaoSocial"] = cadastral_df[razao_col].fillna("").astype(str).str.strip()
-            else:
-                cad["RazaoSocial"] = ""
-            cad = cad.drop_duplicates(subset=["REG_ANS"], keep="first")
-            concat = concat.merge(cad, on="REG_ANS", how="left")
-            concat = concat[concat["CNPJ"].notna() & (concat["CNPJ"].astype(str).str.len() >= 14)]
+    if "REG_ANS" in concat.columns:
+        cad = preparar_cadastro(cadastral_df)
+        if cad is not None:
+            concat = aplicar_cadastro(concat, cad)
     if "CNPJ" not in concat.columns:
         concat["CNPJ"] = ""
         concat["RazaoSocial"] = ""
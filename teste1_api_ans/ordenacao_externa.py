@@ -0,0 +1,135 @@
+"""
+Consolidacao fora de memoria (ordenacao externa) com o mesmo resultado de normalize.consolidate_with_rules.
+
+Cada arquivo processado entra em um buffer ja filtrado (ValorDespesas > 0, CNPJ resolvido pelo cadastro).
+Quando o buffer passa de metade do orcamento de memoria, e ordenado por (Ano, Trimestre, CNPJ) com sort
+estavel, deduplicado (primeira ocorrencia) e gravado em disco como um "run". No final, heapq.merge faz o
+merge k-way dos runs pela chave (Ano, Trimestre, CNPJ, numero do run): como os runs seguem a ordem de
+entrada, a primeira linha de cada chave no merge e a primeira ocorrencia global (keep='first').
+Os filtros rodam antes do dedup, como no caminho em memoria (linha com valor <= 0 nao "ocupa" a chave).
+Os tipos da saida sao os que pd.concat daria a todos os arquivos (ex.: ValorDespesas int64 em um e float64
+em outro -> float64), acumulados num frame vazio a cada arquivo, inclusive os que o filtro esvazia.
+"""
+
+import heapq
+import logging
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from normalize import TARGET_COLUMNS, aplicar_cadastro, preparar_cadastro
+
+logger = logging.getLogger(__name__)
+
+CHAVE = ["Ano", "Trimestre", "CNPJ"]
+# Linhas por bloco dentro de um run: no merge cada run mantem so um bloco em memoria
+BLOCO_RUN_LINHAS = 10_000
+LOTE_SAIDA_LINHAS = 100_000
+
+_I_CNPJ, _I_TRIM, _I_ANO = (TARGET_COLUMNS.index(c) for c in ("CNPJ", "Trimestre", "Ano"))
+
+
+class ConsolidadorExterno:
+    """
+    Uso:
+        with ConsolidadorExterno(cadastral_df, memoria_mb=512) as cons:
+            for df in frames_por_arquivo:
+                cons.adicionar(df)
+            for lote in cons.lotes():  # DataFrames ordenados e deduplicados
+                ...
+    """
+
+    def __init__(self, cadastral_df: pd.DataFrame | None, memoria_mb: int = 512, dir_tmp: str | None = None):
+        self.cad = preparar_cadastro(cadastral_df)
+        self.orcamento = memoria_mb * 1024 * 1024
+        self.dir = Path(tempfile.mkdtemp(prefix="ans_consolidacao_", dir=dir_tmp))
+        self.buffer: list[pd.DataFrame] = []
+        self.bytes_buffer = 0
+        self.runs: list[Path] = []
+        # 0 linhas, com os tipos de pd.concat sobre todos os arquivos adicionados
+        self.modelo: pd.DataFrame | None = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+    def fechar(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _preparar(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Mesmos filtros e join de consolidate_with_rules, aplicados a um arquivo por vez."""
+        df = df[df["ValorDespesas"] > 0].copy()
+        if "REG_ANS" in df.columns and self.cad is not None:
+            df = aplicar_cadastro(df, self.cad)
+        if "CNPJ" not in df.columns:
+            df["CNPJ"] = ""
+            df["RazaoSocial"] = ""
+        for col in TARGET_COLUMNS:
+            if col not in df.columns:
+                df[col] = ""
+        return df[TARGET_COLUMNS]
+
+    def adicionar(self, df: pd.DataFrame) -> None:
+        df = self._preparar(df)
+        # Antes do teste de vazio: no caminho em memoria o concat ve o arquivo antes do filtro
+        self.modelo = df.iloc[:0] if self.modelo is None else pd.concat([self.modelo, df.iloc[:0]], ignore_index=True)
+        if df.empty:
+            return
+        self.buffer.append(df)
+        self.bytes_buffer += int(df.memory_usage(deep=True).sum())
+        # Metade do orcamento: o sort precisa de uma copia do buffer
+        if self.bytes_buffer * 2 >= self.orcamento:
+            self._despejar()
+
+    def _despejar(self) -> None:
+        if not self.buffer:
+            return
+        run = pd.concat(self.buffer, ignore_index=True)
+        self.buffer, self.bytes_buffer = [], 0
+        run = run.sort_values(CHAVE, kind="stable").drop_duplicates(subset=CHAVE, keep="first")
+        path = self.dir / ("run_%05d.pkl" % len(self.runs))
+        with open(path, "wb") as f:
+            for ini in range(0, len(run), BLOCO_RUN_LINHAS):
+                pickle.dump(run.iloc[ini:ini + BLOCO_RUN_LINHAS], f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.runs.append(path)
+        logger.info("Run %d gravado: %d linhas", len(self.runs), len(run))
+
+    def _ler_run(self, numero: int) -> Iterator[tuple]:
+        with open(self.runs[numero], "rb") as f:
+            while True:
+                try:
+                    bloco = pickle.load(f)
+                except EOFError:
+                    return
+                for row in bloco.itertuples(index=False, name=None):
+                    # (Ano, Trimestre, CNPJ, run) e unica: a comparacao nunca chega na linha
+                    yield row[_I_ANO], row[_I_TRIM], row[_I_CNPJ], numero, row
+
+    def lotes(self, lote_linhas: int = LOTE_SAIDA_LINHAS) -> Iterator[pd.DataFrame]:
+        """Merge k-way dos runs: DataFrames (colunas TARGET_COLUMNS) em ordem, sem duplicatas de chave."""
+        self._despejar()
+        if not self.runs:
+            return
+        logger.info("Merge de %d runs", len(self.runs))
+        anterior = None
+        saida = []
+        for ano, trim, cnpj, _, row in heapq.merge(*(self._ler_run(i) for i in range(len(self.runs)))):
+            chave = (ano, trim, cnpj)
+            if chave == anterior:
+                continue
+            anterior = chave
+            saida.append(row)
+            if len(saida) >= lote_linhas:
+                yield self._frame(saida)
+                saida = []
+        if saida:
+            yield self._frame(saida)
+
+    def _frame(self, rows: list[tuple]) -> pd.DataFrame:
+        return pd.DataFrame.from_records(rows, columns=TARGET_COLUMNS).astype(self.modelo.dtypes.to_dict())
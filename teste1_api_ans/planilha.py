@@ -0,0 +1,70 @@
+"""
+Leitura de planilhas (XLSX/XLS) em streaming.
+XLSX via openpyxl em modo read-only: cabecalho lido so da primeira linha e linhas entregues em lotes
+(DataFrames de ate XLSX_CHUNK_ROWS linhas), sem carregar a planilha inteira em memoria.
+XLS (formato antigo, limitado a 65536 linhas) nao tem leitor em streaming: lido via pandas (requer xlrd).
+"""
+
+import logging
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+
+import pandas as pd
+
+from config import XLSX_CHUNK_ROWS
+
+logger = logging.getLogger(__name__)
+
+SUFIXOS_PLANILHA = (".xlsx", ".xls")
+
+
+def _abrir_xlsx(path: Path):
+    from openpyxl import load_workbook
+    # data_only: valor calculado das formulas; read_only: celulas lidas sob demanda do XML
+    return load_workbook(path, read_only=True, data_only=True)
+
+
+def _nomes_colunas(valores) -> list[str]:
+    return ["" if v is None else str(v).strip() for v in valores]
+
+
+def cabecalho_planilha(path: Path) -> list[str]:
+    """Nomes das colunas (primeira linha da primeira aba); lista vazia se a planilha estiver vazia."""
+    if path.suffix.lower() == ".xls":
+        df = pd.read_excel(path, nrows=0, header=0)
+        return _nomes_colunas(df.columns)
+    wb = _abrir_xlsx(path)
+    try:
+        primeira = next(wb.worksheets[0].iter_rows(max_row=1, values_only=True), None)
+        return _nomes_colunas(primeira) if primeira else []
+    finally:
+        wb.close()
+
+
+def ler_planilha(path: Path, chunk_rows: int = XLSX_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Itera a primeira aba em DataFrames de ate chunk_rows linhas, com as colunas do cabecalho."""
+    if path.suffix.lower() == ".xls":
+        df = pd.read_excel(path, header=0)
+        df.columns = _nomes_colunas(df.columns)
+        for ini in range(0, len(df), chunk_rows):
+            yield df.iloc[ini:ini + chunk_rows]
+        return
+    wb = _abrir_xlsx(path)
+    try:
+        linhas = wb.worksheets[0].iter_rows(values_only=True)
+        primeira = next(linhas, None)
+        if not primeira:
+            return
+        colunas = _nomes_colunas(primeira)
+        n = len(colunas)
+        while True:
+            bloco = list(islice(linhas, chunk_rows))
+            if not bloco:
+                break
+            # Linhas totalmente vazias (formatacao residual no fim da aba) sao descartadas
+            lote = [tuple(r[:n]) + (None,) * (n - len(r)) for r in bloco if any(v is not None for v in r)]
+            if lote:
+                yield pd.DataFrame.from_records(lote, columns=colunas)
+    finally:
+        wb.close()
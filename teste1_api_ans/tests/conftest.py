@@ -0,0 +1,23 @@
+"""
+Fixtures dos testes do Teste 1.
+Os modulos da etapa sao importados de novo em cada teste: config le o ambiente (ANS_*) na importacao, e
+os outros testes (teste2, teste3) tem modulos com os mesmos nomes (config, main, ...).
+"""
+
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+ETAPA = Path(__file__).resolve().parents[1]
+MODULOS = sorted(p.stem for p in ETAPA.glob("*.py"))
+
+
+@pytest.fixture
+def etapa(monkeypatch):
+    """Funcao que importa um modulo do Teste 1 com o ambiente atual do teste (monkeypatch.setenv antes)."""
+    monkeypatch.syspath_prepend(str(ETAPA))
+    for nome in MODULOS:
+        monkeypatch.delitem(sys.modules, nome, raising=False)
+    return importlib.import_module
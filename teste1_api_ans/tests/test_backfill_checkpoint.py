@@ -0,0 +1,32 @@
+"""Backfill so pula o trimestre do checkpoint quando o CSV confere com o tamanho e o sha256 registrados."""
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def checkpoint(etapa, tmp_path):
+    backfill = etapa("backfill")
+    df = pd.DataFrame({"CNPJ": ["11222333000181"], "Ano": [2024]})
+    sha = backfill.gravar_csv_zip(df, tmp_path / "2024_1.csv", None, "2024_1.csv")
+    item = {"arquivo": "2024_1.csv", "linhas": 1, "sha256": sha, "bytes": (tmp_path / "2024_1.csv").stat().st_size}
+    return backfill, {"trimestres": {"2024-1": item}}
+
+
+def test_csv_intacto_conta_como_concluido(checkpoint, tmp_path):
+    backfill, estado = checkpoint
+    assert backfill._concluido(tmp_path, estado, 2024, 1)
+    del estado["trimestres"]["2024-1"]["bytes"]  # checkpoint gravado antes do campo: so o sha256
+    assert backfill._concluido(tmp_path, estado, 2024, 1)
+    assert not backfill._concluido(tmp_path, estado, 2024, 2)
+
+
+@pytest.mark.parametrize("estragar", [
+    lambda p: p.write_bytes(p.read_bytes()[:-5]),                             # truncado
+    lambda p: p.write_bytes(p.read_bytes().replace(b"2024", b"2023")),        # mesmo tamanho, outro conteudo
+    lambda p: p.unlink(),                                                     # apagado
+])
+def test_csv_alterado_e_reprocessado(checkpoint, tmp_path, estragar):
+    backfill, estado = checkpoint
+    estragar(tmp_path / "2024_1.csv")
+    assert not backfill._concluido(tmp_path, estado, 2024, 1)
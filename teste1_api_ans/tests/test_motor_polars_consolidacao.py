@@ -0,0 +1,113 @@
+"""
+Motor Polars (motor_polars.consolidar) grava o mesmo CSV que carregar_trimestre + consolidate_with_rules.
+ZIPs com valores so inteiros em todos os arquivos (o pandas leria int64) ou com decimais, CSV em latin-1,
+REG_ANS fora do cadastro, valores negativos, REG_ANS repetido no arquivo e entre aspas; com e sem amostra,
+com e sem cadastro.
+"""
+
+import sys
+import zipfile
+
+import pandas as pd
+import pytest
+
+pl = pytest.importorskip("polars", minversion="1.26")
+
+CABECALHO = "DATA;REG_ANS;CD_CONTA_CONTABIL;DESCRICAO;VL_SALDO_INICIAL;VL_SALDO_FINAL"
+REGISTROS = [300000 + i for i in range(12)]
+
+
+def _cadastro() -> pd.DataFrame:
+    return pd.DataFrame({
+        "Registro_ANS": REGISTROS,
+        "CNPJ": ["%014d" % (11111111000100 + 1000 * i + 91) for i in range(len(REGISTROS))],
+        "Razao_Social": ["OPERADORA %02d" % i for i in range(len(REGISTROS))],
+    })
+
+
+def _gravar_zips(tmp_path, decimais: bool = False) -> list:
+    trimestres = {
+        1: ("utf-8", lambda i: str(1000 * i + 250)),
+        2: ("latin-1", lambda i: str(100 * i + 7)),
+        3: ("utf-8", lambda i: "%d,%02d" % (500 * i + 3, i) if i % 2 and decimais else str(500 * i - 2500)),
+    }
+    zips = []
+    for t, (encoding, valor) in trimestres.items():
+        linhas = [CABECALHO]
+        for i, reg in enumerate(REGISTROS + [399999]):  # 399999: fora do cadastro
+            reg = '"%d"' % reg if i == 3 else str(reg)
+            linhas.append('2024-%02d-01;%s;41;"EVENTOS INDENIZÁVEIS";0;%s' % (3 * t - 2, reg, valor(i)))
+            linhas.append('2024-%02d-01;%s;31;"CONTRAPRESTAÇÕES";0;%s' % (3 * t - 2, reg, valor(i + 1)))
+        # mesma operadora de novo no arquivo: vale a primeira linha
+        linhas.append("2024-%02d-01;%d;41;REPETIDA;0;999" % (3 * t - 2, REGISTROS[1]))
+        path = tmp_path / ("%dT2024.zip" % t)
+        with zipfile.ZipFile(path, "w") as z:
+            z.writestr("%dT2024.csv" % t, ("\n".join(linhas) + "\n").encode(encoding))
+        zips.append(path)
+    return zips
+
+
+# decimais=False: todos os arquivos so com inteiros; o pandas grava "250", e o Polars tem de gravar igual
+@pytest.mark.parametrize("decimais", [False, True])
+@pytest.mark.parametrize("com_cadastro", [True, False])
+@pytest.mark.parametrize("fracao", [0.0, 0.5])
+@pytest.mark.parametrize("cnpj_int", ["0", "1"])
+def test_mesmo_csv_do_motor_pandas(etapa, monkeypatch, tmp_path, cnpj_int, fracao, com_cadastro, decimais):
+    monkeypatch.setenv("ANS_CNPJ_INT", cnpj_int)
+    extract, normalize, motor_polars = etapa("extract"), etapa("normalize"), etapa("motor_polars")
+    zips = _gravar_zips(tmp_path, decimais)
+    cad = normalize.amostrar_cadastro(_cadastro(), fracao) if com_cadastro else None
+    frames = [df for z in zips for df in extract.carregar_trimestre(z, tmp_path / f"extract_{z.stem}", fracao)]
+    esperado = normalize.consolidate_with_rules(frames, cad)
+    obtido = motor_polars.consolidar(zips, tmp_path, cad, fracao)
+    assert not esperado.empty
+    assert obtido.to_csv(sep=";", index=False) == esperado.to_csv(sep=";", index=False)
+
+
+def test_amostra_no_scan_sem_cadastro(etapa, tmp_path):
+    """Sem cadastro a amostra nao pode depender dele: o scan filtra pelo hash de REG_ANS como o pandas."""
+    normalize, motor_polars = etapa("normalize"), etapa("motor_polars")
+    zips = _gravar_zips(tmp_path)
+    with zipfile.ZipFile(zips[0]) as z:
+        z.extractall(tmp_path)
+    csv = tmp_path / "1T2024.csv"
+    esperado = normalize.load_file(csv, 2024, 1, 0.5).reset_index(drop=True)
+    linhas, tipo = motor_polars._ler(csv, 2024, 1, 0.5)
+    obtido = motor_polars.para_pandas(linhas.collect())
+    assert 0 < len(obtido) < len(normalize.load_file(csv, 2024, 1))
+    # No plano o valor e Float64; o tipo do pandas (int64 aqui) volta no fim de consolidar
+    assert tipo.collect()["inteiro"][0] == (esperado["ValorDespesas"].dtype.kind == "i")
+    pd.testing.assert_frame_equal(obtido, esperado, check_dtype=False)
+
+
+@pytest.mark.parametrize("arquivos", [
+    [("250", "31")],                 # so inteiros: int64
+    [(" +7 ", "-3")],                # inteiros com espaco e sinal
+    [("250", "")],                   # celula vazia em outra conta: float64
+    [("250", "1e3")],                # expoente: float64
+    [("250", "abc")],                # texto em outra conta: to_numeric da conta 41 da int64
+    [("250", "1.000")],              # idem, com separador de milhar
+    [("1,5", "abc")],                # texto e decimal na conta 41: float64
+    [("250", "31"), ("12,5", "1")],  # um arquivo float64 promove o concat
+])
+def test_tipo_do_valor_como_no_pandas(etapa, tmp_path, arquivos):
+    extract, normalize, motor_polars = etapa("extract"), etapa("normalize"), etapa("motor_polars")
+    zip_path = tmp_path / "1T2024.zip"
+    with zipfile.ZipFile(zip_path, "w") as z:
+        for n, (conta41, conta31) in enumerate(arquivos):
+            linhas = [CABECALHO] + [
+                "2024-01-01;%d;41;X;0;%s" % (REGISTROS[n], conta41),
+                "2024-01-01;%d;31;X;0;%s" % (REGISTROS[n], conta31),
+            ]
+            z.writestr("parte%d.csv" % n, "\n".join(linhas) + "\n")
+    frames = list(extract.carregar_trimestre(zip_path, tmp_path / "extract_pandas"))
+    esperado = normalize.consolidate_with_rules(frames, _cadastro())
+    obtido = motor_polars.consolidar([zip_path], tmp_path, _cadastro())
+    assert obtido.to_csv(sep=";", index=False) == esperado.to_csv(sep=";", index=False)
+
+
+def test_polars_antigo_usa_o_pandas(etapa, monkeypatch):
+    """Versao sem collect_all(engine=...) e join(maintain_order=...) conta como ausente, sem TypeError no plano."""
+    monkeypatch.setattr(pl, "__version__", "1.10.0")
+    monkeypatch.delitem(sys.modules, "comum.polars_pandas")
+    assert not etapa("motor_polars").disponivel()
@@ -0,0 +1,46 @@
+"""ConsolidadorExterno grava o mesmo CSV de consolidate_with_rules, inclusive com tipos diferentes entre arquivos."""
+
+import pandas as pd
+import pytest
+
+CADASTRO = pd.DataFrame({
+    "Registro_ANS": [300001, 300002, 300003],
+    "CNPJ": ["11111111000191", "22222222000191", "33333333000191"],
+    "Razao_Social": ["OPERADORA A", "OPERADORA B", "OPERADORA C"],
+})
+
+
+def _arquivo(trimestre: int, regs: list[str], valores: list) -> pd.DataFrame:
+    return pd.DataFrame({"REG_ANS": regs, "Ano": 2024, "Trimestre": trimestre, "ValorDespesas": valores})
+
+
+def _csv_externo(ordenacao_externa, frames, tmp_path) -> str:
+    # memoria_mb=0: um run por arquivo, todo o resultado sai do merge k-way
+    with ordenacao_externa.ConsolidadorExterno(CADASTRO, memoria_mb=0, dir_tmp=str(tmp_path)) as cons:
+        for df in frames:
+            cons.adicionar(df)
+        return "".join(lote.to_csv(sep=";", index=False, header=False) for lote in cons.lotes())
+
+
+@pytest.mark.parametrize("frames", [
+    # int64 no primeiro arquivo, float64 depois: o concat em memoria promove a coluna para float64
+    [_arquivo(1, ["300001", "300002"], [100, 7]), _arquivo(2, ["300001", "300003"], [1234.56, 250.0])],
+    # float64 so em um arquivo que o filtro (valor > 0) esvazia: ainda assim o concat promove
+    [_arquivo(1, ["300001", "300002"], [100, 7]), _arquivo(2, ["300003"], [-1.5])],
+    # chave repetida entre arquivos: primeira ocorrencia
+    [_arquivo(1, ["300001"], [10]), _arquivo(1, ["300001", "300002"], [99.9, 5]), _arquivo(3, ["300002"], [1])],
+])
+@pytest.mark.parametrize("cnpj_int", ["0", "1"])
+def test_mesmo_csv_do_caminho_em_memoria(etapa, monkeypatch, tmp_path, frames, cnpj_int):
+    monkeypatch.setenv("ANS_CNPJ_INT", cnpj_int)
+    normalize, ordenacao_externa = etapa("normalize"), etapa("ordenacao_externa")
+    em_memoria = normalize.consolidate_with_rules([f.copy() for f in frames], CADASTRO)
+    esperado = em_memoria.to_csv(sep=";", index=False, header=False)
+    assert _csv_externo(ordenacao_externa, [f.copy() for f in frames], tmp_path) == esperado
+
+
+def test_valor_float_nao_e_truncado(etapa, tmp_path):
+    ordenacao_externa = etapa("ordenacao_externa")
+    frames = [_arquivo(1, ["300001", "300002"], [100, 7]), _arquivo(2, ["300001"], [1234.56])]
+    csv = _csv_externo(ordenacao_externa, frames, tmp_path)
+    assert ";100.0\n" in csv and ";1234.56\n" in csv
@@ -1,6 +1,7 @@
 """
 Agregacao por RazaoSocial e UF (Teste 2.3).
 Total de despesas, media por trimestre, desvio padrao; ordenacao por valor total (maior para menor).
+Chaves categoricas (codigos inteiros) com observed=True: so os pares RazaoSocial/UF presentes viram grupo.
 """
 
 import logging
@@ -20,9 +21,11 @@ def agregar(df: pd.DataFrame) -> pd.DataFrame:
     group_cols = ["RazaoSocial", "UF"]
     for c in group_cols:
         if c not in df.columns:
-            df[c] = ""
+            df[c] = pd.Categorical([""] * len(df))
+        elif not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype("category")
     df["ValorDespesas"] = pd.to_numeric(df["ValorDespesas"], errors="coerce").fillna(0)
-    agg = df.groupby(group_cols, as_index=False).agg(
+    agg = df.groupby(group_cols, as_index=False, observed=True).agg(
         total_despesas=("ValorDespesas", "sum"),
         media_por_trimestre=("ValorDespesas", "mean"),
         desvio_padrao_despesas=("ValorDespesas", "std"),
@@ -1,11 +1,41 @@
 """Configuracoes do Teste 2 - Transformacao e Validacao."""
 
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 CONSOLIDATED_CSV = os.path.join(DATA_DIR, "consolidado_despesas.csv")
+CONSOLIDATED_ZIP = os.path.join(DATA_DIR, "consolidado_despesas.zip")
 CADOP_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/Relatorio_cadop.csv"
 CADOP_LOCAL = os.path.join(DATA_DIR, "Relatorio_cadop.csv")
 OUTPUT_CSV = "despesas_agregadas.csv"
+OUTPUT_ZIP = "despesas_agregadas.zip"
+# Cubo pre-agregado (cubo.py), gravado ao lado de despesas_agregadas
+CUBO_CSV = "despesas_cubo.csv"
+CUBO_ZIP = "despesas_cubo.zip"
 OUTPUT_DIR = DATA_DIR
+
+# Raiz do repositorio no sys.path: modulos compartilhados entre as etapas (comum/)
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.append(RAIZ)
+
+# CNPJ como int64 (validacao vetorizada e join com o cadastro em inteiros). Mesma variavel do teste1.
+CNPJ_INT = os.environ.get("ANS_CNPJ_INT", "0") == "1"
+
+# Mesmas variaveis do teste1 (comum/saida.py): "csv+zip" (padrao) grava CSV e ZIP numa passada, "csv" so o CSV,
+# "zip" so o ZIP; nivel deflate do ZIP
+SAIDA_FORMATO = os.environ.get("ANS_SAIDA", "csv+zip")
+ZIP_NIVEL = int(os.environ.get("ANS_ZIP_NIVEL", "6"))
+
+# Fallback por razao social para CNPJ ausente do cadastro (correspondencia.py); similaridade minima 0-1
+MATCH_APROXIMADO = os.environ.get("ANS_MATCH_APROXIMADO", "0") == "1"
+MATCH_LIMIAR = float(os.environ.get("ANS_MATCH_LIMIAR", "0.85"))
+
+# Modo amostra (main.py --sample): mesma variavel e mesmo hash de REG_ANS do teste1 (comum/amostra.py); 0 = tudo
+AMOSTRA = float(os.environ.get("ANS_AMOSTRA", "0"))
+
+# Motor das transformacoes: "pandas" ou "polars" (motor_polars.py, plano lazy multi-thread). Mesma variavel
+# do teste1; sem polars instalado ou com ANS_MATCH_APROXIMADO=1, usa o pandas
+MOTOR = os.environ.get("ANS_MOTOR", "pandas")
@@ -0,0 +1,71 @@
+"""
+Correspondencia aproximada por razao social (fallback do enriquecimento para CNPJ sem cadastro).
+Indice invertido por token sobre a razao social normalizada (blocking): cada nome so e comparado com
+os nomes do cadastro que compartilham algum token pouco frequente, em vez de todos contra todos (O(n x m)).
+Similaridade: Dice sobre trigramas de caracteres (mesma ideia do pg_trgm), entre 0 e 1.
+"""
+
+import re
+import unicodedata
+from collections import defaultdict
+
+# Diferenca minima entre o melhor e o segundo candidato; abaixo disso o nome e ambiguo
+# (ex.: "UNIMED COOPERATIVA DE TRABALHO MEDICO" fica perto de varias Unimeds) e nao casa
+MARGEM_AMBIGUIDADE = 0.1
+
+# Sufixos societarios e preposicoes: nao distinguem operadoras
+_IGNORAR = {"LTDA", "SA", "S", "A", "ME", "EPP", "EIRELI", "CIA", "DE", "DA", "DO", "DAS", "DOS", "E"}
+
+
+def normalizar_nome(nome: str) -> str:
+    """Maiusculas sem acento/pontuacao e sem sufixos societarios: "Saúde S/A Ltda." -> "SAUDE"."""
+    s = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode().upper()
+    s = re.sub(r"[^A-Z0-9]+", " ", s)
+    return " ".join(t for t in s.split() if t not in _IGNORAR)
+
+
+def _trigramas(nome: str) -> set[str]:
+    s = "  " + nome + " "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class IndiceRazaoSocial:
+    """
+    Indice de blocking sobre as razoes sociais do cadastro.
+    Tokens presentes em mais de `max_bloco` nomes (ex.: SAUDE, ASSISTENCIA) nao geram bloco; se o nome
+    so tiver tokens frequentes, usa o menos frequente deles.
+    """
+
+    def __init__(self, nomes: list[str], max_bloco: int = 50):
+        self.normalizados = [normalizar_nome(n) for n in nomes]
+        self.trigramas = [_trigramas(n) for n in self.normalizados]
+        self.max_bloco = max(max_bloco, len(nomes) // 50)
+        self.postings: dict[str, list[int]] = defaultdict(list)
+        for i, n in enumerate(self.normalizados):
+            for tok in set(n.split()):
+                self.postings[tok].append(i)
+
+    def candidatos(self, normalizado: str) -> set[int]:
+        blocos = sorted((self.postings[t] for t in set(normalizado.split()) if t in self.postings), key=len)
+        if not blocos:
+            return set()
+        raros = [b for b in blocos if len(b) <= self.max_bloco]
+        return set().union(*raros) if raros else set(blocos[0])
+
+    def melhor(self, nome: str, limiar: float, margem: float = MARGEM_AMBIGUIDADE) -> tuple[int, float] | None:
+        """(posicao no cadastro, similaridade) do melhor candidato >= limiar; None se nao houver ou se for ambiguo."""
+        normalizado = normalizar_nome(nome)
+        if not normalizado:
+            return None
+        tri = _trigramas(normalizado)
+        melhor, segundo = (None, 0.0), 0.0
+        for i in self.candidatos(normalizado):
+            outro = self.trigramas[i]
+            score = 2.0 * len(tri & outro) / (len(tri) + len(outro))
+            if score > melhor[1]:
+                melhor, segundo = (i, score), melhor[1]
+            elif score > segundo:
+                segundo = score
+        if melhor[0] is None or melhor[1] < limiar or melhor[1] - segundo < margem:
+            return None
+        return melhor[0], round(melhor[1], 4)
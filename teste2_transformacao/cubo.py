@@ -0,0 +1,94 @@
+"""
+Cubo de despesas pre-agregado (despesas_cubo.csv).
+Dimensoes: RazaoSocial, UF, Modalidade e tempo em hierarquia (Ano, Trimestre) -> Ano -> total.
+Cada linha e uma celula de um agrupamento (2 x 2 x 2 x 3 = 24 agrupamentos, do mais fino ao total
+nacional) com Soma, Contagem e M2 (soma dos quadrados dos desvios em relacao a media); media e desvio
+padrao saem de Soma/Contagem e sqrt(M2 / (Contagem - 1)), e celulas podem ser combinadas de novo
+sem voltar as linhas brutas. Dimensoes fora do agrupamento ficam vazias (NULL no banco).
+
+A celula mais fina e agregada das linhas uma vez; os demais agrupamentos saem dela pela combinacao
+de Chan et al. (n, media, M2 por grupo), sem reler as linhas e sem a perda de precisao de soma dos quadrados.
+"""
+
+import logging
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DIMENSOES = ["RazaoSocial", "UF", "Modalidade"]
+# Niveis do tempo, do mais fino ao total
+NIVEIS_TEMPO = [["Ano", "Trimestre"], ["Ano"], []]
+COLUNAS_CUBO = ["Agrupamento", "RazaoSocial", "UF", "Modalidade", "Ano", "Trimestre", "Soma", "Contagem", "M2"]
+
+
+def agrupamentos() -> list[list[str]]:
+    """Todas as combinacoes de dimensoes x niveis de tempo (a primeira e a celula mais fina)."""
+    saida = []
+    for tempo in NIVEIS_TEMPO:
+        for usar in product((True, False), repeat=len(DIMENSOES)):
+            saida.append([d for d, u in zip(DIMENSOES, usar) if u] + tempo)
+    return saida
+
+
+def nome_agrupamento(colunas: list[str]) -> str:
+    """Rotulo gravado na coluna Agrupamento, ex.: "UF+Ano+Trimestre"; "Total" sem dimensoes."""
+    return "+".join(colunas) or "Total"
+
+
+def _celulas_base(df: pd.DataFrame, chave: list[str]) -> pd.DataFrame:
+    valores = pd.to_numeric(df["ValorDespesas"], errors="coerce").fillna(0)
+    g = valores.groupby([df[c] for c in chave], observed=True)
+    base = pd.DataFrame({"Soma": g.sum(), "Contagem": g.count(), "M2": g.var(ddof=0) * g.count()})
+    return base.reset_index()
+
+
+def _combinar(celulas: pd.DataFrame, chave: list[str]) -> pd.DataFrame:
+    """Combina celulas (Soma, Contagem, M2) por chave: M2 = sum(M2_i + n_i * (media_i - media)^2)."""
+    if not chave:
+        grupos = np.zeros(len(celulas), dtype=np.int64)
+    else:
+        grupos = celulas.groupby(chave, observed=True, sort=False).ngroup().to_numpy()
+    soma = np.bincount(grupos, weights=celulas["Soma"].to_numpy())
+    contagem = np.bincount(grupos, weights=celulas["Contagem"].to_numpy())
+    media = soma / contagem
+    n_i = celulas["Contagem"].to_numpy()
+    desvio = celulas["Soma"].to_numpy() / n_i - media[grupos]
+    m2 = np.bincount(grupos, weights=celulas["M2"].to_numpy() + n_i * desvio * desvio)
+    if chave:
+        out = celulas[chave].drop_duplicates().copy()
+        out = out.iloc[np.argsort(grupos[out.index.to_numpy()], kind="stable")].reset_index(drop=True)
+    else:
+        out = pd.DataFrame(index=[0])
+    out["Soma"] = soma
+    out["Contagem"] = contagem.astype(np.int64)
+    out["M2"] = m2
+    return out
+
+
+def construir_cubo(df: pd.DataFrame) -> pd.DataFrame:
+    """Cubo com todos os agrupamentos; vazio se faltar ValorDespesas ou o periodo."""
+    if df.empty or not {"ValorDespesas", "Ano", "Trimestre"} <= set(df.columns):
+        return pd.DataFrame(columns=COLUNAS_CUBO)
+    df = df.copy()
+    for c in DIMENSOES:
+        if c not in df.columns:
+            df[c] = ""
+        df[c] = df[c].astype(str).astype("category")
+    todos = agrupamentos()
+    base = _celulas_base(df, todos[0])
+    partes = []
+    for colunas in todos:
+        parte = base if colunas == todos[0] else _combinar(base, colunas)
+        parte = parte.assign(Agrupamento=nome_agrupamento(colunas))
+        partes.append(parte)
+    cubo = pd.concat(partes, ignore_index=True)
+    for c in DIMENSOES:
+        cubo[c] = cubo[c].astype(object).where(cubo[c].notna(), "")
+    for c in ("Ano", "Trimestre"):
+        cubo[c] = cubo[c].astype("Int64")
+    cubo["Soma"] = cubo["Soma"].round(2)
+    logger.info("Cubo: %d celulas em %d agrupamentos (base: %d)", len(cubo), len(todos), len(base))
+    return cubo[COLUNAS_CUBO]
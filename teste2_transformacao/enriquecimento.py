@@ -3,19 +3,42 @@ Enriquecimento com dados cadastrais (Teste 2.2).
 Join por CNPJ com Relatorio_cadop; adiciona RegistroANS, Modalidade, UF.
 Registros sem match: mantidos com NULL nessas colunas (nao excluimos para nao perder despesas).
 CNPJ com multiplas linhas no cadastro: primeira ocorrencia por CNPJ (keep='first').
+Opcional (ANS_MATCH_APROXIMADO=1): sem match por CNPJ, tenta a razao social (correspondencia.py) e
+registra a confianca em ConfiancaCadastro (1.0 = CNPJ, similaridade = razao social, vazio = sem match).
+Colunas de texto do cadastro sao categoricas: cada valor distinto e guardado uma vez, nao por linha trimestral.
+Modo amostra (fracao > 0): cadastro e consolidado restritos as operadoras da amostra (comum/amostra.py), com o mesmo
+hash de REG_ANS do teste1, para o join e as agregacoes ficarem coerentes.
 """
 
 import re
 import logging
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 import requests
 
-from config import CADOP_URL, CADOP_LOCAL
+from config import CADOP_URL, CADOP_LOCAL, CNPJ_INT, MATCH_APROXIMADO, MATCH_LIMIAR
+from comum.amostra import mascara_registro
+from comum.cnpj import cnpj_para_int, cnpj_texto
+from correspondencia import IndiceRazaoSocial
 
 logger = logging.getLogger(__name__)
 
+COLUNAS_CADASTRO = ("RegistroANS", "Modalidade", "UF")
+
+
+def categoria_vazia(index: pd.Index) -> pd.Series:
+    """Coluna categorica so com "" (operadora sem cadastro)."""
+    return pd.Series(pd.Categorical([""] * len(index)), index=index)
+
+
+def preencher_vazio(serie: pd.Series) -> pd.Series:
+    """fillna("") em coluna categorica; "" entra nas categorias mantendo a ordem lexica (mesma ordem de groupby que strings)."""
+    if "" not in serie.cat.categories:
+        serie = serie.cat.set_categories(serie.cat.categories.append(pd.Index([""])).sort_values())
+    return serie.fillna("")
+
 
 def baixar_cadastral_se_necessario() -> Path | None:
     path = Path(CADOP_LOCAL)
@@ -33,56 +56,125 @@ def baixar_cadastral_se_necessario() -> Path | None:
         return None
 
 
-def enriquecer(df: pd.DataFrame, cadastro_path: Path | None) -> pd.DataFrame:
-    """
-    Faz left join por CNPJ com o cadastro; adiciona RegistroANS, Modalidade, UF.
-    """
-    df = df.copy()
-    df["CNPJ_norm"] = df["CNPJ"].astype(str).str.replace(r"\D", "", regex=True).str.zfill(14)
+def _ler_cadastro(cadastro_path: Path | None) -> pd.DataFrame | None:
     if cadastro_path is None or not cadastro_path.exists():
-        df["RegistroANS"] = ""
-        df["Modalidade"] = ""
-        df["UF"] = ""
-        df = df.drop(columns=["CNPJ_norm"], errors="ignore")
-        return df
+        return None
     for enc in ("utf-8", "latin-1", "cp1252"):
         try:
-            cad = pd.read_csv(cadastro_path, sep=";", encoding=enc, low_memory=False)
-            break
+            return pd.read_csv(cadastro_path, sep=";", encoding=enc, low_memory=False)
         except Exception:
             continue
-    else:
-        df = df.drop(columns=["CNPJ_norm"], errors="ignore")
-        return df
+    return None
+
+
+def _normalizar_cnpj(serie: pd.Series) -> pd.Series:
+    if CNPJ_INT:
+        return cnpj_para_int(serie)
+    return cnpj_texto(serie)
+
+
+def _coluna_registro(cols: dict):
+    return next((cols[k] for k in cols if "registro" in k.lower() and "ans" in k.lower()), None) or next((cols[k] for k in cols if "registro" in k.lower() and "operadora" in k.lower()), None)
+
+
+def cnpjs_da_amostra(cadastro_path: Path | None, fracao: float) -> set:
+    """CNPJs normalizados das operadoras da amostra (REG_ANS do cadastro); vazio sem cadastro."""
+    cad = _ler_cadastro(cadastro_path)
+    cols = {str(c).strip(): c for c in cad.columns} if cad is not None else {}
+    reg_cad = _coluna_registro(cols)
+    cnpj_cad = next((cols[k] for k in cols if "cnpj" in k.lower()), None)
+    if reg_cad is None or cnpj_cad is None:
+        logger.warning("Amostra sem cadastro (REG_ANS -> CNPJ): nenhuma operadora selecionada")
+        return set()
+    return set(_normalizar_cnpj(cad.loc[mascara_registro(cad[reg_cad], fracao), cnpj_cad]))
+
+
+def amostrar_consolidado(df: pd.DataFrame, cadastro_path: Path | None, fracao: float) -> pd.DataFrame:
+    """Linhas do consolidado cujo CNPJ pertence a uma operadora da amostra (REG_ANS do cadastro)."""
+    cnpjs = cnpjs_da_amostra(cadastro_path, fracao)
+    return df[_normalizar_cnpj(df["CNPJ"]).isin(cnpjs)].reset_index(drop=True)
+
+
+def _casar_por_razao_social(out: pd.DataFrame, cad: pd.DataFrame, nomes_cad: list[str] | None) -> pd.DataFrame:
+    """Preenche as colunas do cadastro das linhas sem match por CNPJ com o melhor nome acima de MATCH_LIMIAR."""
+    casou = (out.pop("_merge") == "both").to_numpy()
+    out["ConfiancaCadastro"] = np.where(casou, 1.0, np.nan)
+    if not nomes_cad or casou.all():
+        return out
+    indice = IndiceRazaoSocial(nomes_cad)
+    # Um calculo por nome distinto (RazaoSocial e categorica: poucos valores para muitas linhas)
+    nomes = out.loc[~casou, "RazaoSocial"].dropna().unique()
+    achados = {}
+    for nome in nomes:
+        r = indice.melhor(nome, MATCH_LIMIAR)
+        if r is not None:
+            achados[nome] = r
+    logger.info("Correspondencia por razao social: %d de %d nomes sem CNPJ no cadastro", len(achados), len(nomes))
+    if not achados:
+        return out
+    linhas = out.index[~casou & out["RazaoSocial"].isin(list(achados)).to_numpy()]
+    encontrados = [achados[n] for n in out.loc[linhas, "RazaoSocial"]]
+    posicoes = [pos for pos, _ in encontrados]
+    for c in COLUNAS_CADASTRO:
+        if c in cad.columns:
+            out.loc[linhas, c] = cad[c].iloc[posicoes].to_numpy()
+    out.loc[linhas, "ConfiancaCadastro"] = [score for _, score in encontrados]
+    return out
+
+
+def preparar_cadastro(cadastro_path: Path | None, fracao: float = 0.0) -> tuple[pd.DataFrame | None, list[str] | None]:
+    """
+    Cadastro para o join: CNPJ_norm (primeira ocorrencia por CNPJ) e as COLUNAS_CADASTRO disponiveis, mais as
+    razoes sociais na mesma ordem (match aproximado). (None, None) sem cadastro ou sem coluna de CNPJ.
+    """
+    cad = _ler_cadastro(cadastro_path)
+    if cad is None:
+        return None, None
     cols = {str(c).strip(): c for c in cad.columns}
     cnpj_cad = next((cols[k] for k in cols if "cnpj" in k.lower()), None)
     if cnpj_cad is None:
-        df["RegistroANS"] = ""
-        df["Modalidade"] = ""
-        df["UF"] = ""
-        df = df.drop(columns=["CNPJ_norm"], errors="ignore")
-        return df
-    reg_cad = next((cols[k] for k in cols if "registro" in k.lower() and "ans" in k.lower()), None) or next((cols[k] for k in cols if "registro" in k.lower() and "operadora" in k.lower()), None)
+        return None, None
+    reg_cad = _coluna_registro(cols)
+    if fracao and reg_cad is not None:
+        cad = cad[mascara_registro(cad[reg_cad], fracao)].reset_index(drop=True)
     mod_cad = next((cols[k] for k in cols if "modalidade" in k.lower()), None)
     uf_cad = next((cols[k] for k in cols if k.upper() == "UF"), None)
-    cad["CNPJ_norm"] = cad[cnpj_cad].astype(str).str.replace(r"\D", "", regex=True).str.zfill(14)
+    razao_cad = next((cols[k] for k in cols if "razao" in k.lower()), None)
+    cad["CNPJ_norm"] = _normalizar_cnpj(cad[cnpj_cad])
     cad = cad.drop_duplicates(subset=["CNPJ_norm"], keep="first")
     sel = ["CNPJ_norm"]
     if reg_cad is not None:
-        cad["RegistroANS"] = cad[reg_cad].astype(str)
+        cad["RegistroANS"] = cad[reg_cad].astype(str).astype("category")
         sel.append("RegistroANS")
     if mod_cad is not None:
-        cad["Modalidade"] = cad[mod_cad].fillna("").astype(str)
+        cad["Modalidade"] = cad[mod_cad].fillna("").astype(str).astype("category")
         sel.append("Modalidade")
     if uf_cad is not None:
-        cad["UF"] = cad[uf_cad].fillna("").astype(str)
+        cad["UF"] = cad[uf_cad].fillna("").astype(str).astype("category")
         sel.append("UF")
-    cad = cad[[c for c in sel if c in cad.columns]]
-    out = df.merge(cad, on="CNPJ_norm", how="left")
-    for c in ("RegistroANS", "Modalidade", "UF"):
+    nomes_cad = cad[razao_cad].fillna("").astype(str).tolist() if razao_cad is not None else None
+    return cad[[c for c in sel if c in cad.columns]].reset_index(drop=True), nomes_cad
+
+
+def enriquecer(df: pd.DataFrame, cadastro_path: Path | None, fracao: float = 0.0) -> pd.DataFrame:
+    """
+    Faz left join por CNPJ com o cadastro; adiciona RegistroANS, Modalidade, UF.
+    Com fracao > 0, so as operadoras da amostra entram no cadastro (tambem para o match por razao social).
+    """
+    df = df.copy()
+    df["CNPJ_norm"] = _normalizar_cnpj(df["CNPJ"])
+    cad, nomes_cad = preparar_cadastro(cadastro_path, fracao)
+    if cad is None:
+        for c in COLUNAS_CADASTRO:
+            df[c] = categoria_vazia(df.index)
+        return df.drop(columns=["CNPJ_norm"])
+    out = df.merge(cad, on="CNPJ_norm", how="left", indicator=MATCH_APROXIMADO)
+    if MATCH_APROXIMADO:
+        out = _casar_por_razao_social(out, cad, nomes_cad)
+    for c in COLUNAS_CADASTRO:
         if c in out.columns:
-            out[c] = out[c].fillna("").astype(str)
+            out[c] = preencher_vazio(out[c])
         else:
-            out[c] = ""
+            out[c] = categoria_vazia(out.index)
     out = out.drop(columns=["CNPJ_norm"], errors="ignore")
     return out
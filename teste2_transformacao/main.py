@@ -1,34 +1,74 @@
 """
 Pipeline Teste 2: Transformacao e Validacao.
 Le o consolidado_despesas.csv (do Teste 1), valida, enriquece com cadastro,
-agrega por RazaoSocial/UF e gera despesas_agregadas.csv.
+agrega por RazaoSocial/UF e gera despesas_agregadas.csv (e o cubo despesas_cubo.csv).
+Com --sample FRACAO (ou ANS_AMOSTRA), so as operadoras da amostra deterministica do teste1 (comum/amostra.py).
 """
 
+import argparse
 import logging
-import os
-import zipfile
 from pathlib import Path
 
 import pandas as pd
 
-from config import CONSOLIDATED_CSV, OUTPUT_CSV, OUTPUT_DIR
+from config import (
+    AMOSTRA, CONSOLIDATED_CSV, CONSOLIDATED_ZIP, CUBO_CSV, CUBO_ZIP, MOTOR, OUTPUT_CSV, OUTPUT_DIR, OUTPUT_ZIP, SAIDA_FORMATO,
+    ZIP_NIVEL,
+)
+from comum.polars_pandas import POLARS_MINIMO
+from comum.saida import destinos, gravar_csv_zip
 from validacao import validar_df
-from enriquecimento import baixar_cadastral_se_necessario, enriquecer
+from enriquecimento import amostrar_consolidado, baixar_cadastral_se_necessario, enriquecer
 from agregacao import agregar
+from cubo import construir_cubo
+import motor_polars
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 
-def run():
+def _gravar(df: pd.DataFrame, out_dir: Path, nome_csv: str, nome_zip: str) -> Path:
+    """CSV e/ou ZIP numa passada conforme ANS_SAIDA; retorna o CSV (ou o ZIP, se so ele foi gravado)."""
+    csv_path, zip_path = destinos(SAIDA_FORMATO, out_dir / nome_csv, out_dir / nome_zip)
+    gravar_csv_zip(df, csv_path, zip_path, nome_csv, nivel_zip=ZIP_NIVEL)
+    return csv_path or zip_path
+
+
+def run(fracao: float = 0.0):
     path_consolidado = Path(CONSOLIDATED_CSV)
+    if not path_consolidado.exists() and Path(CONSOLIDATED_ZIP).exists():
+        # Teste 1 com ANS_SAIDA=zip: le o CSV de dentro do ZIP (pandas descompacta em streaming)
+        path_consolidado = Path(CONSOLIDATED_ZIP)
     if not path_consolidado.exists():
         raise FileNotFoundError(
             "Arquivo consolidado nao encontrado: %s. Execute antes o Teste 1 (teste1_api_ans/main.py)." % CONSOLIDATED_CSV
         )
+    cad_path = baixar_cadastral_se_necessario()
+    resultado = None
+    if MOTOR == "polars":
+        if motor_polars.disponivel():
+            resultado = motor_polars.transformar(path_consolidado, cad_path, fracao)
+        else:
+            logger.warning("ANS_MOTOR=polars sem o pacote polars (>= %s) instalado: usando o motor pandas", POLARS_MINIMO)
+    if resultado is None:
+        df, agg = _transformar_pandas(path_consolidado, cad_path, fracao)
+    else:
+        df, agg = resultado
+    cubo = construir_cubo(df)
+    out_dir = Path(OUTPUT_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    csv_out = _gravar(agg, out_dir, OUTPUT_CSV, OUTPUT_ZIP)
+    _gravar(cubo, out_dir, CUBO_CSV, CUBO_ZIP)
+    logger.info("Para a entrega, compacte o projeto (ou os artefatos indicados) em Teste_{seu_nome}.zip")
+    return csv_out
+
+
+def _transformar_pandas(path_consolidado: Path, cad_path: Path | None, fracao: float) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Leitura, amostra, validacao, enriquecimento e agregacao pelo motor pandas: (linhas enriquecidas, agregado)."""
     for enc in ("utf-8", "latin-1", "cp1252"):
         try:
-            df = pd.read_csv(path_consolidado, sep=";", encoding=enc)
+            # RazaoSocial repete em todo trimestre: categorica desde a leitura
+            df = pd.read_csv(path_consolidado, sep=";", encoding=enc, dtype={"RazaoSocial": "category"})
             break
         except Exception as e:
             logger.debug("Encoding %s: %s", enc, e)
@@ -36,19 +76,25 @@ def run():
     else:
         raise RuntimeError("Nao foi possivel ler o consolidado (encoding).")
     logger.info("Consolidado carregado: %d linhas", len(df))
+    if fracao:
+        # Idempotente se o teste1 ja rodou com a mesma amostra
+        df = amostrar_consolidado(df, cad_path, fracao)
+        logger.info("Amostra de %.1f%% das operadoras: %d linhas", fracao * 100, len(df))
     df = validar_df(df)
     logger.info("Apos validacao: %d linhas", len(df))
-    cad_path = baixar_cadastral_se_necessario()
-    df = enriquecer(df, cad_path)
-    agg = agregar(df)
-    out_dir = Path(OUTPUT_DIR)
-    out_dir.mkdir(parents=True, exist_ok=True)
-    csv_out = out_dir / OUTPUT_CSV
-    agg.to_csv(csv_out, index=False, sep=";", encoding="utf-8")
-    logger.info("Arquivo salvo: %s (%d linhas)", csv_out, len(agg))
-    logger.info("Para a entrega, compacte o projeto (ou os artefatos indicados) em Teste_{seu_nome}.zip")
-    return csv_out
+    df = enriquecer(df, cad_path, fracao)
+    return df, agregar(df)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste 2 - Transformacao e Validacao")
+    parser.add_argument("--sample", type=float, default=AMOSTRA, metavar="FRACAO",
+                        help="So uma fracao (0-1) das operadoras, por hash do REG_ANS (padrao: ANS_AMOSTRA)")
+    args = parser.parse_args()
+    if not 0 <= args.sample <= 1:
+        parser.error("--sample deve estar entre 0 e 1")
+    return run(args.sample)
 
 
 if __name__ == "__main__":
-    run()
+    main()
@@ -0,0 +1,123 @@
+"""
+Motor Polars (ANS_MOTOR=polars) do Teste 2.
+Leitura do consolidado, amostra, validacao, join com o cadastro e agregacao por RazaoSocial/UF viram um
+plano lazy; as linhas enriquecidas (para o cubo) e o agregado sao executados juntos (collect_all), em
+paralelo e com as etapas comuns calculadas uma vez. Resultado igual ao de validar_df + enriquecer + agregar.
+
+O cadastro e preparado pelo mesmo codigo do motor pandas (enriquecimento.preparar_cadastro). O match
+aproximado por razao social (ANS_MATCH_APROXIMADO=1) nao tem versao Polars: transformar devolve None e o
+chamador usa o motor pandas. Polars e opcional (pip install "polars>=1.26"); conversoes com o pandas em
+comum/polars_pandas.py.
+"""
+
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from config import CNPJ_INT, MATCH_APROXIMADO
+from comum.polars_pandas import de_pandas, para_pandas, pl
+from enriquecimento import COLUNAS_CADASTRO, cnpjs_da_amostra, preparar_cadastro
+
+logger = logging.getLogger(__name__)
+
+PESOS_DV1 = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+PESOS_DV2 = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+
+
+def disponivel() -> bool:
+    return pl is not None
+
+
+def _ler_consolidado(path: Path, scan: bool = True) -> "pl.LazyFrame":
+    """
+    scan_csv do consolidado (UTF-8, como o Teste 1 grava). O encoding so e conferido quando o plano executa:
+    transformar refaz o plano com scan=False se a leitura falhar. ZIP e outros encodings passam pelo pandas.
+    """
+    if scan and path.suffix.lower() == ".csv":
+        return pl.scan_csv(path, separator=";", infer_schema_length=10000)
+    for enc in ("utf-8", "latin-1", "cp1252"):
+        try:
+            return de_pandas(pd.read_csv(path, sep=";", encoding=enc)).lazy()
+        except Exception as e:
+            logger.debug("Encoding %s: %s", enc, e)
+    raise RuntimeError("Nao foi possivel ler o consolidado (encoding).")
+
+
+def _cnpj_valido(n: "pl.Expr") -> "pl.Expr":
+    """validacao.validar_cnpj_int como expressao: digitos verificadores por aritmetica inteira."""
+    digitos = [(n // 10 ** (13 - k)) % 10 for k in range(14)]
+
+    def dv(ds: list, pesos: list) -> "pl.Expr":
+        d = 11 - sum(x * p for x, p in zip(ds, pesos)) % 11
+        return pl.when(d >= 10).then(0).otherwise(d)
+
+    d1 = dv(digitos[:12], PESOS_DV1)
+    d2 = dv(digitos[:12] + [d1], PESOS_DV2)
+    return n.is_not_null() & (n >= 0) & (n < 10 ** 14) & (digitos[12] == d1) & (digitos[13] == d2)
+
+
+def _validar(lf: "pl.LazyFrame") -> "pl.LazyFrame":
+    """Mesmas regras de validar_df: CNPJ (formato + dv), ValorDespesas > 0, RazaoSocial nao vazia."""
+    digitos = pl.col("CNPJ").cast(pl.String).fill_null("").str.replace_all(r"\D", "")
+    if CNPJ_INT:
+        # Mais de 14 digitos: nulo (invalido), como cnpj_para_int e o modo texto
+        lf = lf.with_columns(CNPJ=pl.when(digitos.str.len_chars() <= 14).then(digitos).cast(pl.Int64, strict=False))
+        ok_cnpj = _cnpj_valido(pl.col("CNPJ"))
+    else:
+        # Sem digitos (nulo): nulo, rejeitado como <NA> no modo inteiro (e nao "00000000000000")
+        lf = lf.with_columns(CNPJ=pl.when(digitos != "").then(digitos.str.zfill(14)))
+        # 14 digitos: cabe em Int64 e a validacao inteira vale para o texto
+        ok_cnpj = (pl.col("CNPJ").str.len_chars() == 14) & _cnpj_valido(pl.col("CNPJ").cast(pl.Int64, strict=False))
+    return lf.filter(
+        ok_cnpj
+        & (pl.col("ValorDespesas").cast(pl.Float64, strict=False) > 0)
+        & (pl.col("RazaoSocial").cast(pl.String).fill_null("").str.strip_chars() != "")
+    )
+
+
+def _plano(lf: "pl.LazyFrame", cadastro_path: Path | None, fracao: float) -> list["pl.LazyFrame"]:
+    """[linhas enriquecidas, agregado] sobre o consolidado lido em lf."""
+    lf = _validar(lf)
+    if fracao:
+        cnpjs = [int(c) if CNPJ_INT else c for c in cnpjs_da_amostra(cadastro_path, fracao) if not pd.isna(c)]
+        lf = lf.filter(pl.col("CNPJ").is_in(cnpjs))
+    cad, _ = preparar_cadastro(cadastro_path, fracao)
+    if cad is not None:
+        cad = de_pandas(cad).lazy().rename({"CNPJ_norm": "CNPJ"})
+        if CNPJ_INT:
+            cad = cad.with_columns(pl.col("CNPJ").cast(pl.Int64))
+        lf = lf.join(cad, on="CNPJ", how="left", maintain_order="left")
+    nomes = lf.collect_schema().names()
+    lf = lf.with_columns(
+        (pl.col(c).cast(pl.String).fill_null("") if c in nomes else pl.lit("")).alias(c) for c in COLUNAS_CADASTRO
+    )
+    agg = (
+        lf.group_by(["RazaoSocial", "UF"])
+        .agg(
+            pl.col("ValorDespesas").cast(pl.Float64).sum().alias("ValorTotal"),
+            pl.col("ValorDespesas").cast(pl.Float64).mean().alias("MediaPorTrimestre"),
+            pl.col("ValorDespesas").cast(pl.Float64).std(ddof=1).fill_null(0).alias("DesvioPadraoDespesas"),
+        )
+        .sort("ValorTotal", descending=True, maintain_order=True)
+    )
+    return [lf, agg]
+
+
+def transformar(path_consolidado: Path, cadastro_path: Path | None, fracao: float = 0.0):
+    """
+    (linhas enriquecidas, agregado) pelo plano Polars, em pandas; None se a configuracao exigir o motor pandas.
+    Com fracao > 0 so entram os CNPJs das operadoras da amostra (mesma selecao de amostrar_consolidado).
+    """
+    if MATCH_APROXIMADO:
+        logger.warning("Match aproximado por razao social so no motor pandas")
+        return None
+    try:
+        df, agg = pl.collect_all(_plano(_ler_consolidado(path_consolidado), cadastro_path, fracao))
+    except pl.exceptions.ComputeError as e:
+        if "utf-8" not in str(e):
+            raise
+        logger.info("Consolidado fora de UTF-8: leitura pelo pandas")
+        df, agg = pl.collect_all(_plano(_ler_consolidado(path_consolidado, scan=False), cadastro_path, fracao))
+    logger.info("Apos validacao e enriquecimento (motor polars): %d linhas, %d grupos", len(df), len(agg))
+    return para_pandas(df), para_pandas(agg)
@@ -0,0 +1,71 @@
+"""
+Fixtures dos testes do Teste 2.
+Os modulos da etapa sao importados de novo em cada teste: config le o ambiente (ANS_*) na importacao, e
+os outros testes (teste1, teste3) tem modulos com os mesmos nomes (config, main, ...).
+gravar_fixtures: consolidado e cadastro com CNPJ invalido, razao social vazia/nula, valores nulos/zerados
+e cadastro com CNPJ repetido e campos vazios.
+"""
+
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+ETAPA = Path(__file__).resolve().parents[1]
+MODULOS = sorted(p.stem for p in ETAPA.glob("*.py"))
+
+
+@pytest.fixture
+def etapa(monkeypatch):
+    """Funcao que importa um modulo do Teste 2 com o ambiente atual do teste (monkeypatch.setenv antes)."""
+    monkeypatch.syspath_prepend(str(ETAPA))
+    for nome in MODULOS:
+        monkeypatch.delitem(sys.modules, nome, raising=False)
+    return importlib.import_module
+
+
+CADASTRO = "Registro_ANS;CNPJ;Razao_Social;Modalidade;UF\n"
+
+
+def _cnpj(i: int) -> str:
+    base = "%012d" % (10 ** 11 + i * 7919)
+    for pesos in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        d = 11 - sum(int(c) * p for c, p in zip(base, pesos)) % 11
+        base += str(0 if d >= 10 else d)
+    return base
+
+
+def _gravar_fixtures(tmp_path, razao_vazia: bool = False):
+    cad = CADASTRO
+    for i, (mod, uf) in enumerate([("Medicina", "SP"), ("Odonto", "RJ"), ("Medicina", ""), ("", "MG"), ("Odonto", "SP")]):
+        cad += "%d;%s;OPERADORA %d;%s;%s\n" % (300000 + i, _cnpj(i), i, mod, uf)
+    # CNPJ repetido no cadastro: vale a primeira linha
+    cad += "399999;%s;OPERADORA 1 B;Autogestao;BA\n" % _cnpj(1)
+    (tmp_path / "cadop.csv").write_text(cad, encoding="utf-8")
+
+    linhas = ["CNPJ;RazaoSocial;Trimestre;Ano;ValorDespesas"]
+    for t in (1, 2, 3):
+        for i in range(6):  # operadora 5: CNPJ valido fora do cadastro
+            linhas.append("%s;OPERADORA %d;%d;2024;%.2f" % (_cnpj(i), i, t, 1000 * (i + 1) + 17.5 * t * t))
+    linhas += [
+        "%s;OPERADORA 0;4;2024;" % _cnpj(0),            # valor nulo
+        "%s;OPERADORA 0;4;2023;0" % _cnpj(0),           # valor zero
+        "%s;OPERADORA 1;4;2023;-12.5" % _cnpj(1),       # valor negativo
+        "%s;;4;2023;10" % _cnpj(2),                     # razao social nula
+        "%s;   ;4;2022;10" % _cnpj(3),                  # razao social em branco
+        "12345678000100;OPERADORA X;1;2024;500",        # digitos verificadores errados
+        "1234;OPERADORA Y;1;2024;500",                  # CNPJ curto
+        "%s0;OPERADORA 2;1;2023;500" % _cnpj(2),        # 15 digitos (os 14 primeiros sao validos)
+        "%s;OPERADORA 4;4;2023;250.25" % _cnpj(4)[:-1],  # 13 digitos (zfill muda os dv)
+    ]
+    if razao_vazia:
+        linhas = [linhas[0]] + [";".join(l.split(";")[:1] + [""] + l.split(";")[2:]) for l in linhas[1:]]
+    (tmp_path / "consolidado.csv").write_text("\n".join(linhas) + "\n", encoding="utf-8")
+    return tmp_path / "consolidado.csv", tmp_path / "cadop.csv"
+
+
+@pytest.fixture
+def gravar_fixtures(tmp_path):
+    """Funcao que grava consolidado.csv e cadop.csv em tmp_path e devolve os dois caminhos."""
+    return lambda razao_vazia=False: _gravar_fixtures(tmp_path, razao_vazia)
@@ -0,0 +1,100 @@
+"""
+Equivalencia das colunas categoricas (validar_df + enriquecer + agregar) com a versao anterior em strings,
+reproduzida aqui como referencia, sobre as fixtures de conftest.gravar_fixtures.
+"""
+
+import pandas as pd
+import pytest
+
+def _referencia(validacao, path_consolidado, cad_path, cnpj_int: bool):
+    """validar_df + enriquecer + agregar como eram antes das categoricas: tudo em strings (object)."""
+    df = pd.read_csv(path_consolidado, sep=";")
+
+    def normalizar(serie):
+        if cnpj_int:
+            return validacao.cnpj_para_int(serie)
+        return serie.astype(str).str.replace(r"\D", "", regex=True).str.zfill(14)
+
+    df["CNPJ"] = normalizar(df["CNPJ"])
+    ok = validacao.validar_cnpj_int(df["CNPJ"]) if cnpj_int else df["CNPJ"].apply(validacao.validar_cnpj)
+    ok &= pd.to_numeric(df["ValorDespesas"], errors="coerce") > 0
+    ok &= df["RazaoSocial"].fillna("").astype(str).str.strip() != ""
+    df = df.loc[ok].reset_index(drop=True)
+    if cnpj_int:
+        df["CNPJ"] = df["CNPJ"].astype("int64")
+
+    df["CNPJ_norm"] = normalizar(df["CNPJ"])
+    if cad_path is None:
+        for c in ("RegistroANS", "Modalidade", "UF"):
+            df[c] = ""
+        out = df.drop(columns=["CNPJ_norm"])
+    else:
+        cad = pd.read_csv(cad_path, sep=";")
+        cad["CNPJ_norm"] = normalizar(cad["CNPJ"])
+        cad = cad.drop_duplicates(subset=["CNPJ_norm"], keep="first")
+        cad["RegistroANS"] = cad["Registro_ANS"].astype(str)
+        cad["Modalidade"] = cad["Modalidade"].fillna("").astype(str)
+        cad["UF"] = cad["UF"].fillna("").astype(str)
+        out = df.merge(cad[["CNPJ_norm", "RegistroANS", "Modalidade", "UF"]], on="CNPJ_norm", how="left")
+        for c in ("RegistroANS", "Modalidade", "UF"):
+            out[c] = out[c].fillna("").astype(str)
+        out = out.drop(columns=["CNPJ_norm"])
+
+    if out.empty:
+        return out, pd.DataFrame()
+    agg = out.assign(ValorDespesas=pd.to_numeric(out["ValorDespesas"], errors="coerce").fillna(0))
+    agg = agg.groupby(["RazaoSocial", "UF"], as_index=False).agg(
+        ValorTotal=("ValorDespesas", "sum"),
+        MediaPorTrimestre=("ValorDespesas", "mean"),
+        DesvioPadraoDespesas=("ValorDespesas", "std"),
+    )
+    agg["DesvioPadraoDespesas"] = agg["DesvioPadraoDespesas"].fillna(0)
+    return out, agg.sort_values("ValorTotal", ascending=False).reset_index(drop=True)
+
+
+def _atual(etapa, path_consolidado, cad_path):
+    """Caminho atual: RazaoSocial lida como categoria (main.py) e colunas do cadastro categoricas."""
+    validacao, enriquecimento, agregacao = etapa("validacao"), etapa("enriquecimento"), etapa("agregacao")
+    df = pd.read_csv(path_consolidado, sep=";", dtype={"RazaoSocial": "category"})
+    df = enriquecimento.enriquecer(validacao.validar_df(df), cad_path)
+    return df, agregacao.agregar(df.copy())
+
+
+def _como_strings(df: pd.DataFrame) -> pd.DataFrame:
+    return df.astype({c: object for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)})
+
+
+@pytest.mark.parametrize("cnpj_int", ["0", "1"])
+@pytest.mark.parametrize("com_cadastro", [True, False])
+def test_mesmo_resultado_da_versao_em_strings(etapa, monkeypatch, gravar_fixtures, cnpj_int, com_cadastro):
+    monkeypatch.setenv("ANS_CNPJ_INT", cnpj_int)
+    path_consolidado, cad_path = gravar_fixtures()
+    cad_path = cad_path if com_cadastro else None
+    df, agg = _atual(etapa, path_consolidado, cad_path)
+    df_ref, agg_ref = _referencia(etapa("validacao"), path_consolidado, cad_path, cnpj_int == "1")
+
+    assert len(df_ref) == 18
+    pd.testing.assert_frame_equal(_como_strings(df), df_ref, check_dtype=False)
+    # despesas_agregadas.csv byte a byte igual
+    assert agg.to_csv(sep=";", index=False) == agg_ref.to_csv(sep=";", index=False)
+
+
+def test_razao_social_toda_vazia(etapa, gravar_fixtures):
+    """RazaoSocial nula em todas as linhas: categoria sem categorias; todas as linhas rejeitadas, sem erro."""
+    path_consolidado, cad_path = gravar_fixtures(razao_vazia=True)
+    validacao = etapa("validacao")
+    df = pd.read_csv(path_consolidado, sep=";", dtype={"RazaoSocial": "category"})
+    assert len(df["RazaoSocial"].cat.categories) == 0
+    assert validacao.validar_df(df).empty
+    df, agg = _atual(etapa, path_consolidado, cad_path)
+    assert df.empty and agg.empty
+    assert _referencia(validacao, path_consolidado, cad_path, False)[0].empty
+
+
+def test_texto_preenchido(etapa):
+    validacao = etapa("validacao")
+    valores = ["A", "", "  ", None, " b "]
+    esperado = [True, False, False, False, True]
+    assert validacao.texto_preenchido(pd.Series(valores)).tolist() == esperado
+    assert validacao.texto_preenchido(pd.Series(valores, dtype="category")).tolist() == esperado
+    assert validacao.texto_preenchido(pd.Series([None, None], dtype="category")).tolist() == [False, False]
@@ -0,0 +1,45 @@
+"""
+Motor Polars (motor_polars.transformar) da as mesmas linhas enriquecidas, agregado e cubo que o motor pandas
+(main._transformar_pandas), sobre as fixtures de conftest.gravar_fixtures; com e sem amostra, com e sem
+cadastro, e com o consolidado em latin-1 (scan_csv falha na leitura e o plano e refeito pelo pandas).
+Somas e medias podem diferir na ordem de 1e-13 (o pandas soma com compensacao).
+"""
+
+import pandas as pd
+import pytest
+
+pl = pytest.importorskip("polars", minversion="1.26")
+
+
+def _como_texto(df: pd.DataFrame) -> pd.DataFrame:
+    """Colunas categoricas (pandas) e String (Polars) como object, para comparar so os valores."""
+    return df.astype({c: object for c in df.columns if df[c].dtype.kind not in "biuf"}).reset_index(drop=True)
+
+
+def _iguais(a: pd.DataFrame, b: pd.DataFrame) -> None:
+    pd.testing.assert_frame_equal(_como_texto(a), _como_texto(b), check_dtype=False, rtol=1e-12)
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "latin-1"])
+@pytest.mark.parametrize("fracao", [0.0, 0.5])
+@pytest.mark.parametrize("com_cadastro", [True, False])
+@pytest.mark.parametrize("cnpj_int", ["0", "1"])
+def test_mesmo_resultado_do_motor_pandas(etapa, monkeypatch, gravar_fixtures, cnpj_int, com_cadastro, fracao, encoding):
+    monkeypatch.setenv("ANS_CNPJ_INT", cnpj_int)
+    path_consolidado, cad_path = gravar_fixtures()
+    texto = path_consolidado.read_text(encoding="utf-8").replace("OPERADORA", "OPERAÇÃO")
+    path_consolidado.write_text(texto, encoding=encoding)
+    cad_path = cad_path if com_cadastro else None
+    main, motor_polars, cubo = etapa("main"), etapa("motor_polars"), etapa("cubo")
+
+    df_ref, agg_ref = main._transformar_pandas(path_consolidado, cad_path, fracao)
+    df, agg = motor_polars.transformar(path_consolidado, cad_path, fracao)
+
+    # Amostra sem cadastro nao seleciona operadora nenhuma (o CNPJ das operadoras da amostra vem dele)
+    assert df_ref.empty == bool(fracao and not com_cadastro)
+    assert len(df) == len(df_ref)
+    if df_ref.empty:
+        return
+    _iguais(df, df_ref)
+    _iguais(agg, agg_ref)
+    _iguais(cubo.construir_cubo(df), cubo.construir_cubo(df_ref))
@@ -0,0 +1,30 @@
+"""ANS_SAIDA no Teste 2: o nome do modo diz quais artefatos sao gravados (comum/saida.py)."""
+
+import zipfile
+
+import pandas as pd
+import pytest
+
+
+@pytest.mark.parametrize("formato, csv, zip_", [("csv+zip", True, True), ("csv", True, False), ("zip", False, True)])
+def test_gravar_conforme_ans_saida(etapa, monkeypatch, tmp_path, formato, csv, zip_):
+    monkeypatch.setenv("ANS_SAIDA", formato)
+    main = etapa("main")
+    df = pd.DataFrame({"RazaoSocial": ["A", "B"], "UF": ["SP", ""], "ValorTotal": [1.5, 2.0]})
+    gravado = main._gravar(df, tmp_path, "agregadas.csv", "agregadas.zip")
+    assert (tmp_path / "agregadas.csv").exists() == csv
+    assert (tmp_path / "agregadas.zip").exists() == zip_
+    assert gravado == tmp_path / ("agregadas.csv" if csv else "agregadas.zip")
+    esperado = df.to_csv(sep=";", index=False).encode("utf-8")
+    if csv:
+        assert (tmp_path / "agregadas.csv").read_bytes() == esperado
+    if zip_:
+        with zipfile.ZipFile(tmp_path / "agregadas.zip") as z:
+            assert z.read("agregadas.csv") == esperado
+
+
+def test_ans_saida_invalido(etapa, monkeypatch, tmp_path):
+    monkeypatch.setenv("ANS_SAIDA", "parquet")
+    main = etapa("main")
+    with pytest.raises(ValueError):
+        main._gravar(pd.DataFrame({"a": [1]}), tmp_path, "x.csv", "x.zip")
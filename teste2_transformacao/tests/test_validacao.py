@@ -0,0 +1,45 @@
+"""validar_df aceita e rejeita as mesmas linhas com CNPJ em texto e com ANS_CNPJ_INT=1."""
+
+import pandas as pd
+import pytest
+
+VALIDO = "11222333000181"
+
+
+def _consolidado(cnpjs: list) -> pd.DataFrame:
+    return pd.DataFrame({
+        "CNPJ": cnpjs,
+        "RazaoSocial": ["OPERADORA %d" % i for i in range(len(cnpjs))],
+        "Trimestre": 1,
+        "Ano": 2024,
+        "ValorDespesas": 100.0,
+    })
+
+
+def _aceitas(etapa, monkeypatch, cnpj_int: str, df: pd.DataFrame) -> list:
+    monkeypatch.setenv("ANS_CNPJ_INT", cnpj_int)
+    return etapa("validacao").validar_df(df)["RazaoSocial"].tolist()
+
+
+@pytest.mark.parametrize("cnpjs, esperado", [
+    # 15 digitos: os 14 primeiros formam um CNPJ valido, mas o valor nao e um CNPJ
+    ([VALIDO, VALIDO + "0", "11.222.333/0001-810"], ["OPERADORA 0"]),
+    # nulo nao vira "00000000000000" (dv validos) no modo texto
+    ([VALIDO, None, ""], ["OPERADORA 0"]),
+    # coluna float (CSV com CNPJ nulo): o ".0" de str(float) nao conta como digito
+    ([float(VALIDO), float("nan"), float(VALIDO + "0")], ["OPERADORA 0"]),
+    ([1234, 112223330001, int(VALIDO)], ["OPERADORA 2"]),
+])
+def test_mesmas_linhas_nos_dois_modos(etapa, monkeypatch, cnpjs, esperado):
+    for cnpj_int in ("0", "1"):
+        assert _aceitas(etapa, monkeypatch, cnpj_int, _consolidado(cnpjs)) == esperado, cnpj_int
+
+
+def test_cnpj_para_int(etapa):
+    cnpj = etapa("comum.cnpj")
+    serie = pd.Series([VALIDO, VALIDO + "0", None, "12.345"])
+    esperado = pd.Series([11222333000181, None, None, 12345], dtype="Int64")
+    pd.testing.assert_series_equal(cnpj.cnpj_para_int(serie), esperado)
+    esperado[1] = 11222333000181
+    pd.testing.assert_series_equal(cnpj.cnpj_para_int(serie, truncar=True), esperado)
+    pd.testing.assert_series_equal(cnpj.cnpj_para_int(pd.Series([float(VALIDO), None])), esperado.iloc[[0, 2]].reset_index(drop=True))
@@ -11,8 +11,12 @@ import re
 import logging
 from typing import Tuple
 
+import numpy as np
 import pandas as pd
 
+from config import CNPJ_INT
+from comum.cnpj import cnpj_para_int, cnpj_texto
+
 logger = logging.getLogger(__name__)
 
 
@@ -43,6 +47,33 @@ def validar_cnpj(cnpj: str) -> bool:
     return digits[12] == d1_esp and digits[13] == d2_esp
 
 
+def validar_cnpj_int(serie: pd.Series) -> pd.Series:
+    """Equivalente vetorizado de validar_cnpj para CNPJ inteiro: digitos por aritmetica, sem strings."""
+    n = serie.fillna(-1).to_numpy(dtype="int64")
+    digitos = [(n // 10 ** (13 - k)) % 10 for k in range(14)]
+
+    def dv(ds: list, pesos: list) -> np.ndarray:
+        d = 11 - sum(x * p for x, p in zip(ds, pesos)) % 11
+        return np.where(d >= 10, 0, d)
+
+    d1 = dv(digitos[:12], [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    d2 = dv(digitos[:12] + [d1], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    ok = (n >= 0) & (n < 10 ** 14) & (digitos[12] == d1) & (digitos[13] == d2)
+    return pd.Series(ok, index=serie.index)
+
+
+def texto_preenchido(serie: pd.Series) -> pd.Series:
+    """True onde o texto nao e nulo nem vazio apos strip; em coluna categorica avalia so as categorias."""
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        ok_cat = np.asarray(serie.cat.categories.astype(str).str.strip() != "")
+        if not len(ok_cat):
+            # Sem categorias (coluna toda nula): nenhuma linha preenchida; codes == -1 nao indexa ok_cat vazio
+            return pd.Series(False, index=serie.index)
+        codes = serie.cat.codes.to_numpy()
+        return pd.Series((codes >= 0) & ok_cat[codes], index=serie.index)
+    return serie.fillna("").astype(str).str.strip() != ""
+
+
 def validar_df(df: pd.DataFrame) -> pd.DataFrame:
     """
     Aplica validacoes e retorna apenas linhas validas.
@@ -60,11 +91,18 @@ def validar_df(df: pd.DataFrame) -> pd.DataFrame:
             logger.warning("Coluna %s ausente", c)
             return pd.DataFrame()
     df = df.copy()
-    df[col_cnpj] = df[col_cnpj].astype(str).str.replace(r"\D", "", regex=True).str.zfill(14)
-    mask_cnpj = df[col_cnpj].apply(validar_cnpj)
+    if CNPJ_INT:
+        df[col_cnpj] = cnpj_para_int(df[col_cnpj])
+        mask_cnpj = validar_cnpj_int(df[col_cnpj])
+    else:
+        df[col_cnpj] = cnpj_texto(df[col_cnpj])
+        mask_cnpj = df[col_cnpj].apply(validar_cnpj)
     mask_valor = pd.to_numeric(df[col_valor], errors="coerce") > 0
-    mask_razao = df[col_razao].fillna("").astype(str).str.strip() != ""
+    mask_razao = texto_preenchido(df[col_razao])
     rejeitados = (~mask_cnpj).sum()
     if rejeitados > 0:
         logger.info("Linhas rejeitadas por CNPJ invalido: %d", rejeitados)
-    return df.loc[mask_cnpj & mask_valor & mask_razao].reset_index(drop=True)
+    df = df.loc[mask_cnpj & mask_valor & mask_razao].reset_index(drop=True)
+    if CNPJ_INT:
+        df[col_cnpj] = df[col_cnpj].astype("int64")
+    return df
@@ -0,0 +1,8 @@
+-- Opcional (ANS_CNPJ_INT=1 ou run_ddl.py --cnpj-bigint), aplicado logo apos schema.sql com as tabelas vazias.
+-- CNPJ como BIGINT (8 bytes) em vez de VARCHAR(14) (15 bytes): linhas e indices menores, comparacao inteira nos joins/lookups.
+-- A formatacao com zeros a esquerda fica nas saidas (API e export usam lpad / "%014d").
+-- O indice varchar_pattern_ops nao se aplica a BIGINT: a busca por prefixo de CNPJ vira intervalo no indice btree de cnpj.
+DROP INDEX IF EXISTS idx_despesas_cons_cnpj_prefixo;
+ALTER TABLE operadoras ALTER COLUMN cnpj TYPE BIGINT USING cnpj::bigint;
+ALTER TABLE despesas_consolidado ALTER COLUMN cnpj TYPE BIGINT USING cnpj::bigint;
+ALTER TABLE resumo_operadora ALTER COLUMN cnpj TYPE BIGINT USING cnpj::bigint;
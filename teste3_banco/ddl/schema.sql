@@ -3,6 +3,33 @@
 -- Justificativa: volume moderado, consultas analiticas por operadora/UF/trimestre; normalizacao evita redundancia e atualizacoes inconsistentes.
 -- Tipos: valores monetarios em NUMERIC(18,2) (precisao; FLOAT evita-se por arredondamento); ano/trimestre em SMALLINT; datas nao usadas como filtro mantidas como VARCHAR para flexibilidade de importacao.
 
+-- Busca textual (Teste 4): pg_trgm para LIKE '%...%' indexado; unaccent para busca sem acentos.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() nao e IMMUTABLE (depende do dicionario configurado); o wrapper fixa o dicionario e permite uso em indice.
+CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$;
+
+-- Depois de uma publicacao versionada (publicar.py) estes nomes sao views sobre o esquema ans_v<versao>:
+-- remove as views para recriar as tabelas no public (o esquema publicado fica para a coleta de publicar.py).
+DO $$
+DECLARE
+    v record;
+BEGIN
+    FOR v IN SELECT viewname FROM pg_views
+             WHERE schemaname = 'public'
+               AND viewname IN ('despesas_cubo', 'resumo_uf', 'resumo_operadora', 'resumo_periodo', 'despesas_agregadas', 'despesas_consolidado', 'operadoras')
+    LOOP
+        EXECUTE format('DROP VIEW public.%I', v.viewname);
+    END LOOP;
+END $$;
+
+DROP TABLE IF EXISTS despesas_cubo;
+DROP TABLE IF EXISTS resumo_uf;
+DROP TABLE IF EXISTS resumo_operadora;
+DROP TABLE IF EXISTS resumo_periodo;
 DROP TABLE IF EXISTS despesas_agregadas;
 DROP TABLE IF EXISTS despesas_consolidado;
 DROP TABLE IF EXISTS operadoras;
@@ -28,13 +55,19 @@ CREATE TABLE despesas_consolidado (
     trimestre SMALLINT NOT NULL,
     ano SMALLINT NOT NULL,
     valor_despesas NUMERIC(18, 2) NOT NULL,
+    -- Chave de periodo ordenavel (ex.: 20253) materializada: predicados por periodo usam indice em vez de calcular ano * 10 + trimestre por linha
+    periodo INTEGER GENERATED ALWAYS AS (ano * 10 + trimestre) STORED,
     CONSTRAINT chk_valor_positivo CHECK (valor_despesas >= 0),
     CONSTRAINT chk_trimestre CHECK (trimestre BETWEEN 1 AND 4),
     CONSTRAINT chk_ano CHECK (ano >= 2000 AND ano <= 2100)
 );
 CREATE INDEX idx_despesas_cons_cnpj ON despesas_consolidado(cnpj);
 CREATE INDEX idx_despesas_cons_ano_trim ON despesas_consolidado(ano, trimestre);
+CREATE INDEX idx_despesas_cons_periodo ON despesas_consolidado(periodo, cnpj);
 CREATE INDEX idx_despesas_cons_razao ON despesas_consolidado(razao_social);
+-- Busca da API (q): substring sem acento/caixa na razao social (GIN trigram) e prefixo de CNPJ (pattern_ops, independe do collation).
+CREATE INDEX idx_despesas_cons_razao_trgm ON despesas_consolidado USING gin (f_unaccent(lower(razao_social)) gin_trgm_ops);
+CREATE INDEX idx_despesas_cons_cnpj_prefixo ON despesas_consolidado(cnpj varchar_pattern_ops);
 
 -- Despesas agregadas por RazaoSocial e UF (fonte: despesas_agregadas.csv)
 CREATE TABLE despesas_agregadas (
@@ -49,3 +82,57 @@ CREATE TABLE despesas_agregadas (
 CREATE INDEX idx_despesas_agr_uf ON despesas_agregadas(uf);
 CREATE INDEX idx_despesas_agr_razao ON despesas_agregadas(razao_social);
 CREATE INDEX idx_despesas_agr_valor ON despesas_agregadas(valor_total DESC);
+
+-- Cubo pre-agregado do Teste 2 (fonte: despesas_cubo.csv): uma linha por celula de cada agrupamento de
+-- RazaoSocial x UF x Modalidade x (Ano, Trimestre) -> Ano -> total. Dimensoes fora do agrupamento ficam NULL.
+-- Qualquer fatia e uma busca por indice, ex.: total por UF no trimestre
+--   SELECT uf, soma FROM despesas_cubo WHERE agrupamento = 'UF+Ano+Trimestre' AND ano = 2025 AND trimestre = 3;
+-- media = soma / contagem; desvio padrao amostral = sqrt(m2 / (contagem - 1)).
+CREATE TABLE despesas_cubo (
+    agrupamento VARCHAR(60) NOT NULL,
+    razao_social VARCHAR(500),
+    uf CHAR(2),
+    modalidade VARCHAR(200),
+    ano SMALLINT,
+    trimestre SMALLINT,
+    soma NUMERIC(18, 2) NOT NULL,
+    contagem INTEGER NOT NULL,
+    -- Soma dos quadrados dos desvios (combinavel entre celulas); DOUBLE: nao e valor monetario exibido
+    m2 DOUBLE PRECISION NOT NULL,
+    CONSTRAINT chk_cubo_contagem CHECK (contagem > 0)
+);
+CREATE UNIQUE INDEX idx_cubo_celula ON despesas_cubo(agrupamento, uf, ano, trimestre, modalidade, razao_social) NULLS NOT DISTINCT;
+
+-- Resumos para as queries analiticas (queries/analiticas.sql), recalculados ao fim de import_csv.py (atualizar_resumos).
+-- As queries leem apenas estas tabelas pequenas em vez de varrer despesas_consolidado a cada execucao.
+
+-- Media/total por periodo (Query 3: media geral por trimestre)
+CREATE TABLE resumo_periodo (
+    periodo INTEGER PRIMARY KEY,
+    ano SMALLINT NOT NULL,
+    trimestre SMALLINT NOT NULL,
+    media_despesas NUMERIC NOT NULL,
+    total_despesas NUMERIC(18, 2) NOT NULL,
+    num_registros INTEGER NOT NULL
+);
+
+-- Por operadora: valores no primeiro/ultimo periodo da base (Query 1) e trimestres acima da media (Query 3)
+CREATE TABLE resumo_operadora (
+    cnpj VARCHAR(14) NOT NULL,
+    razao_social VARCHAR(500),
+    valor_primeiro NUMERIC(18, 2) NOT NULL,
+    valor_ultimo NUMERIC(18, 2) NOT NULL,
+    crescimento_pct NUMERIC(18, 2),
+    trimestres_acima_media SMALLINT NOT NULL
+);
+CREATE INDEX idx_resumo_op_cnpj ON resumo_operadora(cnpj);
+CREATE INDEX idx_resumo_op_crescimento ON resumo_operadora(crescimento_pct DESC) WHERE crescimento_pct IS NOT NULL;
+CREATE INDEX idx_resumo_op_acima ON resumo_operadora(trimestres_acima_media);
+
+-- Por UF: total e numero de operadoras (Query 2)
+CREATE TABLE resumo_uf (
+    uf CHAR(2) PRIMARY KEY,
+    total_uf NUMERIC(18, 2) NOT NULL,
+    num_operadoras INTEGER NOT NULL
+);
+CREATE INDEX idx_resumo_uf_total ON resumo_uf(total_uf DESC);
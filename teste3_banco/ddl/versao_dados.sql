@@ -0,0 +1,10 @@
+-- Versao dos dados publicados (publicar.py). Uma linha por publicacao; a versao ativa e a unica com substituida_em nula.
+-- A API devolve a versao ativa no /health: caches podem usa-la como parte da chave.
+-- Versoes substituidas ha mais que a carencia tem o esquema removido (removida_em preenchido).
+CREATE TABLE IF NOT EXISTS public.ans_versao_dados (
+    versao BIGINT PRIMARY KEY,
+    esquema TEXT NOT NULL,
+    publicada_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    substituida_em TIMESTAMPTZ,
+    removida_em TIMESTAMPTZ
+);
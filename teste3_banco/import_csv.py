@@ -1,10 +1,13 @@
 """
 Importacao dos CSVs para o banco PostgreSQL (Teste 3.3).
 Encoding UTF-8; tratamento: NULL em obrigatorios -> rejeitar linha; string em numerico -> tentar conversao, senao rejeitar; datas inconsistentes -> normalizar ano/trimestre quando possivel.
+Com --sample FRACAO (ou ANS_AMOSTRA): so as operadoras da amostra deterministica dos Testes 1 e 2 (comum/amostra.py).
 """
 
+import argparse
 import os
 import re
+import sys
 import logging
 from pathlib import Path
 
@@ -12,6 +15,13 @@ import pandas as pd
 import psycopg2
 from psycopg2.extras import execute_values
 
+# Raiz do repositorio no sys.path: modulos compartilhados entre as etapas (comum/)
+RAIZ = str(Path(__file__).resolve().parent.parent)
+if RAIZ not in sys.path:
+    sys.path.append(RAIZ)
+
+from comum.amostra import mascara_registro
+
 # Carrega .env da raiz do projeto
 try:
     from dotenv import load_dotenv
@@ -27,6 +37,11 @@ DATA_DIR = BASE_DIR / "data"
 CONSOLIDATED = DATA_DIR / "consolidado_despesas.csv"
 AGREGADAS = DATA_DIR / "despesas_agregadas.csv"
 CADOP = DATA_DIR / "Relatorio_cadop.csv"
+CUBO = DATA_DIR / "despesas_cubo.csv"
+# Mesmo interruptor do pipeline: tabelas criadas com run_ddl.py --cnpj-bigint recebem CNPJ inteiro
+CNPJ_INT = os.environ.get("ANS_CNPJ_INT", "0") == "1"
+# Fracao da amostra de operadoras (mesma variavel dos Testes 1 e 2); 0 = tudo
+AMOSTRA = float(os.environ.get("ANS_AMOSTRA", "0"))
 
 
 def get_conn():
@@ -43,7 +58,15 @@ def _normalize_cnpj(v):
     if pd.isna(v):
         return None
     s = re.sub(r"\D", "", str(v).strip())
-    return s[:14].zfill(14) if len(s) >= 14 else None
+    if len(s) < 14:
+        return None
+    return int(s[:14]) if CNPJ_INT else s[:14].zfill(14)
+
+
+def _csv_ou_zip(path: Path) -> Path:
+    """O CSV ou, se so existir o ZIP de mesmo nome (ANS_SAIDA=zip nos Testes 1 e 2), o ZIP (pandas le o membro)."""
+    zip_path = path.with_suffix(".zip")
+    return zip_path if not path.exists() and zip_path.exists() else path
 
 
 def _to_num(v, default=None):
@@ -62,7 +85,7 @@ def _to_int(v, default=None):
     return int(n) if n is not None else default
 
 
-def import_operadoras(conn):
+def import_operadoras(conn, fracao: float = 0.0):
     if not CADOP.exists():
         logger.warning("Cadastro nao encontrado: %s. Pulando tabela operadoras.", CADOP)
         return 0
@@ -76,6 +99,8 @@ def import_operadoras(conn):
     if not reg or not cnpj:
         logger.warning("Colunas registro/cnpj nao encontradas no cadastro.")
         return 0
+    if fracao:
+        df = df[mascara_registro(df[reg], fracao)]
     rows = []
     for _, r in df.iterrows():
         cnpj_val = _normalize_cnpj(r.get(cnpj))
@@ -107,15 +132,16 @@ def import_operadoras(conn):
         cur.close()
 
 
-def import_consolidado(conn):
-    if not CONSOLIDATED.exists():
+def import_consolidado(conn, cnpjs: set | None = None):
+    origem = _csv_ou_zip(CONSOLIDATED)
+    if not origem.exists():
         logger.warning("Consolidado nao encontrado: %s", CONSOLIDATED)
         return 0
-    df = pd.read_csv(CONSOLIDATED, sep=";", encoding="utf-8")
+    df = pd.read_csv(origem, sep=";", encoding="utf-8")
     rows = []
     for _, r in df.iterrows():
         cnpj_val = _normalize_cnpj(r.get("CNPJ"))
-        if not cnpj_val:
+        if not cnpj_val or (cnpjs is not None and cnpj_val not in cnpjs):
             continue
         razao_val = str(r.get("RazaoSocial", "")).strip()[:500] or None
         trim = _to_int(r.get("Trimestre"), 0)
@@ -142,15 +168,16 @@ def import_consolidado(conn):
         cur.close()
 
 
-def import_agregadas(conn):
-    if not AGREGADAS.exists():
+def import_agregadas(conn, razoes: set | None = None):
+    origem = _csv_ou_zip(AGREGADAS)
+    if not origem.exists():
         logger.warning("Agregadas nao encontrado: %s", AGREGADAS)
         return 0
-    df = pd.read_csv(AGREGADAS, sep=";", encoding="utf-8")
+    df = pd.read_csv(origem, sep=";", encoding="utf-8")
     rows = []
     for _, r in df.iterrows():
         razao_val = str(r.get("RazaoSocial", "")).strip()[:500]
-        if not razao_val:
+        if not razao_val or (razoes is not None and razao_val not in razoes):
             continue
         uf_val = str(r.get("UF", "")).strip()[:2] or None
         vt = _to_num(r.get("ValorTotal"), -1)
@@ -175,19 +202,165 @@ def import_agregadas(conn):
         cur.close()
 
 
-def run():
+# Na amostra: celulas sem operadora recalculadas das celulas mais finas importadas, como em cubo.py do Teste 2
+# (CUBE x ROLLUP = os 12 agrupamentos sem RazaoSocial). M2 combinado em NUMERIC:
+# M2 = sum(M2_i) + sum(soma_i^2 / n_i) - soma^2 / n
+SQL_CUBO_SEM_OPERADORA = """
+INSERT INTO despesas_cubo (agrupamento, razao_social, uf, modalidade, ano, trimestre, soma, contagem, m2)
+SELECT COALESCE(NULLIF(CONCAT_WS('+',
+           CASE WHEN GROUPING(uf) = 0 THEN 'UF' END,
+           CASE WHEN GROUPING(modalidade) = 0 THEN 'Modalidade' END,
+           CASE WHEN GROUPING(ano) = 0 THEN 'Ano' END,
+           CASE WHEN GROUPING(trimestre) = 0 THEN 'Trimestre' END), ''), 'Total'),
+       NULL, uf, modalidade, ano, trimestre, SUM(soma), SUM(contagem),
+       GREATEST(SUM(m2::numeric) + SUM(soma * soma / contagem) - SUM(soma) * SUM(soma) / SUM(contagem), 0)::double precision
+FROM despesas_cubo
+WHERE agrupamento = 'RazaoSocial+UF+Modalidade+Ano+Trimestre'
+GROUP BY CUBE (uf, modalidade), ROLLUP (ano, trimestre)
+"""
+
+
+def import_cubo(conn, razoes: set | None = None):
+    origem = _csv_ou_zip(CUBO)
+    if not origem.exists():
+        logger.warning("Cubo nao encontrado: %s. Pulando tabela despesas_cubo.", CUBO)
+        return 0
+    df = pd.read_csv(origem, sep=";", encoding="utf-8", keep_default_na=False, dtype=str)
+    rows = []
+    for r in df.itertuples(index=False):
+        contagem = _to_int(r.Contagem, 0)
+        if not r.Agrupamento or contagem <= 0:
+            continue
+        # Celulas sem operadora (UF, Total...) somam todas as do CSV: na amostra, sao recalculadas abaixo
+        if razoes is not None and (not r.RazaoSocial or r.RazaoSocial[:500] not in razoes):
+            continue
+        rows.append((
+            r.Agrupamento,
+            r.RazaoSocial[:500] or None,
+            r.UF[:2] or None,
+            r.Modalidade[:200] or None,
+            _to_int(r.Ano),
+            _to_int(r.Trimestre),
+            round(_to_num(r.Soma, 0), 2),
+            contagem,
+            _to_num(r.M2, 0),
+        ))
+    if not rows:
+        return 0
+    cur = conn.cursor()
+    try:
+        execute_values(
+            cur,
+            """INSERT INTO despesas_cubo (agrupamento, razao_social, uf, modalidade, ano, trimestre, soma, contagem, m2) VALUES %s""",
+            rows,
+            page_size=1000,
+        )
+        n = len(rows)
+        if razoes is not None:
+            cur.execute(SQL_CUBO_SEM_OPERADORA)
+            n += cur.rowcount
+        conn.commit()
+        return n
+    finally:
+        cur.close()
+
+
+# Recalculo das tabelas resumo_* usadas por queries/analiticas.sql (uma varredura de cada tabela base por importacao)
+SQL_RESUMOS = """
+TRUNCATE resumo_periodo, resumo_operadora, resumo_uf;
+
+INSERT INTO resumo_periodo (periodo, ano, trimestre, media_despesas, total_despesas, num_registros)
+SELECT periodo, ano, trimestre, AVG(valor_despesas), SUM(valor_despesas), COUNT(*)
+FROM despesas_consolidado
+GROUP BY periodo, ano, trimestre;
+
+INSERT INTO resumo_operadora (cnpj, razao_social, valor_primeiro, valor_ultimo, crescimento_pct, trimestres_acima_media)
+WITH limites AS (
+    SELECT MIN(periodo) AS first_p, MAX(periodo) AS last_p FROM resumo_periodo
+),
+por_operadora AS (
+    SELECT d.cnpj, d.razao_social,
+           COALESCE(SUM(d.valor_despesas) FILTER (WHERE d.periodo = l.first_p), 0) AS valor_primeiro,
+           COALESCE(SUM(d.valor_despesas) FILTER (WHERE d.periodo = l.last_p), 0) AS valor_ultimo,
+           COUNT(*) FILTER (WHERE d.valor_despesas > r.media_despesas) AS trimestres_acima_media
+    FROM despesas_consolidado d
+    JOIN resumo_periodo r ON r.periodo = d.periodo
+    CROSS JOIN limites l
+    GROUP BY d.cnpj, d.razao_social
+)
+SELECT cnpj, razao_social, valor_primeiro, valor_ultimo,
+       CASE WHEN valor_primeiro > 0 AND valor_ultimo > 0
+            THEN ROUND(100.0 * (valor_ultimo - valor_primeiro) / valor_primeiro, 2) END,
+       trimestres_acima_media
+FROM por_operadora;
+
+INSERT INTO resumo_uf (uf, total_uf, num_operadoras)
+SELECT uf, SUM(valor_total), COUNT(*)
+FROM despesas_agregadas
+WHERE uf IS NOT NULL AND uf <> ''
+GROUP BY uf;
+
+ANALYZE resumo_periodo, resumo_operadora, resumo_uf;
+"""
+
+
+def atualizar_resumos(conn):
+    cur = conn.cursor()
+    try:
+        cur.execute(SQL_RESUMOS)
+        conn.commit()
+    finally:
+        cur.close()
+
+
+def _valores(conn, consulta: str) -> set:
+    cur = conn.cursor()
+    try:
+        cur.execute(consulta)
+        return {r[0] for r in cur.fetchall()}
+    finally:
+        cur.close()
+
+
+def importar(conn, fracao: float = AMOSTRA):
+    """
+    Carrega os CSVs (cadastro, consolidado, agregadas, cubo) e recalcula os resumos nas tabelas do search_path da conexao (public ou ans_v<versao>).
+    Com fracao > 0: cadastro pela amostra de REG_ANS; consolidado pelos CNPJs importados no cadastro; agregadas e cubo
+    pelas razoes sociais importadas no consolidado (idempotente se os Testes 1 e 2 rodaram com a mesma amostra);
+    as celulas do cubo sem operadora (UF, Modalidade, Total) sao recalculadas das operadoras importadas.
+    """
+    n_op = import_operadoras(conn, fracao)
+    logger.info("Operadoras: %d linhas", n_op)
+    cnpjs = _valores(conn, "SELECT cnpj FROM operadoras") if fracao else None
+    n_cons = import_consolidado(conn, cnpjs)
+    logger.info("Despesas consolidado: %d linhas", n_cons)
+    razoes = _valores(conn, "SELECT DISTINCT razao_social FROM despesas_consolidado") if fracao else None
+    n_agr = import_agregadas(conn, razoes)
+    logger.info("Despesas agregadas: %d linhas", n_agr)
+    n_cubo = import_cubo(conn, razoes)
+    logger.info("Cubo: %d celulas", n_cubo)
+    atualizar_resumos(conn)
+    logger.info("Resumos analiticos atualizados")
+
+
+def run(fracao: float = AMOSTRA):
     logger.info("Conectando ao banco...")
     conn = get_conn()
     try:
-        n_op = import_operadoras(conn)
-        logger.info("Operadoras: %d linhas", n_op)
-        n_cons = import_consolidado(conn)
-        logger.info("Despesas consolidado: %d linhas", n_cons)
-        n_agr = import_agregadas(conn)
-        logger.info("Despesas agregadas: %d linhas", n_agr)
+        importar(conn, fracao)
     finally:
         conn.close()
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Importa os CSVs dos Testes 1 e 2 no PostgreSQL")
+    parser.add_argument("--sample", type=float, default=AMOSTRA, metavar="FRACAO",
+                        help="So uma fracao (0-1) das operadoras, por hash do REG_ANS (padrao: ANS_AMOSTRA)")
+    args = parser.parse_args()
+    if not 0 <= args.sample <= 1:
+        parser.error("--sample deve estar entre 0 e 1")
+    run(args.sample)
+
+
 if __name__ == "__main__":
-    run()
+    main()
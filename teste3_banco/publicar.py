@@ -0,0 +1,280 @@
+"""
+Publicacao versionada dos dados (alternativa a run_ddl.py + import_csv.py sem indisponibilidade para a API).
+
+1. Cria o esquema ans_v<versao> (versao = timestamp AAAAMMDDHHMMSS) e aplica nele as tabelas do schema.sql
+   (+ cnpj_bigint.sql), sem os indices.
+2. Carrega os CSVs (import_csv.importar) com search_path = ans_v<versao>; cria os indices depois da carga
+   (mais rapido que manter indices durante os INSERTs) e roda ANALYZE.
+3. Registra a versao em ans_versao_dados (uma transacao de uma linha). A API le a versao ativa a cada
+   API_VERSAO_TTL_S e abre as conexoes com search_path = ans_v<versao>: passa para a versao nova sem
+   lock nenhum, e cada requisicao ve uma versao inteira, nunca tabela vazia ou pela metade.
+4. Troca as views public.<tabela> -> ans_v<versao>.<tabela> em uma transacao, para os demais clientes
+   (run_queries.py, snapshot.py, psql). A troca precisa de lock exclusivo nas views: usa lock_timeout
+   curto e tenta de novo, sem enfileirar as leituras novas atras do lock. Se nao conseguir, a proxima
+   execucao (inclusive --so-coletar) tenta de novo.
+5. Coleta: esquemas de versoes substituidas ha mais de --carencia-min minutos sao removidos (a carencia
+   cobre conexoes da API que ainda estejam na versao anterior). So roda com as views ja na versao ativa.
+
+Extensoes e f_unaccent ficam no public (compartilhados entre versoes): os indices de expressao das
+versoes e as consultas da API resolvem a mesma funcao.
+
+Uso:
+    python publicar.py                 # nova versao + coleta
+    python publicar.py --so-coletar    # apenas views + remocao de versoes antigas
+"""
+
+import argparse
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import sql
+
+from import_csv import AMOSTRA, get_conn, importar
+from run_ddl import DDL_VERSAO_PATH, ler_ddl
+
+logger = logging.getLogger(__name__)
+
+PREFIXO_ESQUEMA = "ans_v"
+# Troca das views: espera no maximo LOCK_TIMEOUT_MS por tentativa, ate TENTATIVAS_TROCA tentativas.
+# Menor que o deadlock_timeout padrao (1s): se uma transacao de leitura ja segura uma view e espera
+# outra que a troca bloqueou, a troca desiste antes de o detector de deadlock abortar a leitura.
+LOCK_TIMEOUT_MS = 500
+TENTATIVAS_TROCA = 15
+CARENCIA_MIN_PADRAO = int(os.environ.get("ANS_PUBLICACAO_CARENCIA_MIN", "60"))
+
+
+def _comandos(script: str) -> list[str]:
+    """Divide o script em comandos (';' no fim da linha, fora de blocos $$), sem os comentarios iniciais."""
+    comandos, atual = [], []
+    for linha in script.splitlines():
+        if not atual and (not linha.strip() or linha.strip().startswith("--")):
+            continue
+        atual.append(linha)
+        if linha.rstrip().endswith(";") and "\n".join(atual).count("$$") % 2 == 0:
+            comandos.append("\n".join(atual).strip())
+            atual = []
+    return comandos
+
+
+def separar_ddl(script: str) -> tuple[list[str], list[str], list[str]]:
+    """
+    (compartilhados, estrutura, indices):
+    - compartilhados: extensoes e funcoes, aplicadas no public;
+    - estrutura: CREATE/ALTER TABLE, aplicados no esquema da versao;
+    - indices: CREATE INDEX, aplicados depois da carga (exceto os que o proprio DDL remove, ex.: cnpj_bigint.sql).
+    DROP e DO sao ignorados: o esquema novo comeca vazio.
+    """
+    compartilhados, estrutura, indices, removidos = [], [], [], set()
+    for cmd in _comandos(script):
+        inicio = " ".join(cmd.split()[:4]).upper()
+        if inicio.startswith(("CREATE EXTENSION", "CREATE FUNCTION", "CREATE OR REPLACE FUNCTION")):
+            compartilhados.append(cmd)
+        elif inicio.startswith("DROP INDEX"):
+            removidos.add(cmd.rstrip(";").split()[-1])
+        elif inicio.startswith(("DROP", "DO")):
+            continue
+        elif inicio.startswith(("CREATE INDEX", "CREATE UNIQUE INDEX")):
+            indices.append(cmd)
+        else:
+            estrutura.append(cmd)
+    indices = [c for c in indices if re.search(r"INDEX\s+(\w+)", c).group(1) not in removidos]
+    return compartilhados, estrutura, indices
+
+
+def tabelas_publicadas(cnpj_bigint: bool = False) -> list[str]:
+    """Tabelas criadas pelo DDL (as que viram views no public)."""
+    _, estrutura, _ = separar_ddl(ler_ddl(cnpj_bigint))
+    return [m.group(1) for c in estrutura for m in [re.match(r"CREATE TABLE\s+(\w+)", c)] if m]
+
+
+def _nova_versao(cur) -> int:
+    """Timestamp AAAAMMDDHHMMSS; sempre maior que a ultima versao registrada."""
+    versao = int(datetime.now().strftime("%Y%m%d%H%M%S"))
+    cur.execute("SELECT COALESCE(MAX(versao), 0) FROM ans_versao_dados")
+    return max(versao, cur.fetchone()[0] + 1)
+
+
+def _esquema_ativo(cur) -> str | None:
+    cur.execute("SELECT esquema FROM ans_versao_dados WHERE substituida_em IS NULL")
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _registrar(conn, esquema: str, versao: int) -> None:
+    """Torna a versao a ativa (a API passa a usa-la na proxima leitura de ans_versao_dados)."""
+    conn.autocommit = False
+    try:
+        cur = conn.cursor()
+        cur.execute("UPDATE ans_versao_dados SET substituida_em = now() WHERE substituida_em IS NULL")
+        cur.execute("INSERT INTO ans_versao_dados (versao, esquema) VALUES (%s, %s)", (versao, esquema))
+        cur.close()
+        conn.commit()
+    finally:
+        conn.rollback()
+        conn.autocommit = True
+
+
+def apontar_views(conn, tabelas: list[str]) -> bool:
+    """
+    Faz public.<tabela> ser uma view sobre o esquema da versao ativa, em uma transacao.
+    Retorna False se nao conseguiu os locks apos TENTATIVAS_TROCA tentativas.
+    """
+    cur = conn.cursor()
+    esquema = _esquema_ativo(cur)
+    if esquema is None:
+        cur.close()
+        return True
+    cur.execute(
+        "SELECT COUNT(*) FROM pg_views WHERE schemaname = 'public' AND viewname = ANY(%s) AND definition LIKE %s",
+        (tabelas, "%" + esquema + ".%"),
+    )
+    if cur.fetchone()[0] == len(tabelas):
+        cur.close()
+        return True
+    conn.autocommit = False
+    try:
+        for tentativa in range(1, TENTATIVAS_TROCA + 1):
+            try:
+                cur.execute("SET LOCAL lock_timeout = %s", (LOCK_TIMEOUT_MS,))
+                for tabela in tabelas:
+                    cur.execute(
+                        """
+                        SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = 'public' AND c.relname = %s
+                        """,
+                        (tabela,),
+                    )
+                    row = cur.fetchone()
+                    publica = sql.Identifier("public", tabela)
+                    # DROP + CREATE em vez de CREATE OR REPLACE VIEW: as colunas podem mudar entre versoes
+                    # (ex.: CNPJ BIGINT); na primeira publicacao public.<tabela> ainda e a tabela do run_ddl.py
+                    if row and row[0] == "v":
+                        cur.execute(sql.SQL("DROP VIEW {}").format(publica))
+                    elif row:
+                        cur.execute(sql.SQL("DROP TABLE {}").format(publica))
+                    cur.execute(sql.SQL("CREATE VIEW {} AS SELECT * FROM {}").format(
+                        publica, sql.Identifier(esquema, tabela)))
+                conn.commit()
+                logger.info("Views do public apontando para %s", esquema)
+                return True
+            except (psycopg2.errors.LockNotAvailable, psycopg2.errors.DeadlockDetected):
+                conn.rollback()
+                espera = min(0.2 * 2 ** tentativa, 10)
+                logger.warning("Troca das views aguardando consultas em andamento (tentativa %d/%d); nova tentativa em %.1fs",
+                               tentativa, TENTATIVAS_TROCA, espera)
+                time.sleep(espera)
+        logger.error("Views do public continuam na versao anterior; rode publicar.py --so-coletar para tentar de novo")
+        return False
+    finally:
+        cur.close()
+        conn.rollback()
+        conn.autocommit = True
+
+
+def coletar(conn, carencia_min: int) -> int:
+    """Remove esquemas de versoes substituidas ha mais de carencia_min minutos e esquemas orfaos de publicacoes que falharam."""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT esquema FROM ans_versao_dados
+        WHERE removida_em IS NULL AND substituida_em < now() - make_interval(mins => %s)
+        UNION ALL
+        SELECT nspname FROM pg_namespace
+        WHERE nspname LIKE %s AND nspname NOT IN (SELECT esquema FROM ans_versao_dados)
+        """,
+        (carencia_min, PREFIXO_ESQUEMA.replace("_", "\\_") + "%"),
+    )
+    removidos = 0
+    for (esquema,) in cur.fetchall():
+        try:
+            cur.execute("SET lock_timeout = %s", (LOCK_TIMEOUT_MS,))
+            cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(esquema)))
+            cur.execute("UPDATE ans_versao_dados SET removida_em = now() WHERE esquema = %s", (esquema,))
+            removidos += 1
+            logger.info("Esquema %s removido", esquema)
+        except psycopg2.errors.LockNotAvailable:
+            logger.warning("Esquema %s ainda em uso; fica para a proxima coleta", esquema)
+        finally:
+            cur.execute("RESET lock_timeout")
+    cur.close()
+    return removidos
+
+
+def publicar(conn, cnpj_bigint: bool, fracao: float = AMOSTRA) -> int:
+    """Carrega uma nova versao em ans_v<versao> e a registra como ativa; retorna a versao."""
+    compartilhados, estrutura, indices = separar_ddl(ler_ddl(cnpj_bigint))
+    tabelas = tabelas_publicadas(cnpj_bigint)
+    cur = conn.cursor()
+    cur.execute("SET search_path TO public")
+    for cmd in compartilhados:
+        cur.execute(cmd)
+    versao = _nova_versao(cur)
+    esquema = PREFIXO_ESQUEMA + str(versao)
+    logger.info("Publicando versao %d no esquema %s", versao, esquema)
+    try:
+        cur.execute(sql.SQL("CREATE SCHEMA {}").format(sql.Identifier(esquema)))
+        # So o esquema novo no search_path: CREATE/ALTER nunca atingem as tabelas publicadas
+        cur.execute(sql.SQL("SET search_path TO {}").format(sql.Identifier(esquema)))
+        for cmd in estrutura:
+            cur.execute(cmd)
+        conn.autocommit = False
+        importar(conn, fracao)
+        conn.autocommit = True
+        inicio = time.perf_counter()
+        # public no search_path para os operadores do pg_trgm e f_unaccent nos indices de expressao
+        cur.execute(sql.SQL("SET search_path TO {}, public").format(sql.Identifier(esquema)))
+        for cmd in indices:
+            cur.execute(cmd)
+        cur.execute(sql.SQL("ANALYZE {}").format(sql.SQL(", ").join(sql.Identifier(esquema, t) for t in tabelas)))
+        logger.info("%d indices criados e ANALYZE em %.1fs", len(indices), time.perf_counter() - inicio)
+        cur.execute("SET search_path TO public")
+        _registrar(conn, esquema, versao)
+    except BaseException:
+        conn.rollback()
+        conn.autocommit = True
+        cur.execute("SET search_path TO public")
+        cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE").format(sql.Identifier(esquema)))
+        raise
+    finally:
+        cur.close()
+    logger.info("Versao %d ativa", versao)
+    return versao
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publica uma nova versao dos dados sem indisponibilidade para a API")
+    parser.add_argument("--cnpj-bigint", action="store_true", default=os.environ.get("ANS_CNPJ_INT", "0") == "1",
+                        help="CNPJ como BIGINT em vez de VARCHAR(14)")
+    parser.add_argument("--carencia-min", type=int, default=CARENCIA_MIN_PADRAO,
+                        help="Minutos que uma versao substituida e mantida antes de ser removida (padrao: %(default)s)")
+    parser.add_argument("--so-coletar", action="store_true", help="Nao publica; apenas views + remocao de versoes antigas")
+    parser.add_argument("--sample", type=float, default=AMOSTRA, metavar="FRACAO",
+                        help="Publica so uma fracao (0-1) das operadoras, por hash do REG_ANS (padrao: ANS_AMOSTRA)")
+    args = parser.parse_args()
+    conn = get_conn()
+    conn.autocommit = True
+    try:
+        cur = conn.cursor()
+        # Uma publicacao por vez (a coleta de esquemas orfaos depende disso)
+        cur.execute("SELECT pg_try_advisory_lock(hashtext('ans_publicacao'))")
+        if not cur.fetchone()[0]:
+            raise SystemExit("Outra publicacao esta em andamento.")
+        with open(DDL_VERSAO_PATH, "r", encoding="utf-8") as f:
+            cur.execute(f.read())
+        cur.close()
+        if not args.so_coletar:
+            publicar(conn, args.cnpj_bigint, args.sample)
+        # DROP SCHEMA ... CASCADE levaria junto views que ainda apontem para a versao antiga
+        if apontar_views(conn, tabelas_publicadas(args.cnpj_bigint)):
+            logger.info("Coleta: %d esquemas removidos", coletar(conn, args.carencia_min))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
-"""Aplica o DDL (schema.sql) no banco. Execute apos subir o Docker e antes de import_csv.py."""
+"""
+Aplica o DDL (schema.sql) no banco. Execute apos subir o Docker e antes de import_csv.py.
+Com --cnpj-bigint (ou ANS_CNPJ_INT=1), aplica em seguida ddl/cnpj_bigint.sql (CNPJ como BIGINT).
+Recria as tabelas no esquema public: se houver uma versao publicada por publicar.py, ela deixa de ser a ativa.
+"""
 
+import argparse
 import os
 from pathlib import Path
 
@@ -12,11 +17,28 @@ except ImportError:
     pass
 
 DDL_PATH = Path(__file__).resolve().parent / "ddl" / "schema.sql"
+DDL_CNPJ_BIGINT_PATH = Path(__file__).resolve().parent / "ddl" / "cnpj_bigint.sql"
+DDL_VERSAO_PATH = Path(__file__).resolve().parent / "ddl" / "versao_dados.sql"
 
 
-def main():
+def ler_ddl(cnpj_bigint: bool) -> str:
+    """schema.sql (+ cnpj_bigint.sql) como um unico script."""
     with open(DDL_PATH, "r", encoding="utf-8") as f:
         ddl = f.read()
+    if cnpj_bigint:
+        with open(DDL_CNPJ_BIGINT_PATH, "r", encoding="utf-8") as f:
+            ddl += "\n" + f.read()
+    return ddl
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica o DDL do Teste 3")
+    parser.add_argument("--cnpj-bigint", action="store_true", default=os.environ.get("ANS_CNPJ_INT", "0") == "1",
+                        help="CNPJ como BIGINT em vez de VARCHAR(14)")
+    args = parser.parse_args()
+    ddl = ler_ddl(args.cnpj_bigint)
+    with open(DDL_VERSAO_PATH, "r", encoding="utf-8") as f:
+        ddl += "\n" + f.read()
     conn = psycopg2.connect(
         host=os.environ.get("POSTGRES_HOST", "localhost"),
         port=os.environ.get("POSTGRES_PORT", "5432"),
@@ -27,9 +49,11 @@ def main():
     conn.autocommit = True
     cur = conn.cursor()
     cur.execute(ddl)
+    # Tabelas do public voltam a ser a fonte: nenhuma versao publicada fica ativa
+    cur.execute("UPDATE ans_versao_dados SET substituida_em = now() WHERE substituida_em IS NULL")
     cur.close()
     conn.close()
-    print("DDL aplicado com sucesso.")
+    print("DDL aplicado com sucesso%s." % (" (CNPJ BIGINT)" if args.cnpj_bigint else ""))
 
 
 if __name__ == "__main__":
@@ -1,10 +1,27 @@
-"""Executa as queries analiticas e imprime os resultados (Teste 3.4)."""
+"""
+Executa as queries analiticas e imprime os resultados (Teste 3.4).
 
+Modo relatorio: queries independentes em paralelo (pool de conexoes), tempo de parede por query e,
+com --explain, planos EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). Gera JSON e compara com um baseline,
+sinalizando regressoes de tempo, seq scans novos e spills para disco.
+
+Exemplos:
+    python run_queries.py
+    python run_queries.py --paralelo 3 --explain --relatorio relatorio.json
+    python run_queries.py --paralelo 3 --explain --baseline baseline.json
+"""
+
+import argparse
+import json
 import os
 import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
-import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 
 try:
     from dotenv import load_dotenv
@@ -14,25 +31,27 @@ except ImportError:
 
 QUERIES_DIR = Path(__file__).resolve().parent / "queries"
 
+DB = {
+    "host": os.environ.get("POSTGRES_HOST", "localhost"),
+    "port": os.environ.get("POSTGRES_PORT", "5432"),
+    "user": os.environ.get("POSTGRES_USER", "ans_user"),
+    "password": os.environ.get("POSTGRES_PASSWORD", "ans_pass"),
+    "dbname": os.environ.get("POSTGRES_DB", "ans_db"),
+}
 
-def get_conn():
-    return psycopg2.connect(
-        host=os.environ.get("POSTGRES_HOST", "localhost"),
-        port=os.environ.get("POSTGRES_PORT", "5432"),
-        user=os.environ.get("POSTGRES_USER", "ans_user"),
-        password=os.environ.get("POSTGRES_PASSWORD", "ans_pass"),
-        dbname=os.environ.get("POSTGRES_DB", "ans_db"),
-    )
+# Regressao de tempo: mais lento que baseline * (1 + tolerancia) e pelo menos MIN_DELTA_MS a mais
+TOLERANCIA_PADRAO = 0.25
+MIN_DELTA_MS = 5.0
 
 
-def main():
-    conn = get_conn()
+def carregar_queries() -> list[tuple[int, str, str]]:
+    """Retorna (numero, titulo, sql) de cada query de analiticas.sql."""
     path = QUERIES_DIR / "analiticas.sql"
     with open(path, "r", encoding="utf-8") as f:
         content = f.read()
     # Separa por ";" seguido de newline e comentario "Query" (cada bloco e uma query completa)
     blocks = re.split(r';\s*\n(?=\s*--\s*Query)', content)
-    cur = conn.cursor()
+    queries = []
     for i, block in enumerate(blocks):
         block = block.strip()
         if not block:
@@ -41,20 +60,165 @@ def main():
         if block.startswith("--") and "WITH" not in block and "SELECT" not in block:
             continue
         stmt = block if block.rstrip().endswith(";") else block + ";"
-        try:
-            cur.execute(stmt)
-            rows = cur.fetchall()
-            if rows:
-                colnames = [d[0] for d in cur.description]
-                print("--- Query %d ---" % (i + 1))
-                print(" | ".join(colnames))
-                for row in rows:
-                    print(" | ".join(str(x) for x in row))
-                print()
-        except Exception as e:
-            print("Erro na query %d: %s" % (i + 1, e))
-    cur.close()
-    conn.close()
+        m = re.search(r"--\s*(Query\s*\d+[^\n]*)", block)
+        queries.append((i + 1, m.group(1).strip() if m else "Query %d" % (i + 1), stmt))
+    return queries
+
+
+def _resumo_plano(plano: dict) -> dict:
+    """Extrai do plano JSON: tipos de no, seq scans por tabela, spills para disco e buffers."""
+    tipos, seq_scans, spills = set(), set(), []
+    buffers = {"shared_hit": 0, "shared_read": 0, "temp_written": 0}
+
+    def visitar(no: dict):
+        tipo = no.get("Node Type", "")
+        tipos.add(tipo)
+        if tipo == "Seq Scan":
+            seq_scans.add(no.get("Relation Name", "?"))
+        if no.get("Sort Space Type") == "Disk":
+            spills.append("Sort (%s kB em disco)" % no.get("Sort Space Used"))
+        if no.get("Hash Batches", 1) > 1:
+            spills.append("Hash (%d batches)" % no["Hash Batches"])
+        for sub in no.get("Plans", []):
+            visitar(sub)
+
+    raiz = plano["Plan"]
+    visitar(raiz)
+    # Buffers do no raiz ja incluem os filhos
+    buffers["shared_hit"] = raiz.get("Shared Hit Blocks", 0)
+    buffers["shared_read"] = raiz.get("Shared Read Blocks", 0)
+    buffers["temp_written"] = raiz.get("Temp Written Blocks", 0)
+    if buffers["temp_written"] and not spills:
+        spills.append("Temp (%d blocos escritos)" % buffers["temp_written"])
+    return {
+        "tempo_planejamento_ms": plano.get("Planning Time"),
+        "tempo_execucao_ms": plano.get("Execution Time"),
+        "tipos_no": sorted(tipos),
+        "seq_scans": sorted(seq_scans),
+        "spills": spills,
+        "buffers": buffers,
+    }
+
+
+def executar_query(pool: ThreadedConnectionPool, numero: int, titulo: str, sql: str, explain: bool) -> dict:
+    conn = pool.getconn()
+    try:
+        cur = conn.cursor()
+        t0 = time.perf_counter()
+        cur.execute(sql)
+        rows = cur.fetchall()
+        tempo_ms = (time.perf_counter() - t0) * 1000
+        res = {
+            "numero": numero,
+            "titulo": titulo,
+            "tempo_ms": round(tempo_ms, 2),
+            "linhas": len(rows),
+            "colunas": [d[0] for d in cur.description] if cur.description else [],
+            "resultado": rows,
+        }
+        if explain:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+            plano = cur.fetchone()[0][0]
+            res["plano"] = _resumo_plano(plano)
+            res["plano"]["completo"] = plano
+        cur.close()
+        conn.rollback()
+        return res
+    except Exception as e:
+        conn.rollback()
+        return {"numero": numero, "titulo": titulo, "erro": str(e)}
+    finally:
+        pool.putconn(conn)
+
+
+def comparar_baseline(atual: list[dict], baseline: list[dict], tolerancia: float) -> list[str]:
+    """Lista regressoes: tempo acima da tolerancia, seq scans novos, spills novos, query que passou a falhar."""
+    base = {q["numero"]: q for q in baseline}
+    alertas = []
+    for q in atual:
+        b = base.get(q["numero"])
+        if b is None:
+            continue
+        nome = "Query %d" % q["numero"]
+        if "erro" in q:
+            if "erro" not in b:
+                alertas.append("%s: passou a falhar (%s)" % (nome, q["erro"]))
+            continue
+        if "tempo_ms" in b:
+            delta = q["tempo_ms"] - b["tempo_ms"]
+            if q["tempo_ms"] > b["tempo_ms"] * (1 + tolerancia) and delta >= MIN_DELTA_MS:
+                alertas.append("%s: tempo %.1fms -> %.1fms (%+.0f%%)" % (nome, b["tempo_ms"], q["tempo_ms"], 100.0 * delta / max(b["tempo_ms"], 0.01)))
+        pa, pb = q.get("plano"), b.get("plano")
+        if pa and pb:
+            novos_seq = sorted(set(pa["seq_scans"]) - set(pb["seq_scans"]))
+            if novos_seq:
+                alertas.append("%s: seq scan novo em %s" % (nome, ", ".join(novos_seq)))
+            if pa["spills"] and not pb["spills"]:
+                alertas.append("%s: spill para disco: %s" % (nome, "; ".join(pa["spills"])))
+            sumiram = sorted(set(pb["tipos_no"]) - set(pa["tipos_no"]))
+            if sumiram:
+                alertas.append("%s: plano mudou (sem %s)" % (nome, ", ".join(sumiram)))
+    return alertas
+
+
+def _imprimir(res: dict):
+    if "erro" in res:
+        print("Erro na query %d: %s" % (res["numero"], res["erro"]))
+        return
+    if res["resultado"]:
+        print("--- Query %d --- (%.1f ms)" % (res["numero"], res["tempo_ms"]))
+        print(" | ".join(res["colunas"]))
+        for row in res["resultado"]:
+            print(" | ".join(str(x) for x in row))
+        if "plano" in res:
+            p = res["plano"]
+            print("plano: execucao %.1f ms; seq scans: %s; spills: %s" % (
+                p["tempo_execucao_ms"] or 0, ", ".join(p["seq_scans"]) or "-", "; ".join(p["spills"]) or "-"))
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queries analiticas (Teste 3.4)")
+    parser.add_argument("--paralelo", type=int, default=1, help="Conexoes/queries simultaneas (padrao: 1, serial)")
+    parser.add_argument("--explain", action="store_true", help="Coleta EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON)")
+    parser.add_argument("--relatorio", type=Path, help="Grava relatorio JSON com tempos (e planos)")
+    parser.add_argument("--baseline", type=Path, help="Relatorio JSON anterior para detectar regressoes")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO, help="Regressao de tempo aceita (fracao)")
+    args = parser.parse_args()
+
+    queries = carregar_queries()
+    workers = max(1, min(args.paralelo, len(queries)))
+    pool = ThreadedConnectionPool(1, workers, **DB)
+    try:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            resultados = list(ex.map(lambda q: executar_query(pool, *q, args.explain), queries))
+        total_ms = (time.perf_counter() - t0) * 1000
+    finally:
+        pool.closeall()
+
+    for res in resultados:
+        _imprimir(res)
+    print("Tempo total: %.1f ms (%d conexoes)" % (total_ms, workers))
+
+    relatorio = {
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+        "paralelo": workers,
+        "tempo_total_ms": round(total_ms, 2),
+        "queries": [{k: v for k, v in r.items() if k != "resultado"} for r in resultados],
+    }
+    if args.relatorio:
+        args.relatorio.write_text(json.dumps(relatorio, indent=2, default=str), encoding="utf-8")
+        print("Relatorio salvo: %s" % args.relatorio)
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        alertas = comparar_baseline(relatorio["queries"], baseline.get("queries", []), args.tolerancia)
+        if alertas:
+            print("Regressoes em relacao a %s:" % args.baseline)
+            for a in alertas:
+                print("  - " + a)
+            sys.exit(1)
+        print("Sem regressoes em relacao a %s." % args.baseline)
 
 
 if __name__ == "__main__":
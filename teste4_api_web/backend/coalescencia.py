@@ -0,0 +1,108 @@
+"""
+Coalescencia de requisicoes identicas (single-flight) para os endpoints caros.
+Requisicoes concorrentes com a mesma chave (rota + parametros + versao dos dados) compartilham uma
+unica execucao: a primeira (lider) consulta o banco, as demais esperam o resultado ate o timeout da
+chave. Com ttl > 0 o resultado fica em cache por ttl segundos e, passada a fracao RENOVAR_FRACAO do
+ttl, e renovado em segundo plano (refresh-ahead): quem chega continua recebendo o valor em cache
+enquanto uma unica renovacao roda. Handlers sincronos rodam no threadpool: a espera e um threading.Event.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metricas import COALESCENCIA, RENOVACOES
+
+logger = logging.getLogger(__name__)
+
+RENOVAR_FRACAO = 0.8
+MAX_CACHE = 1024
+
+
+class _Voo:
+    __slots__ = ("evento", "resultado", "erro")
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+
+
+class Coalescedor:
+    def __init__(self, max_renovacoes: int = 2, max_cache: int = MAX_CACHE):
+        self.lock = threading.Lock()
+        self.voos: dict[tuple, _Voo] = {}
+        # chave -> (resultado, criado_em); ordem de insercao para descartar as mais antigas
+        self.cache: OrderedDict[tuple, tuple] = OrderedDict()
+        self.max_cache = max_cache
+        self.renovador = ThreadPoolExecutor(max_workers=max_renovacoes, thread_name_prefix="renovacao")
+
+    def obter(self, rota: str, chave: tuple, funcao, timeout: float, ttl: float = 0.0):
+        """
+        Resultado de funcao() para a chave, executando no maximo uma vez por chave ao mesmo tempo.
+        Levanta TimeoutError se a execucao em andamento nao terminar em `timeout` segundos; excecoes
+        da execucao chegam a todas as requisicoes que a aguardavam.
+        """
+        if ttl > 0:
+            with self.lock:
+                item = self.cache.get(chave)
+            if item is not None:
+                idade = time.monotonic() - item[1]
+                if idade < ttl:
+                    if idade >= ttl * RENOVAR_FRACAO:
+                        self._renovar(rota, chave, funcao, ttl)
+                    COALESCENCIA.inc(rota, "cache")
+                    return item[0]
+        with self.lock:
+            voo = self.voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self.voos[chave] = _Voo()
+        if lider:
+            COALESCENCIA.inc(rota, "lider")
+            return self._executar(chave, voo, funcao, ttl)
+        COALESCENCIA.inc(rota, "coalescida")
+        if not voo.evento.wait(timeout):
+            COALESCENCIA.inc(rota, "timeout")
+            raise TimeoutError("Execucao de %s em andamento ha mais de %.1fs" % (rota, timeout))
+        if voo.erro is not None:
+            raise voo.erro
+        return voo.resultado
+
+    def _executar(self, chave: tuple, voo: _Voo, funcao, ttl: float):
+        try:
+            voo.resultado = funcao()
+            if ttl > 0:
+                with self.lock:
+                    self.cache[chave] = (voo.resultado, time.monotonic())
+                    self.cache.move_to_end(chave)
+                    while len(self.cache) > self.max_cache:
+                        self.cache.popitem(last=False)
+            return voo.resultado
+        except BaseException as e:
+            voo.erro = e
+            raise
+        finally:
+            with self.lock:
+                self.voos.pop(chave, None)
+            voo.evento.set()
+
+    def _renovar(self, rota: str, chave: tuple, funcao, ttl: float) -> None:
+        """Agenda uma renovacao em segundo plano, a menos que ja haja execucao em andamento para a chave."""
+        with self.lock:
+            if chave in self.voos:
+                return
+            voo = self.voos[chave] = _Voo()
+
+        def renovar():
+            try:
+                self._executar(chave, voo, funcao, ttl)
+                RENOVACOES.inc(rota, "ok")
+            except Exception:
+                # O valor em cache continua valendo ate o fim do ttl; a proxima leitura tenta de novo
+                RENOVACOES.inc(rota, "erro")
+                logger.exception("Falha na renovacao antecipada de %s", rota)
+
+        self.renovador.submit(renovar)
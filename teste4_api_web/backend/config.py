@@ -14,3 +14,65 @@ DB = {
     "password": os.environ.get("POSTGRES_PASSWORD", "ans_pass"),
     "dbname": os.environ.get("POSTGRES_DB", "ans_db"),
 }
+
+# Limite de CNPJs por chamada em /api/operadoras/lote
+LOTE_MAX_CNPJS = int(os.environ.get("API_LOTE_MAX_CNPJS", "500"))
+
+# Decimal (NUMERIC) no JSON: "float" (padrao, numero) ou "str" (precisao exata, como string)
+DECIMAL_JSON = os.environ.get("API_DECIMAL_JSON", "float")
+
+# Respostas menores que isso nao sao comprimidas (gzip; brotli se brotli-asgi estiver instalado)
+COMPRESSAO_MIN_BYTES = int(os.environ.get("API_COMPRESSAO_MIN_BYTES", "1024"))
+
+# Origem dos dados: "postgres" (padrao) ou "snapshot" (arquivo publicado por snapshot.py, mapeado em memoria)
+BACKEND = os.environ.get("API_BACKEND", "postgres")
+SNAPSHOT_PATH = os.environ.get(
+    "API_SNAPSHOT_PATH", str(Path(__file__).resolve().parent.parent.parent / "data" / "api_snapshot.bin")
+)
+
+# Tabelas criadas com CNPJ BIGINT (run_ddl.py --cnpj-bigint): parametros inteiros, saida com 14 digitos
+CNPJ_BIGINT = os.environ.get("ANS_CNPJ_INT", "0") == "1"
+
+# Publicacao versionada (teste3_banco/publicar.py): intervalo para reler a versao ativa dos dados.
+# As conexoes usam search_path = esquema da versao ativa; sem versao publicada, o public.
+VERSAO_TTL_S = float(os.environ.get("API_VERSAO_TTL_S", "1"))
+
+# Coalescencia (single-flight) de /api/estatisticas e /api/operadoras: requisicoes identicas simultaneas
+# compartilham uma consulta. A espera maxima por uma execucao em andamento (depois, 503) e por endpoint,
+# derivada do orcamento (COALESCENCIA_TIMEOUTS_S, abaixo); TIMEOUT_S vale para endpoint sem orcamento (0).
+# CACHE_TTL_S > 0 guarda o resultado e o renova em segundo plano antes de expirar (0 = sem cache).
+COALESCENCIA = os.environ.get("API_COALESCENCIA", "1") == "1"
+COALESCENCIA_TIMEOUT_S = float(os.environ.get("API_COALESCENCIA_TIMEOUT_S", "10"))
+COALESCENCIA_MARGEM_S = float(os.environ.get("API_COALESCENCIA_MARGEM_S", "1"))
+CACHE_TTL_S = float(os.environ.get("API_CACHE_TTL_S", "0"))
+
+# Conexoes ociosas mantidas para reuso (com search_path e statements preparados); 0 = uma conexao por requisicao
+POOL_OCIOSAS = int(os.environ.get("API_POOL_OCIOSAS", "10"))
+
+# Orcamento (statement_timeout, ms) de cada consulta por endpoint; estourado, a API responde 503 com Retry-After.
+# Sobrescreva com API_ORCAMENTOS_MS="estatisticas=5000,busca=1500"; 0 = sem limite.
+ORCAMENTOS_MS = {"listagem": 2000, "busca": 3000, "detalhe": 500, "lote": 2000, "estatisticas": 3000}
+
+
+def _ler_orcamentos(texto: str) -> dict:
+    """API_ORCAMENTOS_MS -> {endpoint: ms}; entrada mal escrita (busca:1500, busca=1.5s, bsuca=1500) e erro."""
+    orcamentos = {}
+    for item in filter(None, (i.strip() for i in texto.split(","))):
+        endpoint, igual, ms = (p.strip() for p in item.partition("="))
+        if not igual or endpoint not in ORCAMENTOS_MS or not (ms.isascii() and ms.isdigit()):
+            raise ValueError("API_ORCAMENTOS_MS invalido: %r (use endpoint=ms inteiro; endpoints: %s)"
+                             % (item, ", ".join(ORCAMENTOS_MS)))
+        orcamentos[endpoint] = int(ms)
+    return orcamentos
+
+
+ORCAMENTOS_MS.update(_ler_orcamentos(os.environ.get("API_ORCAMENTOS_MS", "")))
+
+# Espera da coalescencia por endpoint coalescido: o lider faz as consultas em serie, cada uma no orcamento do
+# endpoint, mais a margem (conexao, JSON). Com os padroes: listagem 5 s, busca 7 s, estatisticas 10 s.
+CONSULTAS_POR_REQUISICAO = {"listagem": 2, "busca": 2, "estatisticas": 3}
+COALESCENCIA_TIMEOUTS_S = {
+    endpoint: n * ms / 1000 + COALESCENCIA_MARGEM_S if ms else COALESCENCIA_TIMEOUT_S
+    for endpoint, n in CONSULTAS_POR_REQUISICAO.items()
+    for ms in [ORCAMENTOS_MS[endpoint]]
+}
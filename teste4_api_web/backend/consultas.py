@@ -0,0 +1,105 @@
+"""
+Registro dos statements do caminho quente da API, com o endpoint a que pertencem.
+Cada conexao do pool prepara o statement (PREPARE) no primeiro uso e depois so o executa (EXECUTE):
+parse e planejamento deixam de acontecer a cada requisicao. Toda execucao roda com o statement_timeout
+do endpoint (ORCAMENTOS_MS, via SET LOCAL no mesmo envio, sem ida e volta extra); estourado, levanta
+OrcamentoExcedido (503 na API) e conta em api_db_orcamento_excedido_total.
+A busca por texto nao e preparada: com plano generico o LIKE parametrizado nao usa o indice de prefixo.
+"""
+
+import psycopg2.errors
+
+from config import ORCAMENTOS_MS
+from metricas import ORCAMENTO_EXCEDIDO
+
+# nome -> (endpoint, SQL com parametros $n)
+CONSULTAS = {
+    "listar_total": ("listagem", "SELECT COUNT(DISTINCT cnpj) AS total FROM despesas_consolidado"),
+    "listar_pagina": ("listagem", """
+        SELECT cnpj, MAX(razao_social) AS razao_social,
+               SUM(valor_despesas) AS valor_total
+        FROM despesas_consolidado
+        GROUP BY cnpj
+        ORDER BY valor_total DESC
+        LIMIT $1 OFFSET $2
+    """),
+    "lote_cadastro": ("lote", "SELECT registro_ans, cnpj, razao_social, modalidade, uf FROM operadoras WHERE cnpj = ANY($1)"),
+    "lote_sem_cadastro": ("lote", """
+        SELECT cnpj, MAX(razao_social) AS razao_social
+        FROM despesas_consolidado WHERE cnpj = ANY($1) GROUP BY cnpj
+    """),
+    "lote_despesas": ("lote", """
+        SELECT cnpj, trimestre, ano, valor_despesas
+        FROM despesas_consolidado
+        WHERE cnpj = ANY($1)
+        ORDER BY cnpj, ano, trimestre
+    """),
+    "detalhe_cadastro": ("detalhe", "SELECT registro_ans, cnpj, razao_social, modalidade, uf FROM operadoras WHERE cnpj = $1"),
+    "detalhe_consolidado": ("detalhe", """
+        SELECT cnpj, MAX(razao_social) AS razao_social
+        FROM despesas_consolidado WHERE cnpj = $1 GROUP BY cnpj
+    """),
+    "despesas_operadora": ("detalhe", """
+        SELECT trimestre, ano, valor_despesas
+        FROM despesas_consolidado
+        WHERE cnpj = $1
+        ORDER BY ano, trimestre
+    """),
+    "estatisticas_totais": ("estatisticas", """
+        SELECT
+            COALESCE(SUM(valor_total), 0) AS total_despesas,
+            COALESCE(AVG(valor_total), 0) AS media_despesas
+        FROM despesas_agregadas
+    """),
+    "estatisticas_top5": ("estatisticas", """
+        SELECT razao_social, uf, valor_total
+        FROM despesas_agregadas
+        ORDER BY valor_total DESC
+        LIMIT 5
+    """),
+    "estatisticas_por_uf": ("estatisticas", """
+        SELECT uf, SUM(valor_total) AS total
+        FROM despesas_agregadas
+        WHERE uf IS NOT NULL AND uf <> ''
+        GROUP BY uf
+        ORDER BY total DESC
+    """),
+}
+
+
+class OrcamentoExcedido(Exception):
+    """Consulta cancelada pelo statement_timeout do endpoint."""
+
+    def __init__(self, nome: str, endpoint: str):
+        super().__init__("Consulta %s excedeu o orcamento do endpoint %s" % (nome, endpoint))
+        self.nome = nome
+        self.endpoint = endpoint
+
+
+def executar(cur, nome: str, params: tuple = ()) -> None:
+    """EXECUTE do statement registrado `nome`, preparando-o na conexao do cursor se ainda nao estiver."""
+    endpoint, texto = CONSULTAS[nome]
+    conn = cur.connection
+    if nome not in conn.preparadas:
+        cur.execute("PREPARE %s AS %s" % (nome, texto), nome="prepare")
+        # PREPARE nao e desfeito por rollback: vale ate a conexao fechar
+        conn.preparadas.add(nome)
+    chamada = "EXECUTE " + nome
+    if params:
+        chamada += "(" + ", ".join(["%s"] * len(params)) + ")"
+    _com_orcamento(cur, nome, endpoint, chamada, params or None)
+
+
+def executar_sql(cur, nome: str, endpoint: str, texto: str, params=None) -> None:
+    """SQL montado na hora (nao preparado), com o mesmo orcamento e rotulo de metricas."""
+    _com_orcamento(cur, nome, endpoint, texto, params)
+
+
+def _com_orcamento(cur, nome: str, endpoint: str, texto: str, params) -> None:
+    # SET LOCAL vale so para a transacao da requisicao; a conexao volta ao pool sem limite residual
+    limite = "SET LOCAL statement_timeout = %d; " % ORCAMENTOS_MS.get(endpoint, 0)
+    try:
+        cur.execute(limite + texto, params, nome=nome)
+    except psycopg2.errors.QueryCanceled:
+        ORCAMENTO_EXCEDIDO.inc(nome, endpoint)
+        raise OrcamentoExcedido(nome, endpoint) from None
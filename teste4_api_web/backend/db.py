@@ -1,7 +1,177 @@
+import select
+import threading
+import time
+
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from config import DB
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2 import sql
+
+from config import DB, POOL_OCIOSAS, VERSAO_TTL_S
+from metricas import DB_AQUISICAO, DB_CONEXAO_ERROS, DB_CONEXOES, DB_CONSULTA, DB_DESCARTADAS, DB_ERROS
+
+
+class CursorMedido(psycopg2.extensions.cursor):
+    """Cursor que mede cada execute; `nome` rotula a consulta nas metricas (padrao: nome do cursor nomeado)."""
+
+    def execute(self, query, vars=None, nome: str | None = None):
+        nome = nome or self.name or "sem_nome"
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except Exception:
+            DB_ERROS.inc(nome)
+            raise
+        finally:
+            DB_CONSULTA.observar(time.perf_counter() - inicio, nome)
+
+
+class ConexaoMedida(psycopg2.extensions.connection):
+    """
+    Conexao contada no gauge de conexoes abertas enquanto nao for fechada.
+    Guarda o esquema do search_path e os statements ja preparados (consultas.py), que sobrevivem no pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.esquema = None
+        self.preparadas: set[str] = set()
+        self._contada = True
+        DB_CONEXOES.inc()
+
+    def close(self):
+        if getattr(self, "_contada", False):
+            self._contada = False
+            DB_CONEXOES.dec()
+        super().close()
+
+
+# Versao publicada ativa (ans_versao_dados), relida no maximo a cada VERSAO_TTL_S por processo.
+# Corridas entre threads sao inofensivas: no pior caso duas releem a versao ao mesmo tempo.
+_ativa = {"versao": None, "esquema": None, "verificada_em": float("-inf")}
+
+
+def versao_dados() -> int | None:
+    """Versao dos dados em uso (None sem publicacao versionada); caches podem usa-la na chave."""
+    return _ativa["versao"]
+
+
+def _search_path(esquema: str | None):
+    return sql.SQL("SET search_path TO {}, public").format(sql.Identifier(esquema)) if esquema else sql.SQL("RESET search_path")
+
+
+def _verificar_versao(conn) -> None:
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT versao, esquema FROM ans_versao_dados WHERE substituida_em IS NULL", nome="versao_dados")
+        row = cur.fetchone()
+    except psycopg2.errors.UndefinedTable:
+        # Banco criado antes da publicacao versionada
+        row = None
+    conn.rollback()
+    cur.close()
+    if row is None:
+        row = (None, None)
+    _ativa.update(versao=row[0], esquema=row[1], verificada_em=time.monotonic())
+
+
+def _ajustar_esquema(conn) -> None:
+    """Aponta o search_path da conexao para a versao ativa (statements preparados sao replanejados pelo servidor)."""
+    esquema = _ativa["esquema"]
+    if conn.esquema != esquema:
+        cur = conn.cursor()
+        cur.execute(_search_path(esquema))
+        conn.commit()
+        cur.close()
+        conn.esquema = esquema
+
+
+def _abrir():
+    esquema = _ativa["esquema"]
+    # search_path na abertura da conexao: sem ida e volta extra por requisicao
+    opcoes = {"options": "-c search_path=%s,public" % esquema} if esquema else {}
+    conn = psycopg2.connect(**DB, **opcoes, connection_factory=ConexaoMedida, cursor_factory=CursorMedido)
+    conn.esquema = esquema
+    return conn
+
+
+# Conexoes ociosas para reuso (LIFO: as mais recentes ficam quentes). Nao ha limite de conexoes em uso:
+# quem limita e o threadpool dos handlers; acima de POOL_OCIOSAS, conexoes devolvidas sao fechadas.
+_ociosas: list = []
+_ociosas_lock = threading.Lock()
+
+
+def _viva(conn) -> bool:
+    """
+    Teste sem ida e volta: conexao ociosa nao tem nada a ler. Se o socket esta legivel, o servidor mandou o
+    FATAL de encerramento (restart, pg_terminate_backend) ou fechou a conexao.
+    """
+    if conn.closed:
+        return False
+    try:
+        return not select.select([conn], [], [], 0)[0]
+    except (OSError, ValueError):
+        return False
+
+
+def _da_fila():
+    """Conexao ociosa viva mais recente (ou None); as mortas sao fechadas no caminho (apos um restart, todas)."""
+    while True:
+        with _ociosas_lock:
+            if not _ociosas:
+                return None
+            conn = _ociosas.pop()
+        if _viva(conn):
+            return conn
+        conn.close()
+        DB_DESCARTADAS.inc()
+
+
+def _preparar(conn) -> None:
+    if time.monotonic() - _ativa["verificada_em"] >= VERSAO_TTL_S:
+        _verificar_versao(conn)
+    _ajustar_esquema(conn)
 
 
 def get_conn():
-    return psycopg2.connect(**DB, cursor_factory=RealDictCursor)
+    """Conexao do pool (ou nova) no search_path da versao ativa; devolva com liberar_conn."""
+    # Cursor padrao (tuplas): handlers mapeiam colunas direto para a saida (resposta.linhas)
+    inicio = time.perf_counter()
+    conn = _da_fila()
+    if conn is not None:
+        try:
+            _preparar(conn)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Caiu depois do teste de vida: descarta e tenta uma vez com conexao nova
+            conn.close()
+            DB_DESCARTADAS.inc()
+            conn = None
+        except Exception:
+            conn.close()
+            DB_CONEXAO_ERROS.inc()
+            raise
+    if conn is None:
+        try:
+            conn = _abrir()
+            _preparar(conn)
+        except Exception:
+            if conn is not None:
+                conn.close()
+            DB_CONEXAO_ERROS.inc()
+            raise
+    DB_AQUISICAO.observar(time.perf_counter() - inicio)
+    return conn
+
+
+def liberar_conn(conn) -> None:
+    """Encerra a transacao e devolve a conexao ao pool; fecha se ela estiver quebrada ou o pool cheio."""
+    if not conn.closed:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            conn.close()
+    with _ociosas_lock:
+        if not conn.closed and len(_ociosas) < POOL_OCIOSAS:
+            _ociosas.append(conn)
+            return
+    conn.close()
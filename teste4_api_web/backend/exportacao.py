@@ -0,0 +1,99 @@
+"""
+Exportacao em streaming (CSV ou NDJSON, opcionalmente gzip) das tabelas de despesas.
+Cursor nomeado (server-side) com itersize: memoria constante e primeiro byte enviado antes do primeiro FETCH.
+"""
+
+import csv
+import io
+import zlib
+from itertools import islice
+
+from config import CNPJ_BIGINT
+from db import get_conn, liberar_conn
+from resposta import dumps
+
+ITERSIZE = 5000
+
+COLUNAS_CONSOLIDADO = ["cnpj", "razao_social", "trimestre", "ano", "valor_despesas"]
+COLUNAS_AGREGADAS = ["razao_social", "uf", "valor_total", "media_por_trimestre", "desvio_padrao_despesas"]
+
+
+def sql_consolidado(ano: int | None, trimestre: int | None, uf: str | None) -> tuple[str, list]:
+    """SELECT de despesas_consolidado com filtros opcionais (uf via cadastro de operadoras)."""
+    filtros, params = [], []
+    if ano is not None:
+        filtros.append("d.ano = %s")
+        params.append(ano)
+    if trimestre is not None:
+        filtros.append("d.trimestre = %s")
+        params.append(trimestre)
+    if uf:
+        filtros.append("d.cnpj IN (SELECT cnpj FROM operadoras WHERE uf = %s)")
+        params.append(uf.upper())
+    colunas = ["d." + c for c in COLUNAS_CONSOLIDADO]
+    if CNPJ_BIGINT:
+        colunas[0] = "lpad(d.cnpj::text, 14, '0') AS cnpj"
+    sql = "SELECT " + ", ".join(colunas) + " FROM despesas_consolidado d"
+    if filtros:
+        sql += " WHERE " + " AND ".join(filtros)
+    return sql + " ORDER BY d.ano, d.trimestre, d.cnpj", params
+
+
+def sql_agregadas(uf: str | None) -> tuple[str, list]:
+    """SELECT de despesas_agregadas (sem ano/trimestre: a tabela ja agrega o periodo)."""
+    sql = "SELECT " + ", ".join(COLUNAS_AGREGADAS) + " FROM despesas_agregadas"
+    params = []
+    if uf:
+        sql += " WHERE uf = %s"
+        params.append(uf.upper())
+    return sql + " ORDER BY valor_total DESC", params
+
+
+def _lotes(sql: str, params: list, nome: str):
+    """Itera lotes de tuplas (itersize linhas) de um cursor nomeado; devolve a conexao ao final ou se o cliente desconectar."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor(name=nome)
+        cur.itersize = ITERSIZE
+        cur.execute(sql, params)
+        linhas = iter(cur)
+        while True:
+            rows = list(islice(linhas, ITERSIZE))
+            if not rows:
+                break
+            yield rows
+        cur.close()
+    finally:
+        liberar_conn(conn)
+
+
+def _csv(colunas: list[str], lotes):
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";", lineterminator="\n")
+    writer.writerow(colunas)
+    yield buf.getvalue().encode("utf-8")
+    for rows in lotes:
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+
+
+def _ndjson(colunas: list[str], lotes):
+    for rows in lotes:
+        yield b"".join(dumps(dict(zip(colunas, r))) + b"\n" for r in rows)
+
+
+def _gzip(chunks):
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        # SYNC_FLUSH por lote: o cliente recebe dados a cada lote em vez de so no fim
+        yield comp.compress(chunk) + comp.flush(zlib.Z_SYNC_FLUSH)
+    yield comp.flush()
+
+
+def exportar(sql: str, params: list, colunas: list[str], formato: str, compactar: bool, nome: str):
+    """Gerador de bytes do export no formato pedido."""
+    lotes = _lotes(sql, params, nome)
+    chunks = _csv(colunas, lotes) if formato == "csv" else _ndjson(colunas, lotes)
+    return _gzip(chunks) if compactar else chunks
@@ -1,15 +1,31 @@
 """
 API Teste 4 - Operadoras e despesas.
 FastAPI com paginacao offset-based; formato de resposta com metadados (data, total, page, limit).
-Estatisticas calculadas na hora (dados atualizados com pouca frequencia).
+Estatisticas calculadas na hora (dados atualizados com pouca frequencia); requisicoes identicas
+simultaneas de estatisticas e listagem/busca compartilham uma unica consulta (coalescencia.py).
+Com API_BACKEND=snapshot, os endpoints de consulta leem o snapshot mapeado em memoria (snapshot.py) em vez do PostgreSQL.
 """
 
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
 
-from db import get_conn
+import metricas
 
-app = FastAPI(title="API Operadoras ANS", version="1.0")
+from coalescencia import Coalescedor
+from config import (
+    BACKEND, CACHE_TTL_S, CNPJ_BIGINT, COALESCENCIA, COALESCENCIA_TIMEOUTS_S, COMPRESSAO_MIN_BYTES,
+    LOTE_MAX_CNPJS, SNAPSHOT_PATH,
+)
+from consultas import OrcamentoExcedido, executar, executar_sql
+from db import get_conn, liberar_conn, versao_dados
+from exportacao import COLUNAS_AGREGADAS, COLUNAS_CONSOLIDADO, exportar, sql_agregadas, sql_consolidado
+from resposta import RespostaJSON, cnpj_saida, dumps, linhas
+from snapshot import Snapshot
+
+app = FastAPI(title="API Operadoras ANS", version="1.0", default_response_class=RespostaJSON)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -17,144 +33,344 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Brotli quando o cliente aceita e o pacote opcional brotli-asgi esta instalado (com fallback para gzip)
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSAO_MIN_BYTES, gzip_fallback=True)
+except ImportError:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSAO_MIN_BYTES, compresslevel=6)
+# Adicionado por ultimo = mais externo: a latencia inclui compressao e CORS
+app.add_middleware(metricas.MiddlewareMetricas)
+
+
+@app.exception_handler(OrcamentoExcedido)
+async def orcamento_excedido(request, exc: OrcamentoExcedido):
+    """Consulta cancelada pelo statement_timeout: o cliente pode tentar de novo (503 + Retry-After)."""
+    return RespostaJSON({"detail": "Consulta excedeu o tempo limite; tente novamente"}, status_code=503,
+                        headers={"Retry-After": "2"})
+
+
+# Modo snapshot: arquivo aberto uma vez na subida; None no modo postgres
+snapshot = Snapshot(SNAPSHOT_PATH) if BACKEND == "snapshot" else None
+coalescedor = Coalescedor()
+
+
+def _normalizar_cnpj(cnpj: str) -> str:
+    """Mantem apenas digitos do CNPJ, completando com zeros a esquerda."""
+    return "".join(c for c in cnpj if c.isdigit()).zfill(14)
+
+
+def _param_cnpj(cnpj: str):
+    """Valor do CNPJ normalizado para a consulta (int quando a coluna e BIGINT)."""
+    return int(cnpj) if CNPJ_BIGINT else cnpj
+
+
+def _escapar_like(texto: str) -> str:
+    """Escapa curingas do LIKE (escape padrao do PostgreSQL: barra invertida)."""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _coalescer(rota: str, endpoint: str, params: tuple, funcao):
+    """
+    Resposta de funcao() (dict) compartilhada entre requisicoes identicas simultaneas.
+    A chave inclui a versao publicada dos dados; o JSON e serializado uma vez pelo lider.
+    Espera acima de COALESCENCIA_TIMEOUTS_S[endpoint] (derivada do orcamento) vira 503 com Retry-After.
+    """
+    if not COALESCENCIA:
+        return RespostaJSON(funcao())
+    try:
+        corpo = coalescedor.obter(
+            rota, (rota, versao_dados()) + params, lambda: dumps(funcao()),
+            COALESCENCIA_TIMEOUTS_S[endpoint], CACHE_TTL_S,
+        )
+    except TimeoutError:
+        raise HTTPException(status_code=503, detail="Consulta em andamento demorando; tente novamente",
+                            headers={"Retry-After": "1"})
+    return Response(corpo, media_type=RespostaJSON.media_type)
 
 
 @app.get("/api/operadoras")
 def listar_operadoras(
     page: int = Query(1, ge=1),
     limit: int = Query(10, ge=1, le=100),
+    q: str | None = Query(None, max_length=100),
 ):
-    """Lista operadoras com paginacao offset-based (por CNPJ para link de detalhe)."""
+    """
+    Lista operadoras com paginacao offset-based (por CNPJ para link de detalhe).
+    Com q: busca por razao social (substring, sem acento/caixa) ou prefixo de CNPJ, ordenada por relevancia.
+    """
     offset = (page - 1) * limit
+    q = (q or "").strip()
+    if snapshot is not None:
+        return RespostaJSON(snapshot.buscar(q, page, limit) if q else snapshot.listar(page, limit))
+    if q:
+        return _coalescer("/api/operadoras", "busca", (q, page, limit), lambda: _buscar_operadoras(q, limit, offset, page))
+    return _coalescer("/api/operadoras", "listagem", ("", page, limit), lambda: _listar_operadoras(limit, offset, page))
+
+
+def _listar_operadoras(limit: int, offset: int, page: int) -> dict:
+    """Pagina da listagem sem busca, ordenada por valor total."""
     conn = get_conn()
     try:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT COUNT(DISTINCT cnpj) AS total FROM despesas_consolidado"
+        executar(cur, "listar_total")
+        total = cur.fetchone()[0]
+        executar(cur, "listar_pagina", (limit, offset))
+        rows = linhas(cur)
+        cur.close()
+        return {
+            "data": rows,
+            "total": total,
+            "page": page,
+            "limit": limit,
+        }
+    finally:
+        liberar_conn(conn)
+
+
+def _buscar_operadoras(q: str, limit: int, offset: int, page: int) -> dict:
+    """
+    Busca indexada: razao social via indice GIN trigram sobre f_unaccent(lower(...)) e
+    CNPJ via indice varchar_pattern_ops (apenas quando q nao tem letras); com CNPJ BIGINT,
+    o prefixo vira intervalo [prefixo000..., prefixo999...] no indice btree de cnpj.
+    Ranking: prefixo de CNPJ, prefixo da razao social, similaridade trigram, valor total.
+    """
+    termo = _escapar_like(q)
+    params = {"q": q, "contem": "%" + termo + "%", "prefixo_nome": termo + "%"}
+    filtro = "f_unaccent(lower(razao_social)) LIKE f_unaccent(lower(%(contem)s))"
+    ordem_cnpj = "FALSE"
+    digitos = "".join(c for c in q if c.isdigit())
+    if digitos and not any(c.isalpha() for c in q) and CNPJ_BIGINT:
+        params["cnpj_min"] = int(digitos[:14].ljust(14, "0"))
+        params["cnpj_max"] = int(digitos[:14].ljust(14, "9"))
+        filtro += " OR cnpj BETWEEN %(cnpj_min)s AND %(cnpj_max)s"
+        ordem_cnpj = "d.cnpj BETWEEN %(cnpj_min)s AND %(cnpj_max)s"
+    elif digitos and not any(c.isalpha() for c in q):
+        params["prefixo_cnpj"] = digitos[:14] + "%"
+        filtro += " OR cnpj LIKE %(prefixo_cnpj)s"
+        ordem_cnpj = "d.cnpj LIKE %(prefixo_cnpj)s"
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        executar_sql(
+            cur, "busca_total", "busca",
+            "SELECT COUNT(DISTINCT cnpj) AS total FROM despesas_consolidado WHERE " + filtro,
+            params,
         )
-        total = cur.fetchone()["total"]
-        cur.execute(
+        total = cur.fetchone()[0]
+        executar_sql(
+            cur, "busca_pagina", "busca",
             """
-            SELECT cnpj, MAX(razao_social) AS razao_social,
-                   SUM(valor_despesas) AS valor_total
-            FROM despesas_consolidado
-            GROUP BY cnpj
-            ORDER BY valor_total DESC
-            LIMIT %s OFFSET %s
+            WITH encontrados AS (
+                SELECT cnpj,
+                       BOOL_OR(f_unaccent(lower(razao_social)) LIKE f_unaccent(lower(%(prefixo_nome)s))) AS prefixo_nome,
+                       MAX(similarity(f_unaccent(lower(razao_social)), f_unaccent(lower(%(q)s)))) AS similaridade
+                FROM despesas_consolidado
+                WHERE """ + filtro + """
+                GROUP BY cnpj
+            )
+            SELECT d.cnpj, MAX(d.razao_social) AS razao_social,
+                   SUM(d.valor_despesas) AS valor_total
+            FROM encontrados e
+            JOIN despesas_consolidado d ON d.cnpj = e.cnpj
+            GROUP BY d.cnpj, e.prefixo_nome, e.similaridade
+            ORDER BY """ + ordem_cnpj + """ DESC, e.prefixo_nome DESC, e.similaridade DESC, valor_total DESC
+            LIMIT %(limit)s OFFSET %(offset)s
             """,
-            (limit, offset),
+            {**params, "limit": limit, "offset": offset},
         )
-        rows = cur.fetchall()
+        rows = linhas(cur)
         cur.close()
         return {
-            "data": [dict(r) for r in rows],
+            "data": rows,
             "total": total,
             "page": page,
             "limit": limit,
         }
     finally:
-        conn.close()
+        liberar_conn(conn)
+
+
+class LoteCnpjs(BaseModel):
+    # Limite validado no corpo, antes de qualquer normalizacao
+    cnpjs: list[str] = Field(max_length=LOTE_MAX_CNPJS)
+
+
+@app.get("/api/operadoras/lote")
+def lote_operadoras_get(cnpj: list[str] = Query(...)):
+    """Lote via query string repetida (?cnpj=...&cnpj=...). Mesmo formato de POST /api/operadoras/lote."""
+    return _lote_operadoras(cnpj)
+
+
+@app.post("/api/operadoras/lote")
+def lote_operadoras_post(body: LoteCnpjs):
+    """Detalhe e despesas por trimestre de varias operadoras em uma unica chamada."""
+    return _lote_operadoras(body.cnpjs)
+
+
+def _lote_operadoras(cnpjs: list[str]):
+    """
+    Consultas por conjunto (cnpj = ANY) em uma conexao: cadastro, fallback no consolidado
+    para CNPJs sem cadastro (mesma regra de detalhe_operadora) e despesas de todos de uma vez.
+    Resposta na ordem pedida, sem repeticao; CNPJs inexistentes vao para nao_encontrados.
+    """
+    # Tamanho da entrada bruta (com repeticoes): lista enorme e rejeitada antes de normalizar
+    if len(cnpjs) > LOTE_MAX_CNPJS:
+        raise HTTPException(status_code=422, detail="Maximo de %d CNPJs por lote" % LOTE_MAX_CNPJS)
+    cnpjs = list(dict.fromkeys(_normalizar_cnpj(c) for c in cnpjs))
+    if not cnpjs:
+        raise HTTPException(status_code=422, detail="Informe ao menos um CNPJ")
+    if snapshot is not None:
+        operadoras = {c: snapshot.detalhe(c) for c in cnpjs}
+        return RespostaJSON({
+            "data": [{"operadora": operadoras[c], "despesas": snapshot.despesas(c)} for c in cnpjs if operadoras[c]],
+            "nao_encontrados": [c for c in cnpjs if not operadoras[c]],
+        })
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        executar(cur, "lote_cadastro", ([_param_cnpj(c) for c in cnpjs],))
+        operadoras = {r["cnpj"]: r for r in linhas(cur)}
+        sem_cadastro = [c for c in cnpjs if c not in operadoras]
+        if sem_cadastro:
+            executar(cur, "lote_sem_cadastro", ([_param_cnpj(c) for c in sem_cadastro],))
+            for c, razao in cur.fetchall():
+                c = cnpj_saida(c)
+                operadoras[c] = {"cnpj": c, "razao_social": razao, "registro_ans": None, "modalidade": None, "uf": None}
+        executar(cur, "lote_despesas", ([_param_cnpj(c) for c in cnpjs],))
+        despesas = {c: [] for c in cnpjs}
+        for c, trimestre, ano, valor in cur.fetchall():
+            despesas[cnpj_saida(c)].append({"trimestre": trimestre, "ano": ano, "valor_despesas": valor})
+        cur.close()
+        return RespostaJSON({
+            "data": [{"operadora": operadoras[c], "despesas": despesas[c]} for c in cnpjs if c in operadoras],
+            "nao_encontrados": [c for c in cnpjs if c not in operadoras],
+        })
+    finally:
+        liberar_conn(conn)
 
 
 @app.get("/api/operadoras/{cnpj}")
 def detalhe_operadora(cnpj: str):
     """Detalhes de uma operadora por CNPJ (apenas digitos)."""
-    cnpj = "".join(c for c in cnpj if c.isdigit()).zfill(14)
+    cnpj = _normalizar_cnpj(cnpj)
+    if snapshot is not None:
+        row = snapshot.detalhe(cnpj)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Operadora nao encontrada")
+        return RespostaJSON(row)
     conn = get_conn()
     try:
         cur = conn.cursor()
-        cur.execute(
-            "SELECT registro_ans, cnpj, razao_social, modalidade, uf FROM operadoras WHERE cnpj = %s",
-            (cnpj,),
-        )
-        row = cur.fetchone()
-        if row:
+        executar(cur, "detalhe_cadastro", (_param_cnpj(cnpj),))
+        rows = linhas(cur)
+        if rows:
             cur.close()
-            return dict(row)
-        cur.execute(
-            """
-            SELECT cnpj, MAX(razao_social) AS razao_social
-            FROM despesas_consolidado WHERE cnpj = %s GROUP BY cnpj
-            """,
-            (cnpj,),
-        )
+            return RespostaJSON(rows[0])
+        executar(cur, "detalhe_consolidado", (_param_cnpj(cnpj),))
         row = cur.fetchone()
         cur.close()
         if not row:
             raise HTTPException(status_code=404, detail="Operadora nao encontrada")
-        return {"cnpj": row["cnpj"], "razao_social": row["razao_social"], "registro_ans": None, "modalidade": None, "uf": None}
+        return RespostaJSON({"cnpj": cnpj, "razao_social": row[1], "registro_ans": None, "modalidade": None, "uf": None})
     finally:
-        conn.close()
+        liberar_conn(conn)
 
 
 @app.get("/api/operadoras/{cnpj}/despesas")
 def despesas_operadora(cnpj: str):
     """Historico de despesas por trimestre da operadora (por CNPJ)."""
-    cnpj = "".join(c for c in cnpj if c.isdigit()).zfill(14)
+    cnpj = _normalizar_cnpj(cnpj)
+    if snapshot is not None:
+        return RespostaJSON({"data": snapshot.despesas(cnpj)})
     conn = get_conn()
     try:
         cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT trimestre, ano, valor_despesas
-            FROM despesas_consolidado
-            WHERE cnpj = %s
-            ORDER BY ano, trimestre
-            """,
-            (cnpj,),
-        )
-        rows = cur.fetchall()
+        executar(cur, "despesas_operadora", (_param_cnpj(cnpj),))
+        rows = linhas(cur)
         cur.close()
-        return {"data": [dict(r) for r in rows]}
+        return RespostaJSON({"data": rows})
     finally:
-        conn.close()
+        liberar_conn(conn)
 
 
 @app.get("/api/estatisticas")
 def estatisticas():
     """Totais, media, top 5 operadoras e distribuicao por UF."""
+    if snapshot is not None:
+        return RespostaJSON(snapshot.estatisticas())
+    return _coalescer("/api/estatisticas", "estatisticas", (), _estatisticas)
+
+
+def _estatisticas() -> dict:
     conn = get_conn()
     try:
         cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT
-                COALESCE(SUM(valor_total), 0) AS total_despesas,
-                COALESCE(AVG(valor_total), 0) AS media_despesas
-            FROM despesas_agregadas
-            """
-        )
+        executar(cur, "estatisticas_totais")
         agg = cur.fetchone()
-        cur.execute(
-            """
-            SELECT razao_social, uf, valor_total
-            FROM despesas_agregadas
-            ORDER BY valor_total DESC
-            LIMIT 5
-            """
-        )
-        top5 = cur.fetchall()
-        cur.execute(
-            """
-            SELECT uf, SUM(valor_total) AS total
-            FROM despesas_agregadas
-            WHERE uf IS NOT NULL AND uf <> ''
-            GROUP BY uf
-            ORDER BY total DESC
-            """
-        )
+        executar(cur, "estatisticas_top5")
+        top5 = linhas(cur)
+        executar(cur, "estatisticas_por_uf")
         por_uf = cur.fetchall()
         cur.close()
         return {
-            "total_despesas": float(agg["total_despesas"] or 0),
-            "media_despesas": float(agg["media_despesas"] or 0),
-            "top_5_operadoras": [dict(r) for r in top5],
-            "despesas_por_uf": [{"uf": r["uf"], "total": float(r["total"])} for r in por_uf],
+            "total_despesas": float(agg[0] or 0),
+            "media_despesas": float(agg[1] or 0),
+            "top_5_operadoras": top5,
+            "despesas_por_uf": [{"uf": uf, "total": float(total)} for uf, total in por_uf],
         }
     finally:
-        conn.close()
+        liberar_conn(conn)
+
+
+def _resposta_export(tabela: str, sql: str, params: list, colunas: list[str], formato: str, compactar: bool):
+    if snapshot is not None:
+        raise HTTPException(status_code=501, detail="Export disponivel apenas com API_BACKEND=postgres")
+    media_type = "text/csv" if formato == "csv" else "application/x-ndjson"
+    nome_arquivo = "%s.%s" % (tabela, formato)
+    if compactar:
+        media_type = "application/gzip"
+        nome_arquivo += ".gz"
+    return StreamingResponse(
+        exportar(sql, params, colunas, formato, compactar, "export_" + tabela),
+        media_type=media_type,
+        headers={"Content-Disposition": 'attachment; filename="%s"' % nome_arquivo},
+    )
+
+
+@app.get("/api/export/despesas_consolidado")
+def export_despesas_consolidado(
+    formato: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    ano: int | None = Query(None, ge=2000, le=2100),
+    trimestre: int | None = Query(None, ge=1, le=4),
+    uf: str | None = Query(None, min_length=2, max_length=2),
+):
+    """Exporta despesas_consolidado em streaming (CSV ';' ou NDJSON), filtrando por ano/trimestre/UF."""
+    sql, params = sql_consolidado(ano, trimestre, uf)
+    return _resposta_export("despesas_consolidado", sql, params, COLUNAS_CONSOLIDADO, formato, gzip)
+
+
+@app.get("/api/export/despesas_agregadas")
+def export_despesas_agregadas(
+    formato: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    uf: str | None = Query(None, min_length=2, max_length=2),
+):
+    """Exporta despesas_agregadas em streaming (CSV ';' ou NDJSON), filtrando por UF."""
+    sql, params = sql_agregadas(uf)
+    return _resposta_export("despesas_agregadas", sql, params, COLUNAS_AGREGADAS, formato, gzip)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Metricas no formato texto do Prometheus (latencia por rota e por consulta, conexoes)."""
+    return Response(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    if snapshot is not None:
+        return {"status": "ok", "backend": "snapshot", "versao_dados": snapshot.versao}
+    # Versao publicada em uso (publicar.py), sem consulta ao banco; None sem publicacao versionada
+    return {"status": "ok", "versao_dados": versao_dados()}
@@ -0,0 +1,174 @@
+"""
+Metricas em formato texto do Prometheus (0.0.4), expostas em GET /metrics.
+Implementacao propria e minima (sem prometheus_client): contadores, gauges e histogramas com buckets
+fixos, protegidos por lock (handlers sincronos rodam no threadpool). Cada observacao custa um
+bisect + algumas somas. Os valores sao por processo: com varios workers do uvicorn, cada worker
+expoe os seus (coletar por worker ou rodar com um worker por container).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Segundos: de 1 ms (consulta por indice) a 10 s (export grande)
+BUCKETS_LATENCIA = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes: tuple, valores: tuple, extra: str = "") -> str:
+    pares = ['%s="%s"' % (n, _escapar(v)) for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.lock = threading.Lock()
+        self.series: dict[tuple, object] = {}
+        REGISTRO.append(self)
+        if not self.rotulos:
+            # Metrica sem rotulos aparece com zero desde a subida
+            self.series[()] = self._vazia()
+
+    def _vazia(self):
+        return 0
+
+    def _cabecalho(self) -> list[str]:
+        return ["# HELP %s %s" % (self.nome, self.ajuda), "# TYPE %s %s" % (self.nome, self.tipo)]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, *valores, n: float = 1) -> None:
+        with self.lock:
+            self.series[valores] = self.series.get(valores, 0) + n
+
+    def exportar(self) -> list[str]:
+        with self.lock:
+            itens = sorted(self.series.items())
+        return self._cabecalho() + ["%s%s %s" % (self.nome, _rotulos(self.rotulos, k), _num(v)) for k, v in itens]
+
+
+class Gauge(Contador):
+    tipo = "gauge"
+
+    def dec(self, *valores, n: float = 1) -> None:
+        self.inc(*valores, n=-n)
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (), buckets: tuple = BUCKETS_LATENCIA):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(nome, ajuda, rotulos)
+
+    def _vazia(self):
+        return [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+    def observar(self, valor: float, *valores) -> None:
+        # Contagem por faixa (nao cumulativa); a soma acumulada e feita so na exportacao
+        i = bisect_left(self.buckets, valor)
+        with self.lock:
+            serie = self.series.get(valores)
+            if serie is None:
+                serie = self.series[valores] = self._vazia()
+            serie[0][i] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exportar(self) -> list[str]:
+        with self.lock:
+            itens = sorted((k, ([*s[0]], s[1], s[2])) for k, s in self.series.items())
+        saida = self._cabecalho()
+        for k, (faixas, soma, contagem) in itens:
+            acumulado = 0
+            for limite, n in zip(self.buckets + (float("inf"),), faixas):
+                acumulado += n
+                saida.append("%s_bucket%s %d" % (self.nome, _rotulos(self.rotulos, k, 'le="%s"' % _num(limite)), acumulado))
+            saida.append("%s_sum%s %s" % (self.nome, _rotulos(self.rotulos, k), repr(soma)))
+            saida.append("%s_count%s %d" % (self.nome, _rotulos(self.rotulos, k), contagem))
+        return saida
+
+
+REGISTRO: list[_Metrica] = []
+
+HTTP_DURACAO = Histograma(
+    "api_http_requisicao_segundos", "Duracao das requisicoes HTTP (ate o ultimo byte da resposta)", ("rota", "metodo")
+)
+HTTP_REQUISICOES = Contador("api_http_requisicoes_total", "Requisicoes HTTP por rota e status", ("rota", "metodo", "status"))
+HTTP_EM_ANDAMENTO = Gauge("api_http_requisicoes_em_andamento", "Requisicoes HTTP em processamento")
+DB_CONSULTA = Histograma("api_db_consulta_segundos", "Duracao de cada execute no PostgreSQL por consulta", ("consulta",))
+DB_ERROS = Contador("api_db_consulta_erros_total", "Execucoes que levantaram excecao, por consulta", ("consulta",))
+DB_AQUISICAO = Histograma("api_db_conexao_aquisicao_segundos", "Tempo para obter uma conexao com o PostgreSQL")
+DB_CONEXAO_ERROS = Contador("api_db_conexao_erros_total", "Falhas ao abrir conexao com o PostgreSQL")
+DB_DESCARTADAS = Contador(
+    "api_db_conexoes_descartadas_total", "Conexoes do pool encontradas mortas (ex.: restart do PostgreSQL) e fechadas"
+)
+DB_CONEXOES = Gauge("api_db_conexoes_abertas", "Conexoes com o PostgreSQL abertas no momento")
+COALESCENCIA = Contador(
+    "api_coalescencia_total",
+    "Requisicoes dos endpoints coalescidos por desfecho (lider, coalescida, cache, timeout)",
+    ("rota", "desfecho"),
+)
+RENOVACOES = Contador("api_cache_renovacoes_total", "Renovacoes antecipadas do cache em segundo plano", ("rota", "resultado"))
+ORCAMENTO_EXCEDIDO = Contador(
+    "api_db_orcamento_excedido_total", "Consultas canceladas pelo statement_timeout do endpoint", ("consulta", "endpoint")
+)
+
+
+def exportar() -> str:
+    """Texto de todas as metricas registradas (Content-Type: text/plain; version=0.0.4)."""
+    linhas = []
+    for m in REGISTRO:
+        linhas.extend(m.exportar())
+    return "\n".join(linhas) + "\n"
+
+
+class MiddlewareMetricas:
+    """
+    Middleware ASGI puro (sem BaseHTTPMiddleware, que cria uma task por requisicao): mede do inicio
+    ate o fim do envio da resposta. A rota e o template do FastAPI (/api/operadoras/{cnpj}), nao o
+    path real, para a cardinalidade ficar limitada; requisicoes sem rota (404) viram "<sem_rota>".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = [500]
+
+        async def send_com_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        HTTP_EM_ANDAMENTO.inc()
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_com_status)
+        finally:
+            duracao = time.perf_counter() - inicio
+            HTTP_EM_ANDAMENTO.dec()
+            rota = getattr(scope.get("route"), "path", None) or "<sem_rota>"
+            HTTP_DURACAO.observar(duracao, rota, scope["method"])
+            HTTP_REQUISICOES.inc(rota, scope["method"], str(status[0]))
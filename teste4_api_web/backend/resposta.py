@@ -0,0 +1,46 @@
+"""
+Serializacao rapida das respostas: orjson com politica de Decimal configuravel e
+linhas de cursor de tupla mapeadas direto para a saida (sem RealDictRow + dict() + jsonable_encoder).
+"""
+
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import Response
+
+from config import CNPJ_BIGINT, DECIMAL_JSON
+
+
+def valor_json(v):
+    """default do orjson: NUMERIC do PostgreSQL chega como Decimal."""
+    if isinstance(v, Decimal):
+        return float(v) if DECIMAL_JSON == "float" else str(v)
+    raise TypeError("Tipo nao serializavel: %r" % type(v))
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=valor_json)
+
+
+class RespostaJSON(Response):
+    """Resposta JSON via orjson. Retornada direto pelos handlers para o FastAPI nao passar por jsonable_encoder."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def cnpj_saida(cnpj) -> str:
+    """CNPJ BIGINT volta como string de 14 digitos; VARCHAR passa direto."""
+    return "%014d" % cnpj if isinstance(cnpj, int) else cnpj
+
+
+def linhas(cur) -> list[dict]:
+    """Linhas do cursor (tuplas) como dicts chaveados pelos nomes das colunas."""
+    colunas = [d[0] for d in cur.description]
+    rows = [dict(zip(colunas, r)) for r in cur.fetchall()]
+    if CNPJ_BIGINT and "cnpj" in colunas:
+        for r in rows:
+            r["cnpj"] = cnpj_saida(r["cnpj"])
+    return rows
@@ -0,0 +1,391 @@
+"""
+Snapshot colunar somente leitura para servir a API sem PostgreSQL (API_BACKEND=snapshot).
+
+Publicacao (apos import_csv.py):  python snapshot.py [destino]
+Le o banco uma vez e grava um arquivo versionado; a API o mapeia em memoria (mmap) na subida
+e responde listagem, busca, detalhe, despesas, lote e estatisticas sem consultar o banco.
+Snapshots de outro FORMATO sao recusados na subida: publique de novo apos atualizar o backend.
+
+Formato (little-endian), versao FORMATO:
+    cabecalho   MAGIC, formato, versao dos dados, contagens e (offset, tamanho) de cada secao
+    OPERADORAS  registros fixos; primeiro as n_listagem operadoras com despesas, por valor_total desc
+                (a pagina N da listagem e um fatiamento), depois as so de cadastro, por CNPJ
+    INDICE      (cnpj, posicao em OPERADORAS) ordenado por CNPJ: busca binaria O(log n)
+    SERIES      despesas trimestrais (ano, trimestre, centavos), contiguas por operadora
+    TEXTOS      strings UTF-8 referenciadas por (offset, tamanho)
+    ESTATISTICAS JSON pre-calculado de /api/estatisticas
+    NOMES       razao social sem acento/caixa de cada operadora da listagem, (offset, tamanho) em TEXTOS,
+                e o numero de trigramas pg_trgm do nome
+    TRIGRAMAS   (trigrama, inicio, n) ordenado por trigrama: indice invertido das substrings de 3
+                caracteres dos NOMES; a busca le so os nomes que contem todos os trigramas do termo
+    SIMILARIDADE o mesmo para os trigramas no estilo pg_trgm: trigramas em comum com o termo sem
+                recalcular os do nome (similaridade = comuns / (n_nome + n_termo - comuns))
+    POSTINGS    posicoes (uint32, crescentes) de cada trigrama das duas tabelas
+Valores monetarios em centavos (int64): NUMERIC(18,2) sem perda; voltam como Decimal.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import unicodedata
+from collections import Counter
+from decimal import Decimal
+from pathlib import Path
+
+from resposta import cnpj_saida
+
+MAGIC = b"ANSSNAP\x00"
+FORMATO = 2
+SECOES = ("operadoras", "indice", "series", "textos", "estatisticas", "nomes", "trigramas", "similaridade", "postings")
+
+_CABECALHO = struct.Struct("<8sIIqII" + "QQ" * len(SECOES))
+# cnpj, tem_cadastro, centavos, (off, len) x 5 textos, serie_ini, serie_n
+_OPERADORA = struct.Struct("<14sBxq" + "II" * 5 + "II")
+_INDICE = struct.Struct("<14sI")
+_SERIE = struct.Struct("<HBxq")
+_NOME = struct.Struct("<III")
+# trigrama em UTF-8 (ate 3 caracteres de 4 bytes), inicio e tamanho da lista em POSTINGS
+_TRIGRAMA = struct.Struct("<12sII")
+_NULO = 0xFFFFFFFF
+# Acima deste numero de resultados, os trigramas em comum saem das listas de SIMILARIDADE
+BUSCA_POR_POSTINGS = 500
+
+
+def _centavos(valor) -> int:
+    return int((Decimal(valor) * 100).to_integral_value())
+
+
+def _valor(centavos: int) -> Decimal:
+    return Decimal(centavos).scaleb(-2)
+
+
+def _sem_acento(texto: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", texto.lower()) if not unicodedata.combining(c))
+
+
+def _substrings(texto: str) -> set[str]:
+    """Substrings de 3 caracteres (chaves do indice de busca por substring)."""
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def _trigramas(texto: str) -> set[str]:
+    """Trigramas no estilo pg_trgm (cada palavra com dois espacos antes e um depois)."""
+    out = set()
+    for palavra in "".join(c if c.isalnum() else " " for c in texto).split():
+        p = "  " + palavra + " "
+        out.update(p[i:i + 3] for i in range(len(p) - 2))
+    return out
+
+
+class Snapshot:
+    """Leitor do snapshot mapeado em memoria. Metodos retornam os mesmos formatos dos handlers Postgres."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        campos = _CABECALHO.unpack_from(self._mm, 0)
+        magic, formato, _, self.versao, self.n_operadoras, self.n_listagem = campos[:6]
+        if magic != MAGIC or formato != FORMATO:
+            raise ValueError("Snapshot invalido ou de outro formato: %s" % self.path)
+        self._secoes = {nome: (campos[6 + 2 * i], campos[7 + 2 * i]) for i, nome in enumerate(SECOES)}
+        ini, tam = self._secoes["estatisticas"]
+        self._estatisticas = json.loads(self._mm[ini:ini + tam].decode("utf-8"))
+        for r in self._estatisticas["top_5_operadoras"]:
+            r["valor_total"] = Decimal(r["valor_total"])
+
+    def _texto(self, off: int, tam: int) -> str | None:
+        if off == _NULO:
+            return None
+        ini = self._secoes["textos"][0] + off
+        return self._mm[ini:ini + tam].decode("utf-8")
+
+    def _operadora(self, pos: int) -> tuple:
+        return _OPERADORA.unpack_from(self._mm, self._secoes["operadoras"][0] + pos * _OPERADORA.size)
+
+    def _posicao(self, cnpj: str) -> int | None:
+        """Busca binaria no INDICE."""
+        chave = cnpj.encode("ascii")
+        base = self._secoes["indice"][0]
+        lo, hi = 0, self.n_operadoras
+        while lo < hi:
+            meio = (lo + hi) // 2
+            off = base + meio * _INDICE.size
+            atual = self._mm[off:off + 14]
+            if atual < chave:
+                lo = meio + 1
+            elif atual > chave:
+                hi = meio
+            else:
+                return _INDICE.unpack_from(self._mm, off)[1]
+        return None
+
+    def _com_prefixo_cnpj(self, digitos: str) -> set[int]:
+        """Posicoes na listagem dos CNPJs que comecam com `digitos`: faixa contigua do INDICE (busca binaria)."""
+        chave = digitos.encode("ascii")
+        base = self._secoes["indice"][0]
+        lo, hi = 0, self.n_operadoras
+        while lo < hi:
+            meio = (lo + hi) // 2
+            if self._mm[base + meio * _INDICE.size:base + meio * _INDICE.size + len(chave)] < chave:
+                lo = meio + 1
+            else:
+                hi = meio
+        out = set()
+        for k in range(lo, self.n_operadoras):
+            cnpj, pos = _INDICE.unpack_from(self._mm, base + k * _INDICE.size)
+            if not cnpj.startswith(chave):
+                break
+            if pos < self.n_listagem:
+                out.add(pos)
+        return out
+
+    def _nome_busca(self, pos: int) -> tuple[str, int]:
+        """Nome normalizado e numero de trigramas pg_trgm da operadora na posicao `pos` da listagem."""
+        off, tam, n = _NOME.unpack_from(self._mm, self._secoes["nomes"][0] + pos * _NOME.size)
+        return self._texto(off, tam), n
+
+    def _postings(self, tabela: str, trigrama: str) -> memoryview:
+        """Posicoes dos nomes com `trigrama` na `tabela` (TRIGRAMAS ou SIMILARIDADE, busca binaria); vazio se nenhum."""
+        chave = trigrama.encode("utf-8").ljust(12, b"\x00")
+        base, tam = self._secoes[tabela]
+        lo, hi = 0, tam // _TRIGRAMA.size
+        while lo < hi:
+            meio = (lo + hi) // 2
+            atual, ini, n = _TRIGRAMA.unpack_from(self._mm, base + meio * _TRIGRAMA.size)
+            if atual < chave:
+                lo = meio + 1
+            elif atual > chave:
+                hi = meio
+            else:
+                ini += self._secoes["postings"][0]
+                return memoryview(self._mm)[ini:ini + 4 * n].cast("I")
+        return memoryview(b"").cast("I")
+
+    def _candidatos_nome(self, termo: str):
+        """Posicoes que podem conter `termo`: intersecao das listas dos seus trigramas (todas se termo < 3 caracteres)."""
+        chaves = _substrings(termo)
+        if not chaves:
+            return range(self.n_listagem)
+        listas = sorted((self._postings("trigramas", t) for t in chaves), key=len)
+        out = set(listas[0])
+        for lista in listas[1:]:
+            if not out:
+                break
+            out.intersection_update(lista)
+        return out
+
+    def _item_listagem(self, pos: int) -> dict:
+        r = self._operadora(pos)
+        return {"cnpj": r[0].decode("ascii"), "razao_social": self._texto(r[3], r[4]), "valor_total": _valor(r[2])}
+
+    def listar(self, page: int, limit: int) -> dict:
+        offset = (page - 1) * limit
+        fim = min(offset + limit, self.n_listagem)
+        return {
+            "data": [self._item_listagem(i) for i in range(offset, fim)],
+            "total": self.n_listagem,
+            "page": page,
+            "limit": limit,
+        }
+
+    def buscar(self, q: str, page: int, limit: int) -> dict:
+        """
+        Mesma semantica de _buscar_operadoras: substring sem acento/caixa na razao social ou prefixo de CNPJ
+        (se q nao tem letras); ranking por prefixo de CNPJ, prefixo do nome, similaridade trigram e valor total.
+        Candidatos pelo indice de trigramas e pela faixa de CNPJ no INDICE; so eles sao lidos e ranqueados.
+        """
+        termo = _sem_acento(q)
+        digitos = "".join(c for c in q if c.isdigit())[:14] if not any(c.isalpha() for c in q) else ""
+        por_cnpj = self._com_prefixo_cnpj(digitos) if digitos else set()
+        tri_q = _trigramas(termo)
+        encontrados = []
+        for i in sorted(por_cnpj.union(self._candidatos_nome(termo))):
+            nome, n_tri = self._nome_busca(i)
+            cnpj_ok = i in por_cnpj
+            if termo not in nome and not cnpj_ok:
+                continue
+            encontrados.append((i, nome, cnpj_ok, n_tri))
+        comuns = Counter()
+        if len(encontrados) > BUSCA_POR_POSTINGS:
+            # Muitos resultados: contagem nas listas de SIMILARIDADE (em C) em vez de trigramas por nome
+            for t in tri_q:
+                comuns.update(self._postings("similaridade", t))
+        else:
+            comuns.update({i: len(_trigramas(nome) & tri_q) for i, nome, _, _ in encontrados})
+        ranking = []
+        for i, nome, cnpj_ok, n_tri in encontrados:
+            uniao = n_tri + len(tri_q) - comuns[i]
+            similaridade = comuns[i] / uniao if uniao else 0.0
+            # i ja segue valor_total desc: usado como ultimo criterio
+            ranking.append((not cnpj_ok, not nome.startswith(termo), -similaridade, i))
+        ranking.sort()
+        offset = (page - 1) * limit
+        return {
+            "data": [self._item_listagem(e[3]) for e in ranking[offset:offset + limit]],
+            "total": len(ranking),
+            "page": page,
+            "limit": limit,
+        }
+
+    def detalhe(self, cnpj: str) -> dict | None:
+        pos = self._posicao(cnpj)
+        if pos is None:
+            return None
+        r = self._operadora(pos)
+        if not r[1]:
+            return {"cnpj": cnpj, "razao_social": self._texto(r[3], r[4]), "registro_ans": None, "modalidade": None, "uf": None}
+        return {
+            "registro_ans": self._texto(r[7], r[8]),
+            "cnpj": cnpj,
+            "razao_social": self._texto(r[5], r[6]),
+            "modalidade": self._texto(r[9], r[10]),
+            "uf": self._texto(r[11], r[12]),
+        }
+
+    def despesas(self, cnpj: str) -> list[dict]:
+        pos = self._posicao(cnpj)
+        if pos is None:
+            return []
+        r = self._operadora(pos)
+        base = self._secoes["series"][0] + r[13] * _SERIE.size
+        out = []
+        for k in range(r[14]):
+            ano, trimestre, centavos = _SERIE.unpack_from(self._mm, base + k * _SERIE.size)
+            out.append({"trimestre": trimestre, "ano": ano, "valor_despesas": _valor(centavos)})
+        return out
+
+    def estatisticas(self) -> dict:
+        return self._estatisticas
+
+    def close(self):
+        self._mm.close()
+
+
+class _Textos:
+    def __init__(self):
+        self.buf = bytearray()
+        self._cache: dict[str, tuple[int, int]] = {}
+
+    def ref(self, texto: str | None) -> tuple[int, int]:
+        if texto is None:
+            return _NULO, 0
+        if texto not in self._cache:
+            dados = texto.encode("utf-8")
+            self._cache[texto] = (len(self.buf), len(dados))
+            self.buf += dados
+        return self._cache[texto]
+
+
+def publicar(conn, destino: str | Path, versao: int | None = None) -> Path:
+    """Le operadoras/despesas/estatisticas do banco e grava o snapshot de forma atomica (temp + rename)."""
+    destino = Path(destino)
+    versao = versao or int(time.time())
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT cnpj, MAX(razao_social), SUM(valor_despesas) AS valor_total
+        FROM despesas_consolidado GROUP BY cnpj ORDER BY valor_total DESC, cnpj
+        """
+    )
+    listagem = [(cnpj_saida(c), razao, valor) for c, razao, valor in cur.fetchall()]
+    cur.execute("SELECT cnpj, registro_ans, razao_social, modalidade, uf FROM operadoras")
+    cadastro = {cnpj_saida(r[0]): r[1:] for r in cur.fetchall()}
+    cur.execute("SELECT cnpj, ano, trimestre, valor_despesas FROM despesas_consolidado ORDER BY cnpj, ano, trimestre")
+    series: dict[str, list] = {}
+    for cnpj, ano, trimestre, valor in cur.fetchall():
+        series.setdefault(cnpj_saida(cnpj), []).append((ano, trimestre, _centavos(valor)))
+    cur.execute("SELECT COALESCE(SUM(valor_total), 0), COALESCE(AVG(valor_total), 0) FROM despesas_agregadas")
+    total, media = cur.fetchone()
+    cur.execute("SELECT razao_social, uf, valor_total FROM despesas_agregadas ORDER BY valor_total DESC LIMIT 5")
+    top5 = [{"razao_social": r[0], "uf": r[1], "valor_total": str(r[2])} for r in cur.fetchall()]
+    cur.execute(
+        """
+        SELECT uf, SUM(valor_total) AS total FROM despesas_agregadas
+        WHERE uf IS NOT NULL AND uf <> '' GROUP BY uf ORDER BY total DESC
+        """
+    )
+    por_uf = [{"uf": uf, "total": float(t)} for uf, t in cur.fetchall()]
+    cur.close()
+
+    com_despesas = {r[0] for r in listagem}
+    ordem = [(cnpj, razao, valor) for cnpj, razao, valor in listagem]
+    ordem += [(cnpj, None, 0) for cnpj in sorted(cadastro) if cnpj not in com_despesas]
+
+    textos = _Textos()
+    operadoras, serie_buf = bytearray(), bytearray()
+    n_series = 0
+    for cnpj, razao, valor in ordem:
+        cad = cadastro.get(cnpj)
+        if razao is None and cad is not None:
+            razao = cad[1]
+        pontos = series.get(cnpj, [])
+        refs = [textos.ref(razao)]
+        refs += [textos.ref(v) for v in (cad[1], cad[0], cad[2], cad[3])] if cad else [(_NULO, 0)] * 4
+        operadoras += _OPERADORA.pack(
+            cnpj.encode("ascii"), 1 if cad else 0, _centavos(valor),
+            *[x for ref in refs for x in ref], n_series, len(pontos),
+        )
+        for p in pontos:
+            serie_buf += _SERIE.pack(*p)
+        n_series += len(pontos)
+    indice = b"".join(_INDICE.pack(c.encode("ascii"), i) for c, i in sorted((c, i) for i, (c, _, _) in enumerate(ordem)))
+    estat = json.dumps({
+        "total_despesas": float(total or 0),
+        "media_despesas": float(media or 0),
+        "top_5_operadoras": top5,
+        "despesas_por_uf": por_uf,
+    }).encode("utf-8")
+
+    nomes, substrings, similares = bytearray(), {}, {}
+    for i, (cnpj, razao, _) in enumerate(listagem):
+        if razao is None and cnpj in cadastro:
+            razao = cadastro[cnpj][1]
+        nome = _sem_acento(razao or "")
+        tri = _trigramas(nome)
+        nomes += _NOME.pack(*textos.ref(nome), len(tri))
+        for t in _substrings(nome):
+            substrings.setdefault(t, []).append(i)
+        for t in tri:
+            similares.setdefault(t, []).append(i)
+    postings = bytearray()
+    tabelas = []
+    for indice_invertido in (substrings, similares):
+        tabela = bytearray()
+        for t in sorted(indice_invertido, key=lambda t: t.encode("utf-8")):
+            tabela += _TRIGRAMA.pack(t.encode("utf-8"), len(postings), len(indice_invertido[t]))
+            postings += struct.pack("<%dI" % len(indice_invertido[t]), *indice_invertido[t])
+        tabelas.append(bytes(tabela))
+
+    corpos = [bytes(operadoras), indice, bytes(serie_buf), bytes(textos.buf), estat, bytes(nomes), *tabelas, bytes(postings)]
+    posicoes, off = [], _CABECALHO.size
+    for corpo in corpos:
+        posicoes += [off, len(corpo)]
+        off += len(corpo)
+    cabecalho = _CABECALHO.pack(MAGIC, FORMATO, 0, versao, len(ordem), len(listagem), *posicoes)
+    tmp = destino.with_name(destino.name + ".tmp")
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(cabecalho)
+        for corpo in corpos:
+            f.write(corpo)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, destino)
+    return destino
+
+
+if __name__ == "__main__":
+    from config import SNAPSHOT_PATH
+    from db import get_conn
+
+    destino = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(SNAPSHOT_PATH)
+    conn = get_conn()
+    try:
+        publicar(conn, destino)
+    finally:
+        conn.close()
+    print("Snapshot publicado: %s" % destino)
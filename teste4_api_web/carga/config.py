@@ -0,0 +1,35 @@
+"""Configuracoes do teste de carga da API (Teste 4)."""
+
+import os
+from pathlib import Path
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv(Path(__file__).resolve().parent.parent.parent / ".env")
+except ImportError:
+    pass
+
+DB = {
+    "host": os.environ.get("POSTGRES_HOST", "localhost"),
+    "port": os.environ.get("POSTGRES_PORT", "5432"),
+    "user": os.environ.get("POSTGRES_USER", "ans_user"),
+    "password": os.environ.get("POSTGRES_PASSWORD", "ans_pass"),
+    "dbname": os.environ.get("POSTGRES_DB", "ans_db"),
+}
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+# import_csv.atualizar_resumos: a semente recalcula os resumos com o mesmo SQL da importacao
+TESTE3_DIR = Path(__file__).resolve().parent.parent.parent / "teste3_banco"
+RESULTADOS_DIR = Path(__file__).resolve().parent / "resultados"
+
+# Mix de requisicoes (peso relativo por endpoint)
+MIX = {
+    "listar": 40,
+    "detalhe": 25,
+    "despesas": 25,
+    "estatisticas": 10,
+}
+# Paginas sorteadas em /api/operadoras (usuarios raramente passam das primeiras)
+MAX_PAGINA = 50
+UFS = ("SP", "RJ", "MG", "RS", "PR", "SC", "BA", "PE", "CE", "GO", "DF", "ES", "PA", "AM", "MT", "MS")
+MODALIDADES = ("Medicina de Grupo", "Cooperativa Medica", "Seguradora Especializada em Saude", "Autogestao", "Odontologia de Grupo")
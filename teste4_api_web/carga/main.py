@@ -0,0 +1,194 @@
+"""
+Teste de carga da API (Teste 4).
+Opcionalmente semeia o banco com dados sinteticos, sobe o backend com N workers uvicorn,
+dispara um mix de requisicoes com concorrencia fixa e grava latencias (p50/p95/p99), RPS e erros em JSON.
+
+Exemplo:
+    python main.py --semear --operadoras 20000 --trimestres 12 --workers 4 --concorrencia 32 --duracao 60
+    python main.py --workers 4 --concorrencia 32 --comparar resultados/base.json
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import requests
+
+from config import BACKEND_DIR, MAX_PAGINA, MIX, RESULTADOS_DIR
+from semente import cnpj_sintetico, semear
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+logger = logging.getLogger(__name__)
+
+
+def subir_backend(workers: int, porta: int) -> subprocess.Popen:
+    """Sobe uvicorn com N workers e espera /health responder."""
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--workers", str(workers), "--port", str(porta), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    url = "http://127.0.0.1:%d/health" % porta
+    for _ in range(100):
+        if proc.poll() is not None:
+            raise RuntimeError("Backend encerrou ao subir (codigo %s)." % proc.returncode)
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("Backend nao respondeu em %s." % url)
+
+
+def _requisicao(rnd: random.Random, num_operadoras: int) -> tuple[str, str]:
+    """Sorteia (nome do endpoint, caminho) segundo MIX."""
+    nome = rnd.choices(list(MIX), weights=list(MIX.values()))[0]
+    if nome == "listar":
+        return nome, "/api/operadoras?page=%d&limit=10" % rnd.randint(1, MAX_PAGINA)
+    if nome == "estatisticas":
+        return nome, "/api/estatisticas"
+    cnpj = cnpj_sintetico(rnd.randrange(num_operadoras))
+    if nome == "detalhe":
+        return nome, "/api/operadoras/%s" % cnpj
+    return nome, "/api/operadoras/%s/despesas" % cnpj
+
+
+def _cliente(base_url: str, fim: float, semente: int, num_operadoras: int, amostras: dict, lock: threading.Lock):
+    rnd = random.Random(semente)
+    session = requests.Session()
+    local: dict[str, list] = {}
+    while time.perf_counter() < fim:
+        nome, caminho = _requisicao(rnd, num_operadoras)
+        t0 = time.perf_counter()
+        try:
+            status = session.get(base_url + caminho, timeout=30).status_code
+        except requests.RequestException:
+            status = 0
+        local.setdefault(nome, []).append((time.perf_counter() - t0, status))
+    with lock:
+        for nome, lista in local.items():
+            amostras.setdefault(nome, []).extend(lista)
+
+
+def _percentil(ordenado: list[float], p: float) -> float:
+    """Percentil por nearest-rank (ordenado nao vazio)."""
+    k = max(0, min(len(ordenado) - 1, math.ceil(p / 100.0 * len(ordenado)) - 1))
+    return ordenado[k]
+
+
+def _resumo(lista: list[tuple[float, int]], duracao: float) -> dict:
+    lat = sorted(t for t, _ in lista)
+    erros = sum(1 for _, s in lista if s == 0 or s >= 500)
+    return {
+        "requisicoes": len(lista),
+        "rps": round(len(lista) / duracao, 2),
+        "erros": erros,
+        "taxa_erro": round(erros / len(lista), 4) if lista else 0,
+        "p50_ms": round(_percentil(lat, 50) * 1000, 2) if lat else None,
+        "p95_ms": round(_percentil(lat, 95) * 1000, 2) if lat else None,
+        "p99_ms": round(_percentil(lat, 99) * 1000, 2) if lat else None,
+        "max_ms": round(lat[-1] * 1000, 2) if lat else None,
+    }
+
+
+def executar_carga(base_url: str, concorrencia: int, duracao: float, aquecimento: float, num_operadoras: int, semente: int) -> dict:
+    """Aquecimento (descartado) + carga com `concorrencia` clientes por `duracao` segundos."""
+    if aquecimento > 0:
+        _cliente(base_url, time.perf_counter() + aquecimento, semente, num_operadoras, {}, threading.Lock())
+    amostras: dict[str, list] = {}
+    lock = threading.Lock()
+    inicio = time.perf_counter()
+    fim = inicio + duracao
+    with ThreadPoolExecutor(max_workers=concorrencia) as pool:
+        for i in range(concorrencia):
+            pool.submit(_cliente, base_url, fim, semente + i + 1, num_operadoras, amostras, lock)
+    decorrido = time.perf_counter() - inicio
+    todas = [a for lista in amostras.values() for a in lista]
+    return {
+        "total": _resumo(todas, decorrido),
+        "endpoints": {nome: _resumo(lista, decorrido) for nome, lista in sorted(amostras.items())},
+        "duracao_s": round(decorrido, 2),
+    }
+
+
+def comparar(atual: dict, base: dict) -> None:
+    """Imprime a variacao percentual de RPS e latencias em relacao a uma execucao anterior."""
+    print("%-14s %10s %10s %10s %10s" % ("endpoint", "rps", "p50", "p95", "p99"))
+    nomes = ["total"] + sorted(atual["endpoints"])
+    for nome in nomes:
+        a = atual["total"] if nome == "total" else atual["endpoints"].get(nome)
+        b = base["total"] if nome == "total" else base.get("endpoints", {}).get(nome)
+        if not a or not b:
+            continue
+        cols = []
+        for k in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            if a.get(k) is None or not b.get(k):
+                cols.append("-")
+            else:
+                cols.append("%+.1f%%" % (100.0 * (a[k] - b[k]) / b[k]))
+        print("%-14s %10s %10s %10s %10s" % (nome, *cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Teste de carga da API Operadoras ANS")
+    parser.add_argument("--semear", action="store_true", help="Esvazia e popula o banco com dados sinteticos")
+    parser.add_argument("--operadoras", type=int, default=5000)
+    parser.add_argument("--trimestres", type=int, default=8)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=2, help="Workers uvicorn")
+    parser.add_argument("--porta", type=int, default=8010)
+    parser.add_argument("--url", help="Usa uma API ja em execucao em vez de subir o backend")
+    parser.add_argument("--concorrencia", type=int, default=16)
+    parser.add_argument("--duracao", type=float, default=30, help="Segundos de carga medida")
+    parser.add_argument("--aquecimento", type=float, default=3, help="Segundos de aquecimento (descartados)")
+    parser.add_argument("--saida", type=Path, help="JSON de resultado (padrao: resultados/carga_<data>.json)")
+    parser.add_argument("--comparar", type=Path, help="JSON de uma execucao anterior para comparacao")
+    args = parser.parse_args()
+
+    if args.semear:
+        semear(args.operadoras, args.trimestres, args.semente)
+
+    proc = None
+    base_url = args.url
+    if not base_url:
+        proc = subir_backend(args.workers, args.porta)
+        base_url = "http://127.0.0.1:%d" % args.porta
+    try:
+        logger.info("Carga: %d clientes por %.0fs em %s", args.concorrencia, args.duracao, base_url)
+        resultado = executar_carga(base_url, args.concorrencia, args.duracao, args.aquecimento, args.operadoras, args.semente)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    resultado["parametros"] = {
+        "operadoras": args.operadoras,
+        "trimestres": args.trimestres,
+        "semente": args.semente,
+        "workers": None if args.url else args.workers,
+        "concorrencia": args.concorrencia,
+        "mix": MIX,
+        "executado_em": datetime.now().isoformat(timespec="seconds"),
+    }
+    saida = args.saida or RESULTADOS_DIR / ("carga_%s.json" % datetime.now().strftime("%Y%m%d_%H%M%S"))
+    saida.parent.mkdir(parents=True, exist_ok=True)
+    saida.write_text(json.dumps(resultado, indent=2), encoding="utf-8")
+    t = resultado["total"]
+    logger.info("RPS %.1f | p50 %sms p95 %sms p99 %sms | erros %d (%.2f%%)", t["rps"], t["p50_ms"], t["p95_ms"], t["p99_ms"], t["erros"], 100 * t["taxa_erro"])
+    logger.info("Resultado salvo: %s", saida)
+    if args.comparar:
+        comparar(resultado, json.loads(args.comparar.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Popula o PostgreSQL local (docker-compose, servico db) com operadoras e despesas sinteticas.
+Deterministico por semente: mesma escala + semente => mesmos dados, para comparar execucoes.
+ATENCAO: esvazia operadoras, despesas_consolidado, despesas_agregadas e despesas_cubo antes de inserir;
+os resumos (resumo_*) sao recalculados a partir dos dados semeados, como no fim do import_csv.py.
+"""
+
+import logging
+import random
+import statistics
+import sys
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from config import DB, MODALIDADES, TESTE3_DIR, UFS
+
+sys.path.append(str(TESTE3_DIR))
+from import_csv import atualizar_resumos
+
+logger = logging.getLogger(__name__)
+
+PALAVRAS = ("SAUDE", "SAÚDE", "ASSISTÊNCIA MÉDICA", "ODONTOLÓGICA", "PLANOS", "COOPERATIVA", "SEGUROS", "VIDA")
+
+
+def _dv_cnpj(base: str) -> str:
+    """Digitos verificadores para os 12 primeiros digitos (mesma regra de teste2_transformacao/validacao.py)."""
+    for pesos in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        d = 11 - sum(int(c) * p for c, p in zip(base, pesos)) % 11
+        base += str(0 if d >= 10 else d)
+    return base
+
+
+def cnpj_sintetico(i: int) -> str:
+    """CNPJ valido e estavel para a i-esima operadora sintetica."""
+    return _dv_cnpj("%08d0001" % (i + 1))
+
+
+def periodos(trimestres: int, ultimo: tuple[int, int] = (2025, 3)) -> list[tuple[int, int]]:
+    """(ano, trimestre) dos ultimos N trimestres ate `ultimo`, do mais antigo ao mais recente."""
+    ano, trim = ultimo
+    out = []
+    for _ in range(trimestres):
+        out.append((ano, trim))
+        trim -= 1
+        if trim == 0:
+            ano, trim = ano - 1, 4
+    return out[::-1]
+
+
+def semear(num_operadoras: int, trimestres: int, semente: int = 42) -> None:
+    rnd = random.Random(semente)
+    per = periodos(trimestres)
+    operadoras, despesas, agregadas = [], [], []
+    for i in range(num_operadoras):
+        cnpj = cnpj_sintetico(i)
+        razao = "OPERADORA %s %06d" % (rnd.choice(PALAVRAS), i)
+        uf = rnd.choice(UFS)
+        operadoras.append((str(300000 + i), cnpj, razao, rnd.choice(MODALIDADES), uf))
+        escala = rnd.lognormvariate(13, 1.5)
+        valores = []
+        for ano, trim in per:
+            # ~10% das operadoras sem dado em algum trimestre (como na base real)
+            if rnd.random() < 0.1:
+                continue
+            v = round(escala * rnd.uniform(0.7, 1.3), 2)
+            valores.append(v)
+            despesas.append((cnpj, razao, trim, ano, v))
+        if valores:
+            desvio = statistics.stdev(valores) if len(valores) > 1 else 0
+            agregadas.append((razao, uf, round(sum(valores), 2), round(statistics.mean(valores), 2), round(desvio, 2)))
+
+    conn = psycopg2.connect(**DB)
+    try:
+        cur = conn.cursor()
+        # despesas_cubo nao e semeado: vazio em vez de celulas de uma carga anterior
+        cur.execute("TRUNCATE operadoras, despesas_consolidado, despesas_agregadas, despesas_cubo RESTART IDENTITY")
+        execute_values(
+            cur,
+            "INSERT INTO operadoras (registro_ans, cnpj, razao_social, modalidade, uf) VALUES %s",
+            operadoras,
+            page_size=5000,
+        )
+        execute_values(
+            cur,
+            "INSERT INTO despesas_consolidado (cnpj, razao_social, trimestre, ano, valor_despesas) VALUES %s",
+            despesas,
+            page_size=5000,
+        )
+        execute_values(
+            cur,
+            "INSERT INTO despesas_agregadas (razao_social, uf, valor_total, media_por_trimestre, desvio_padrao_despesas) VALUES %s",
+            agregadas,
+            page_size=5000,
+        )
+        conn.commit()
+        atualizar_resumos(conn)
+        cur.execute("ANALYZE operadoras, despesas_consolidado, despesas_agregadas, resumo_periodo, resumo_operadora, resumo_uf")
+        conn.commit()
+        cur.close()
+    finally:
+        conn.close()
+    logger.info(
+        "Semeado: %d operadoras, %d despesas (%d trimestres), %d agregadas",
+        len(operadoras), len(despesas), len(per), len(agregadas),
+    )
@@ -5,8 +5,10 @@ const api = axios.create({
   timeout: 10000,
 });
 
-export async function getOperadoras(page = 1, limit = 10) {
-  const { data } = await api.get("/api/operadoras", { params: { page, limit } });
+export async function getOperadoras(page = 1, limit = 10, q = "") {
+  const params = { page, limit };
+  if (q) params.q = q;
+  const { data } = await api.get("/api/operadoras", { params });
   return data;
 }
 